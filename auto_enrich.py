@@ -0,0 +1,211 @@
+import heapq
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from catalog import post_time
+from metrics import AUTO_ENRICH_POSTS
+from storage import locked_json, read_json
+
+log = logging.getLogger(__name__)
+
+# A claim not finished within this many seconds (e.g. the worker died) is up for grabs again
+LEASE_SECONDS = 600
+# Failed posts are retried after RETRY_SECONDS * attempts, at most MAX_ATTEMPTS times
+RETRY_SECONDS = 900
+MAX_ATTEMPTS = 3
+# Pause after Gemini answers 429
+RATE_LIMIT_PAUSE = 60
+
+
+def parse_weights(spec):
+    """Parses `"nasa=3,memes=0.5"` into `{"nasa": 3.0, "memes": 0.5}`."""
+    weights = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            weights[name.strip()] = float(value)
+    return weights
+
+
+class AutoEnricher:
+    """Background worker that enriches `pending` posts, scraped or uploaded.
+
+    Posts are taken in priority order: higher account weight first, then
+    newest first; accounts weighted 0 are skipped. At most `daily_budget`
+    Gemini calls are made per day.
+
+    The budget, the claims and the failure counts live in a JSON state file
+    under the file lock, so every worker process can run one of these: a
+    post is claimed before it is sent to Gemini and no other worker picks it
+    while the claim's lease runs. Everything survives a restart.
+    """
+
+    def __init__(self, scraper, daily_budget=500, concurrency=4, interval=30, weights=None,
+                 state_path=os.path.join("storage", "auto_enrich.json")):
+        self.scraper = scraper
+        self.daily_budget = daily_budget
+        self.concurrency = max(1, concurrency)
+        self.interval = interval
+        self.weights = weights or {}
+        self.state_path = state_path
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread = None
+        self._pause_until = 0.0
+
+    @classmethod
+    def from_env(cls, scraper):
+        return cls(
+            scraper,
+            daily_budget=int(os.getenv("AUTO_ENRICH_DAILY_BUDGET", "500")),
+            concurrency=int(os.getenv("AUTO_ENRICH_CONCURRENCY", "4")),
+            interval=float(os.getenv("AUTO_ENRICH_INTERVAL", "30")),
+            weights=parse_weights(os.getenv("AUTO_ENRICH_WEIGHTS")),
+        )
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="auto-enrich", daemon=True)
+        self._thread.start()
+        log.info("auto-enrich started owner=%s budget=%d concurrency=%d",
+                 self.owner, self.daily_budget, self.concurrency)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self._stop.is_set():
+                try:
+                    handled = self.run_once(pool)
+                except Exception:
+                    log.exception("auto-enrich pass failed")
+                    handled = 0
+                # Keep draining while there is work, otherwise poll
+                if not handled:
+                    self._stop.wait(max(self.interval, self._pause_until - time.time()))
+
+    def run_once(self, pool=None):
+        """Claims and enriches one batch. Returns how many posts were handled."""
+        if time.time() < self._pause_until:
+            return 0
+        posts = self._claim(self.concurrency)
+        if not posts:
+            return 0
+        results = list((pool.map if pool else map)(self._enrich, posts))
+        # The whole batch is stored in one catalog write
+        updates = {post_id: {"ai_data": ai_data, "status": "enriched"}
+                   for post_id, ai_data, error, _ in results if error is None}
+        if updates:
+            # Only touch posts still pending (a user may have enriched or reset one meanwhile)
+            self.scraper.update_posts(updates, if_status="pending")
+            log.info("auto-enrich stored count=%d", len(updates))
+        self._finish(results)
+        return len(posts)
+
+    def _pending(self):
+        """Pending posts of accounts not weighted 0, in stored order."""
+        posts = self.scraper.catalog.select("pending")
+        if all(weight > 0 for weight in self.weights.values()):
+            return posts
+        return [p for p in posts if self.weights.get(p.get("username"), 1) > 0]
+
+    def _priority(self, post):
+        return self.weights.get(post.get("username"), 1), post_time(post)
+
+    def _load_state(self, state):
+        today = date.today().isoformat()
+        if state.get("date") != today:
+            state["date"] = today
+            state["used"] = 0
+        state.setdefault("claims", {})
+        state.setdefault("failures", {})
+
+    def _claim(self, limit):
+        now = time.time()
+        with locked_json(self.state_path, {}) as state:
+            self._load_state(state)
+            # Read under the state lock: a batch is stored in the catalog before its
+            # claims are released, so a post without a claim here is really pending
+            pending = self._pending()
+            pending_ids = {p["post_id"] for p in pending}
+            claims = {pid: c for pid, c in state["claims"].items() if c["expires"] > now}
+            failures = {pid: f for pid, f in state["failures"].items() if pid in pending_ids}
+            blocked = set(claims) | {pid for pid, f in failures.items()
+                                     if f["count"] >= MAX_ATTEMPTS or f["retry_at"] > now}
+
+            picked = []
+            room = min(limit, self.daily_budget - state["used"])
+            # Only the best `room` posts are needed, plus as many as may be skipped
+            best = heapq.nlargest(room + len(blocked), pending, key=self._priority) if room > 0 else []
+            for post in best:
+                if len(picked) >= room:
+                    break
+                post_id = post["post_id"]
+                if post_id in blocked:
+                    continue
+                claims[post_id] = {"owner": self.owner, "expires": now + LEASE_SECONDS}
+                picked.append(post)
+
+            state["used"] += len(picked)
+            state["claims"] = claims
+            state["failures"] = failures
+        return picked
+
+    def _finish(self, results):
+        """Releases the claims of a batch and records its failures, in one state write."""
+        with locked_json(self.state_path, {}) as state:
+            self._load_state(state)
+            for post_id, _, error, retry in results:
+                state["claims"].pop(post_id, None)
+                if error is None:
+                    state["failures"].pop(post_id, None)
+                elif retry:
+                    failure = state["failures"].setdefault(post_id, {"count": 0})
+                    failure["count"] += 1
+                    failure["retry_at"] = time.time() + RETRY_SECONDS * failure["count"]
+                    failure["error"] = error
+
+    def _enrich(self, post):
+        """Sends one post to Gemini. Returns (post_id, ai_data, error, retry)."""
+        from ai_processor import extract_attributes
+
+        post_id = post["post_id"]
+        img_path = self.scraper.catalog.local_path(post)
+        ai_data = extract_attributes(img_path, post.get("caption", ""))
+        error = ai_data.get("error")
+
+        if error and "429" in error:
+            # Rate limited: back off and retry later without counting an attempt
+            self._pause_until = time.time() + RATE_LIMIT_PAUSE
+            log.warning("auto-enrich rate limited post_id=%s pause=%ds", post_id, RATE_LIMIT_PAUSE)
+            AUTO_ENRICH_POSTS.inc(outcome="rate_limited")
+            return post_id, None, error, False
+        if error:
+            log.warning("auto-enrich failed post_id=%s error=%s", post_id, error)
+            AUTO_ENRICH_POSTS.inc(outcome="error")
+            return post_id, None, error, True
+
+        AUTO_ENRICH_POSTS.inc(outcome="enriched")
+        log.debug("auto-enrich finished post_id=%s", post_id)
+        return post_id, ai_data, None, True
+
+    def status(self):
+        state = read_json(self.state_path, {})
+        self._load_state(state)
+        now = time.time()
+        return {
+            "date": state["date"],
+            "used": state["used"],
+            "daily_budget": self.daily_budget,
+            "claimed": sorted(pid for pid, c in state["claims"].items() if c["expires"] > now),
+            "failed": state["failures"],
+            "pending": len(self._pending()),
+            "weights": self.weights,
+        }
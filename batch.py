@@ -0,0 +1,324 @@
+"""
+Server-side enrich -> annotate runs over a selection of posts.
+
+A batch job walks its selection once: pending posts go to Gemini, and
+enriched posts (including the ones it just enriched) are uploaded to the
+annotate API as soon as a full batch is ready, so both steps run at the
+same time. Concurrency and batch size are set on the server.
+
+The job record lives in the JobStore (kind "batch"), its selection next to
+it in `storage/jobs/{id}.posts`. The posts' own status in the catalog is the
+checkpoint: a paused, interrupted or resumed job walks the selection again
+and skips what is done. Runners send heartbeats; a "running" job whose
+runner has been silent for LEASE_SECONDS (its worker died or restarted) is
+taken over by the next worker that looks.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from storage import read_json, write_json
+
+log = logging.getLogger(__name__)
+
+STEPS = ("enrich", "annotate")
+# A running job without a heartbeat for this long is taken over
+LEASE_SECONDS = 60
+# Progress is written, and pause/cancel picked up, at most this often
+TICK_SECONDS = 0.5
+# Enrich results are written to the catalog this many at a time
+FLUSH_EVERY = 50
+# Errors kept on the job record
+MAX_ERRORS = 20
+
+
+class BatchRunner:
+    """Starts, pauses, resumes and cancels batch jobs, and runs them in
+    threads of this worker process."""
+
+    def __init__(self, scraper, jobs, enrich_concurrency=8, annotate_concurrency=2, batch_size=50):
+        self.scraper = scraper
+        self.jobs = jobs
+        self.enrich_concurrency = max(1, enrich_concurrency)
+        self.annotate_concurrency = max(1, annotate_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._threads = {}
+        # Bearer tokens the jobs were started with; kept in memory only
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    @classmethod
+    def from_env(cls, scraper, jobs):
+        return cls(
+            scraper, jobs,
+            enrich_concurrency=int(os.getenv("BATCH_ENRICH_CONCURRENCY", "8")),
+            annotate_concurrency=int(os.getenv("BATCH_ANNOTATE_CONCURRENCY", "2")),
+            batch_size=int(os.getenv("BATCH_ANNOTATE_SIZE", "50")),
+        )
+
+    def _selection_path(self, job_id):
+        return os.path.join(self.jobs.root, f"{job_id}.posts")
+
+    def select(self, status="pending", usernames=None, source=None):
+        """Post ids for a query such as "all pending posts of these accounts"."""
+        return self.scraper.catalog.ids(status, source, usernames)
+
+    def create(self, post_ids, steps=STEPS, token=None):
+        steps = [step for step in STEPS if step in steps]
+        if not steps:
+            raise ValueError("steps must include 'enrich' and/or 'annotate'")
+        post_ids = list(dict.fromkeys(post_ids))
+        # Owned from the start, so no other worker takes it before the selection is written
+        job = self.jobs.create("batch", steps=steps, total=len(post_ids), current=0, post_id=None,
+                               enriched=0, annotated=0, skipped=0, failed=0, errors=[],
+                               owner=self.owner, heartbeat=time.time())
+        write_json(self._selection_path(job["id"]), post_ids, indent=None)
+        log.info("batch job created job_id=%s posts=%d steps=%s", job["id"], len(post_ids), ",".join(steps))
+        self.start(job["id"], token)
+        return job
+
+    def start(self, job_id, token=None):
+        """Runs the job here unless a live runner (here or elsewhere) has it."""
+        with self._lock:
+            if token:
+                self._tokens[job_id] = token
+            thread = self._threads.get(job_id)
+            if thread and thread.is_alive():
+                return True
+            if self.jobs.claim(job_id, self.owner, LEASE_SECONDS) is None:
+                return False
+            thread = threading.Thread(target=self._run, args=(job_id,), name=f"batch-{job_id[:8]}", daemon=True)
+            self._threads[job_id] = thread
+            thread.start()
+            return True
+
+    def _control(self, job_id, allowed, status):
+        job = self.jobs.get(job_id)
+        if job is None or job.get("kind") != "batch":
+            raise KeyError(job_id)
+        if job["status"] not in allowed:
+            raise ValueError(f"job is {job['status']}")
+        return self.jobs.update(job_id, status=status)
+
+    def pause(self, job_id):
+        return self._control(job_id, ("running",), "paused")
+
+    def cancel(self, job_id):
+        return self._control(job_id, ("running", "paused"), "cancelled")
+
+    def resume(self, job_id, token=None):
+        job = self._control(job_id, ("paused", "running", "failed"), "running")
+        self.start(job_id, token)
+        return job
+
+    def watch(self):
+        """Takes over running jobs whose runner went away, now and every LEASE_SECONDS."""
+        def loop():
+            while not self._stop.is_set():
+                now = time.time()
+                for job in self.jobs.list("batch"):
+                    if job["status"] == "running" and now - job.get("heartbeat", 0) >= LEASE_SECONDS:
+                        if self.start(job["id"]):
+                            log.info("batch job resumed job_id=%s", job["id"])
+                self._stop.wait(LEASE_SECONDS)
+
+        self._watcher = threading.Thread(target=loop, name="batch-watch", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        # Runners stop feeding work and release their jobs, which stay "running"
+        self._stop.set()
+        for thread in list(self._threads.values()):
+            thread.join(timeout=30)
+
+    def _run(self, job_id):
+        try:
+            while True:
+                job = self.jobs.get(job_id)
+                run = _Pass(self, job, self._tokens.get(job_id))
+                run.run(read_json(self._selection_path(job_id), []))
+                with self._lock:
+                    if not run.stopped:
+                        self.jobs.update(job_id, status="completed", owner=None)
+                        log.info("batch job finished job_id=%s enriched=%d annotated=%d failed=%d", job_id,
+                                 run.counts["enriched"], run.counts["annotated"], run.counts["failed"])
+                        break
+                    job = self.jobs.update(job_id, owner=None)
+                    # Resumed while this pass was winding down: go again, unless another worker has it
+                    if (run.stopped == "shutdown" or job["status"] != "running"
+                            or self.jobs.claim(job_id, self.owner, LEASE_SECONDS) is None):
+                        break
+        except Exception as e:
+            log.exception("batch job failed job_id=%s", job_id)
+            self.jobs.update(job_id, status="failed", error=str(e), owner=None)
+        finally:
+            with self._lock:
+                self._threads.pop(job_id, None)
+                job = self.jobs.get(job_id) or {}
+                if job.get("status") != "paused":
+                    self._tokens.pop(job_id, None)
+
+    def _enrich(self, post):
+        from ai_processor import extract_attributes
+
+        return extract_attributes(self.scraper.catalog.local_path(post), post.get("caption", ""))
+
+    def _upload(self, batch, token):
+        from annotate import upload_posts
+
+        return upload_posts(batch, token, self.scraper.catalog.local_path)
+
+
+class _Pass:
+    """One walk over a job's selection. `current`, `skipped` and `failed`
+    count this pass; `enriched` and `annotated` add up over all passes."""
+
+    def __init__(self, runner, job, token):
+        self.runner = runner
+        self.job_id = job["id"]
+        self.steps = job["steps"]
+        self.token = token
+        self.counts = {"current": 0, "skipped": 0, "failed": 0,
+                       "enriched": job.get("enriched", 0), "annotated": job.get("annotated", 0)}
+        self.errors = list(job.get("errors", []))
+        self.updates = {}  # enrich results not yet written
+        self.ready = []  # enriched posts waiting for a full upload batch
+        self.futures = {}  # future -> ("enrich", post) or ("annotate", batch)
+        self.stopped = None  # "paused", "cancelled" or "shutdown" once asked to stop
+        self._last_tick = 0.0
+
+    def run(self, post_ids):
+        runner = self.runner
+        with ThreadPoolExecutor(runner.enrich_concurrency, thread_name_prefix="batch-enrich") as enrich_pool, \
+                ThreadPoolExecutor(runner.annotate_concurrency, thread_name_prefix="batch-annotate") as upload_pool:
+            self.upload_pool = upload_pool
+            try:
+                self._feed(enrich_pool, post_ids)
+            finally:
+                # Whatever was enriched is kept, even if the pass failed
+                self.flush()
+        self.tick(force=True)
+
+    def _feed(self, enrich_pool, post_ids):
+        runner = self.runner
+        for post_id in post_ids:
+            self.tick()
+            if self.stopped:
+                break
+            post = runner.scraper.catalog.get(post_id)
+            status = post and (post.get("status") or "pending")
+            if status == "pending" and "enrich" in self.steps:
+                # Only a couple of posts queued per worker, so a pause takes effect quickly
+                while self._in_flight("enrich") >= 2 * runner.enrich_concurrency:
+                    self.reap()
+                self.futures[enrich_pool.submit(runner._enrich, post)] = ("enrich", post)
+            elif status == "enriched" and "annotate" in self.steps:
+                self.ready.append(post)
+                self.upload()
+            else:
+                self.counts["skipped"] += 1
+                self.counts["current"] += 1
+
+        if self.stopped:
+            # Work not started yet is left as it is in the catalog for the next pass
+            for future in self.futures:
+                future.cancel()
+        else:
+            while self._in_flight("enrich"):
+                self.reap()
+            self.upload(force=True)
+        while self.futures:
+            self.reap()
+
+    def _in_flight(self, kind):
+        return sum(1 for k, _ in self.futures.values() if k == kind)
+
+    def reap(self):
+        # Wakes up now and then to send a heartbeat during long Gemini calls
+        done, _ = wait(self.futures, timeout=5, return_when=FIRST_COMPLETED)
+        for future in done:
+            kind, item = self.futures.pop(future)
+            if future.cancelled():
+                continue
+            if kind == "enrich":
+                self._enriched(item, future)
+            else:
+                self._uploaded(item, future)
+        self.tick()
+
+    def _enriched(self, post, future):
+        try:
+            ai_data = future.result()
+        except Exception as e:
+            ai_data = {"error": str(e)}
+        if "error" in ai_data:
+            self.fail(1, f"{post['post_id']}: {ai_data['error']}")
+            return
+        self.counts["enriched"] += 1
+        self.updates[post["post_id"]] = {"ai_data": ai_data, "status": "enriched"}
+        if "annotate" in self.steps:
+            self.ready.append(dict(post, ai_data=ai_data, status="enriched"))
+            self.upload()
+        else:
+            self.counts["current"] += 1
+        if len(self.updates) >= FLUSH_EVERY:
+            self.flush()
+
+    def upload(self, force=False):
+        size = self.runner.batch_size
+        while not self.stopped and (len(self.ready) >= size or (force and self.ready)):
+            if self.token is None:
+                from annotate import get_supabase_token
+
+                self.token = os.getenv("ANNOTATE_TOKEN") or get_supabase_token()
+                if not self.token:
+                    raise RuntimeError("No annotate token: start the job signed in or set the SUPABASE_* credentials")
+            batch, self.ready = self.ready[:size], self.ready[size:]
+            # Their enrichment is stored first, so the upload can move them on to completed
+            self.flush()
+            self.futures[self.upload_pool.submit(self.runner._upload, batch, self.token)] = ("annotate", batch)
+
+    def _uploaded(self, batch, future):
+        try:
+            result, done = future.result()
+        except Exception as e:
+            result, done = {"status": "error", "message": str(e)}, []
+        if done:
+            self.runner.scraper.update_posts({post_id: {"status": "completed"} for post_id in done},
+                                             if_status="enriched")
+        self.counts["annotated"] += len(done)
+        self.counts["current"] += len(done)
+        if len(done) < len(batch):
+            reason = result["message"] if result["status"] != "success" else "not accepted by the API"
+            self.fail(len(batch) - len(done), f"annotate batch of {len(batch)}: {len(batch) - len(done)} {reason}")
+
+    def fail(self, count, error):
+        log.warning("batch job item failed job_id=%s error=%s", self.job_id, error)
+        self.counts["failed"] += count
+        self.counts["current"] += count
+        self.errors = (self.errors + [error])[-MAX_ERRORS:]
+
+    def flush(self):
+        if self.updates:
+            # Posts a user reset or enriched meanwhile are left alone
+            self.runner.scraper.update_posts(self.updates, if_status="pending")
+            self.updates = {}
+
+    def tick(self, force=False):
+        now = time.time()
+        if not force and now - self._last_tick < TICK_SECONDS:
+            return
+        self._last_tick = now
+        job = self.runner.jobs.update(self.job_id, heartbeat=now, errors=self.errors, **self.counts)
+        if self.stopped:
+            return
+        if job.get("status") in ("paused", "cancelled"):
+            self.stopped = job["status"]
+        elif self.runner._stop.is_set():
+            self.stopped = "shutdown"
@@ -0,0 +1,81 @@
+"""
+Latency of deleting / re-statusing a batch of posts: one DELETE
+/api/meme/{id} per post (old) versus the single-pass bulk operations.
+
+Builds a throwaway storage tree with `total` scraped posts and blobs,
+then operates on `batch` ids.
+
+Usage: python3 benchmarks/bench_bulk_ops.py [total] [batch]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import SOURCE_INSTAGRAM
+from scraper import InstaScraper
+
+
+def build_storage(root, total):
+    scraper = InstaScraper(storage_path=root)
+    history = []
+    for i in range(total):
+        post_id = f"P{i:07d}"
+        digest, _ = scraper.blobs.put(post_id.encode() * 64, ".jpg")
+        history.append({
+            "post_id": post_id,
+            "post_url": f"https://www.instagram.com/p/{post_id}/",
+            "caption": "caption " * 20,
+            "image_path": f"/images/bench/{post_id}.jpg",
+            "sha256": digest,
+            "timestamp": "2024-01-01T00:00:00",
+            "username": "bench",
+            "status": "enriched",
+            "ai_data": {"title": "Movie", "tags": [{"name": "tag", "category": "concept"}] * 8},
+        })
+    scraper.catalog.add(history, SOURCE_INSTAGRAM)
+    return scraper
+
+
+def old_delete(scraper, post_ids):
+    # What /api/meme/{post_id} does per request: load, scan, pop, rewrite
+    for post_id in post_ids:
+        with open(scraper.catalog.path, "r") as f:
+            history = json.load(f)
+        index = next((i for i, p in enumerate(history) if p['post_id'] == post_id), None)
+        if index is None:
+            continue
+        post = history.pop(index)
+        scraper.release_image(post)
+        with open(scraper.catalog.path, "w") as f:
+            json.dump(history, f, indent=2)
+
+
+def timed(name, func, total, batch):
+    root = tempfile.mkdtemp(prefix="bench_bulk_")
+    try:
+        scraper = build_storage(root, total)
+        ids = [f"P{i:07d}" for i in range(0, total, max(1, total // batch))][:batch]
+        start = time.perf_counter()
+        func(scraper, ids)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>22}: {elapsed * 1000:10.1f} ms for {len(ids)} ids")
+        return elapsed
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+
+    print(f"{total} posts in storage, batch of {batch}")
+    old = timed("per-id delete (old)", old_delete, total, batch)
+    new = timed("bulk delete", lambda s, ids: s.delete_posts(ids), total, batch)
+    timed("bulk reset-to-pending", lambda s, ids: s.set_status(ids, "pending"), total, batch)
+    timed("bulk mark-completed", lambda s, ids: s.set_status(ids, "completed"), total, batch)
+    print(f"delete speedup: {old / new:.1f}x")
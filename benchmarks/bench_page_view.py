@@ -0,0 +1,94 @@
+"""
+Counts HTTP requests and bytes per page view of the web UI, with a simple
+browser cache model (Cache-Control max-age/immutable, ETag revalidation).
+
+A page view loads index.html, the assets it references, the history API
+(/api/history unless given) and the first N card images (thumbnails, as the
+UI shows them). The first view is cold; later views reuse the cache.
+Run it against a server on the old and the new revision to compare.
+
+Usage: python3 benchmarks/bench_page_view.py [base_url] [views] [images_per_view] [history_path]
+"""
+import gzip
+import re
+import sys
+import time
+
+import requests
+
+ASSET_REF = re.compile(r'(?:src|href)="(/static/[^"]+)"')
+
+
+class BrowserCache:
+    def __init__(self, session, base_url):
+        self.session = session
+        self.base_url = base_url
+        self.entries = {}  # url -> (etag, fresh_until, body)
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes = 0
+
+    def get(self, url):
+        """Returns the (decoded) body for url, going to the network only when the cache says so."""
+        entry = self.entries.get(url)
+        if entry and entry[1] > time.time():
+            return entry[2]
+
+        headers = {"Accept-Encoding": "gzip"}
+        if entry and entry[0]:
+            headers["If-None-Match"] = entry[0]
+
+        response = self.session.get(self.base_url + url, headers=headers, stream=True)
+        wire = response.raw.read(decode_content=False)
+        self.requests += 1
+        self.bytes += len(wire)
+
+        if response.status_code == 304:
+            self.not_modified += 1
+            body = entry[2] if entry else b""
+        elif response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(wire)
+        else:
+            body = wire
+
+        cache_control = response.headers.get("Cache-Control", "")
+        max_age = re.search(r"max-age=(\d+)", cache_control)
+        fresh_until = time.time() + int(max_age.group(1)) if max_age and "no-cache" not in cache_control else 0
+        etag = response.headers.get("ETag") or (entry[0] if entry else None)
+        self.entries[url] = (etag, fresh_until, body)
+        return body
+
+
+def image_url(post, versioned):
+    path = post.get("thumb_path") or post["image_path"]
+    if versioned and post.get("sha256"):
+        return f"{path}?v={post['sha256'][:16]}"
+    return path
+
+
+def page_view(cache, images_per_view, history_path="/api/history"):
+    html = cache.get("/").decode("utf-8", "replace")
+    assets = ASSET_REF.findall(html)
+    for asset in assets:
+        cache.get(asset)
+
+    # The history API is never cached
+    history = cache.session.get(cache.base_url + history_path).json()
+    cache.requests += 1
+    versioned = any("?v=" in a for a in assets)
+    for post in history[:images_per_view]:
+        cache.get(image_url(post, versioned))
+
+
+if __name__ == "__main__":
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+    views = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    images = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    history_path = sys.argv[4] if len(sys.argv) > 4 else "/api/history"
+
+    cache = BrowserCache(requests.Session(), base_url)
+    for view in range(1, views + 1):
+        before_requests, before_bytes, before_304 = cache.requests, cache.bytes, cache.not_modified
+        page_view(cache, images, history_path)
+        print(f"view {view}: {cache.requests - before_requests:5d} requests "
+              f"({cache.not_modified - before_304} x 304), {cache.bytes - before_bytes:>10,d} bytes")
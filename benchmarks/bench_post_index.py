@@ -0,0 +1,159 @@
+"""
+Memory and lookup latency of the catalog's in-memory index (post_index.py)
+against plain dicts, the way the catalog held posts before, with N stored
+posts (two thirds of them enriched).
+
+Each variant is measured in a fresh process: RSS growth after loading
+`posts.json`, load time, and the time per lookup by id, per dashboard page,
+per account selection, per `ai_data` read and for the full history as JSON.
+
+Usage: python3 benchmarks/bench_post_index.py [posts]
+"""
+import copy
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+LOOKUPS = 10000
+
+
+def make_posts(count):
+    from fakes import AI_DATA
+
+    statuses = ("pending", "enriched", "completed")
+    for i in range(count):
+        post_id = f"P{i:07d}"
+        status = statuses[i % 3]
+        yield {
+            "post_id": post_id,
+            "post_url": f"https://www.instagram.com/p/{post_id}/",
+            "caption": f"caption {i} " * 10,
+            "timestamp": "2024-01-01T00:00:00",
+            "scraped_at": "2024-01-01T00:00:00",
+            "username": f"user{i % 50}",
+            "source": "instagram",
+            "status": status,
+            "image_path": f"/images/user{i % 50}/{post_id}.jpg",
+            "thumb_path": f"/thumbnails/user{i % 50}/{post_id}.jpg",
+            "local_path": f"storage/blobs/{i % 256:02x}/00/{i:064x}.jpg",
+            "sha256": f"{i:064x}",
+            "updated_at": 1700000000.0 + i,
+            "ai_data": copy.deepcopy(AI_DATA) if status != "pending" else {},
+        }
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    # Peak rather than current RSS where /proc is missing (kB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def per_call_us(func, args):
+    start = time.perf_counter()
+    for arg in args:
+        func(arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def measure(variant, path, count):
+    """Runs in the child process; prints one JSON line of results."""
+    import gc
+    import random
+
+    from post_index import PostIndex
+    from storage import read_json, read_json_items
+
+    gc.collect()
+    before = rss_mb()
+    start = time.perf_counter()
+    if variant == "dicts":
+        posts = read_json(path, [])
+        by_id = {p["post_id"]: p for p in posts}
+        by_status = {}
+        for p in posts:
+            by_status.setdefault(p["status"], []).append(p)
+
+        def select(username):
+            return [p for p in by_status["pending"] if p["username"] == username]
+
+        def history():
+            return json.dumps(posts)
+    else:
+        index = PostIndex(read_json_items(path))
+        by_id, by_status = index.by_id, {status: index.by_status[(None, status)]
+                                         for status in ("pending", "enriched", "completed")}
+
+        def select(username):
+            return index.select("pending", None, [username])
+
+        def history():
+            return index.to_json(index.posts)
+    load = time.perf_counter() - start
+    gc.collect()
+    grown = rss_mb() - before
+
+    ids = [f"P{random.randrange(count):07d}" for _ in range(LOOKUPS)]
+    enriched = [i for i in ids if by_id[i]["status"] != "pending"][:LOOKUPS // 2]
+    offsets = [random.randrange(max(1, len(by_status["enriched"]) - 50)) for _ in range(1000)]
+    start = time.perf_counter()
+    encoded = history()
+    print(json.dumps({
+        "variant": variant,
+        "rss_mb": round(grown, 1),
+        "load_s": round(load, 2),
+        "get_us": round(per_call_us(by_id.get, ids), 2),
+        "status_us": round(per_call_us(lambda pid: by_id[pid]["status"], ids), 2),
+        "ai_data_us": round(per_call_us(lambda pid: by_id[pid]["ai_data"]["title"], enriched), 2),
+        "page_us": round(per_call_us(lambda o: by_status["enriched"][o:o + 50], offsets), 2),
+        "account_ms": round(per_call_us(select, [f"user{n}" for n in range(50)]) / 1000, 2),
+        "history_s": round(time.perf_counter() - start, 2),
+        "history_mb": round(len(encoded) / 1e6, 1),
+    }))
+
+
+def run(count):
+    workdir = tempfile.mkdtemp(prefix="bench_post_index_")
+    path = os.path.join(workdir, "posts.json")
+    try:
+        with open(path, "w") as f:
+            f.write("[\n")
+            for i, post in enumerate(make_posts(count)):
+                f.write((",\n" if i else "") + json.dumps(post, indent=2))
+            f.write("\n]")
+        rows = []
+        for variant in ("dicts", "index"):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", variant, path, str(count)],
+                                 check=True, capture_output=True, text=True).stdout
+            rows.append(json.loads(out.strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    columns = [key for key in rows[0] if key != "variant"]
+    print(f"{count} posts")
+    print(f"{'':>8} " + " ".join(f"{c:>11}" for c in columns))
+    for row in rows:
+        print(f"{row['variant']:>8} " + " ".join(f"{row[c]:>11}" for c in columns))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,104 @@
+"""
+Storage reconciliation (reconcile.py) over a synthetic store of N posts, each
+with a blob and a thumbnail (2N files).
+
+Runs:
+  first        nothing remembered yet: every folder listed, every file checked
+  nightly      nothing changed since the last run
+  changed      a few posts added and files removed since the last run
+
+Usage: python3 benchmarks/bench_reconcile.py [posts] [workers]
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def build(storage, count, start=0):
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buf, "JPEG")
+    thumb = buf.getvalue()
+    posts, refs = [], {}
+    for i in range(start, start + count):
+        data = b"image %d" % i
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(storage, "blobs", digest[:2], digest[2:4], f"{digest}.jpg")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        refs.setdefault(digest[:2], {})[digest] = {"ext": ".jpg", "refs": 1}
+        username = f"account{i % 200}"
+        thumb_path = os.path.join(storage, "thumbnails", username, f"p{i}.jpg")
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        with open(thumb_path, "wb") as f:
+            f.write(thumb)
+        posts.append({"post_id": f"p{i}", "username": username, "source": "instagram", "status": "pending",
+                      "image_path": f"/images/{username}/p{i}.jpg", "thumb_path": f"/thumbnails/{username}/p{i}.jpg",
+                      "local_path": path, "sha256": digest})
+    for shard, entries in refs.items():
+        path = os.path.join(storage, "blobs", shard, "refs.json")
+        existing = json.load(open(path)) if os.path.exists(path) else {}
+        existing.update(entries)
+        with open(path, "w") as f:
+            json.dump(existing, f)
+    return posts
+
+
+def age(storage):
+    # As if the store had been written yesterday
+    old = time.time() - 86400
+    for root, dirs, files in os.walk(storage):
+        for name in dirs + files:
+            os.utime(os.path.join(root, name), (old, old))
+
+
+def run(posts, workers):
+    from reconcile import Reconciler
+    from scraper import InstaScraper
+
+    workdir = tempfile.mkdtemp(prefix="bench_reconcile_")
+    storage = os.path.join(workdir, "storage")
+    try:
+        with open(os.path.join(workdir, "posts.json"), "w") as f:
+            json.dump(build(storage, posts), f)
+        os.replace(os.path.join(workdir, "posts.json"), os.path.join(storage, "posts.json"))
+        age(storage)
+        reconciler = Reconciler(InstaScraper(storage), workers=workers)
+
+        def timed(name):
+            start = time.perf_counter()
+            report = reconciler.run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:>8}: {elapsed:7.2f} s, {sum(report['files'].values())} files, "
+                  f"{report['listed_dirs']} folders listed, {report['checked']} checked, {report['counts']}")
+
+        timed("first")
+        timed("nightly")
+
+        added = build(storage, 20, start=posts)
+        with open(os.path.join(storage, "posts.json")) as f:
+            stored = json.load(f)
+        with open(os.path.join(storage, "posts.json"), "w") as f:
+            json.dump(stored + added, f)
+        for post in stored[:5]:
+            os.remove(post["local_path"])
+        timed("changed")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    posts = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    print(f"{posts} posts, {workers} workers")
+    run(posts, workers)
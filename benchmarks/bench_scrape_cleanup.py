@@ -0,0 +1,102 @@
+"""
+Profile scraping with Instaloader's download_post plus a sidecar cleanup
+scan after every post (how scrape_profile fetched images before) against
+the direct image fetch, both through the real scrape_profile -> ingest ->
+persist path against recorded Instagram responses (fakes.ReplayInstagram).
+
+The profile folder already holds `existing` files from earlier scrapes, as
+a long-scraped account's does. Only the per-post image fetch differs
+between the two runs: the baseline subclass overrides
+InstaScraper._download_image with the old code.
+
+Usage: python3 benchmarks/bench_scrape_cleanup.py [existing_files] [new_posts]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import ReplayInstagram, instagram_fixtures
+from scraper import InstaScraper
+
+USERNAME = "replayacct"
+
+
+class SidecarScraper(InstaScraper):
+    """scrape_profile's image fetch before it was changed to get_raw."""
+
+    scanned = 0
+
+    @property
+    def L(self):
+        loader = InstaScraper.L.fget(self)
+        # Instaloader's default: a caption .txt next to every image
+        loader.post_metadata_txt_pattern = "{caption}"
+        return loader
+
+    def _download_image(self, post, username):
+        profile_dir = os.path.join(self.storage_path, "instagram", username)
+        self.L.download_post(post, target=username)
+
+        # Cleanup: Instaloader downloads .json.xz and .txt files too. Delete them.
+        image_file = None
+        for file in os.listdir(profile_dir):
+            self.scanned += 1
+            if not file.endswith(".jpg") and not file.endswith(".jpeg") and not file.endswith(".png"):
+                try:
+                    os.remove(os.path.join(profile_dir, file))
+                except OSError:
+                    pass
+            elif file.startswith(post.shortcode):
+                image_file = file
+
+        if image_file is None:
+            raise FileNotFoundError(f"Instaloader saved no image for {post.shortcode}")
+        with open(os.path.join(profile_dir, image_file), 'rb') as f:
+            return f.read()
+
+
+def run(cls, existing, posts):
+    workdir = tempfile.mkdtemp(prefix="bench_cleanup_")
+    storage = os.path.join(workdir, "storage")
+    profile_dir = os.path.join(storage, "instagram", USERNAME)
+    os.makedirs(profile_dir)
+    for i in range(existing):
+        with open(os.path.join(profile_dir, f"OLD{i:06d}.jpg"), "wb") as f:
+            f.write(b"x")
+    replay = ReplayInstagram(instagram_fixtures(USERNAME, posts))
+    try:
+        with replay.redirect():
+            scraper = cls(storage)
+            scraper.download_delay = 0
+            scraper.L.context.sleep = False
+            scraper.L.context.quiet = True
+            start = time.perf_counter()
+            result = scraper.scrape_profile(USERNAME, limit=posts)
+            elapsed = time.perf_counter() - start
+        assert "error" not in result, result
+        sidecars = [f for f in os.listdir(profile_dir) if not f.endswith(".jpg")]
+        return elapsed, result["scraped_count"], getattr(scraper, "scanned", 0), len(sidecars)
+    finally:
+        replay.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    existing = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    posts = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"Profile folder with {existing} existing files, scraping {posts} new posts")
+    timings = {}
+    for name, cls in (("old", SidecarScraper), ("new", InstaScraper)):
+        elapsed, saved, scanned, sidecars = run(cls, existing, posts)
+        timings[name] = elapsed
+        print(f"{name:>4}: {elapsed * 1000:9.1f} ms, {saved} posts saved "
+              f"({elapsed / max(saved, 1) * 1000:.2f} ms/post), {scanned} dir entries scanned, "
+              f"{sidecars} sidecars left")
+    print(f"speedup: {timings['old'] / timings['new']:.1f}x")
@@ -0,0 +1,83 @@
+"""
+Profile scraping against recorded Instagram responses (fakes.ReplayInstagram),
+with the response cache off and on (session cookies are reused in both).
+
+Every scenario starts from a profile whose posts are all stored already, as
+for a periodic re-scrape, and walks the whole post listing looking for new
+posts:
+  repeat   scraped again right away
+  expired  scraped again after the profile TTL ran out (nothing changed)
+  new      3 posts were added meanwhile (and the TTL ran out)
+
+Reports wall time and the requests that reached "Instagram" per run.
+Instaloader's random sleeps and the per-image delay are turned off, so the
+numbers show request counts rather than politeness waits.
+
+Usage: python3 benchmarks/bench_scrape_replay.py [posts] [latency_ms]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import ReplayInstagram, instagram_fixtures
+
+USERNAME = "replayacct"
+
+
+def scrape(replay, storage, limit):
+    from scraper import InstaScraper
+
+    scraper = InstaScraper(storage)
+    scraper.download_delay = 0
+    scraper.L.context.sleep = False
+    before = sum(replay.requests.values())
+    start = time.perf_counter()
+    result = scraper.scrape_profile(USERNAME, limit=limit)
+    elapsed = time.perf_counter() - start
+    assert "error" not in result, result
+    return elapsed, sum(replay.requests.values()) - before, result["scraped_count"]
+
+
+def run(cached, posts, latency):
+    workdir = tempfile.mkdtemp(prefix="bench_replay_")
+    storage = os.path.join(workdir, "storage")
+    replay = ReplayInstagram(instagram_fixtures(USERNAME, posts), latency=latency)
+    env = {"INSTAGRAM_CACHE": "1" if cached else "0", "INSTAGRAM_CACHE_TTL": "3600"}
+    rows = []
+    try:
+        with mock.patch.dict(os.environ, env), replay.redirect():
+            # Store every post first
+            scrape(replay, storage, posts)
+
+            rows.append(("repeat",) + scrape(replay, storage, 10))
+
+            with mock.patch("ig_client.time.time", return_value=time.time() + 3601):
+                rows.append(("expired",) + scrape(replay, storage, 10))
+
+            replay.fixtures = instagram_fixtures(USERNAME, posts + 3)
+            with mock.patch("ig_client.time.time", return_value=time.time() + 7202):
+                rows.append(("new",) + scrape(replay, storage, 10))
+    finally:
+        replay.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows, replay.not_modified
+
+
+if __name__ == "__main__":
+    posts = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    print(f"profile with {posts} posts, {latency * 1000:.0f} ms per replayed response")
+    for cached in (False, True):
+        rows, not_modified = run(cached, posts, latency)
+        label = "cache" if cached else "no cache"
+        for name, elapsed, requests, saved in rows:
+            print(f"{label:>16} {name:>8}: {elapsed * 1000:8.1f} ms, {requests:3d} requests, {saved} new posts")
+        if cached:
+            print(f"{'':>16} {not_modified} answered 304 Not Modified")
@@ -0,0 +1,68 @@
+"""
+Startup-time regression check for the web app.
+
+Imports server.py in fresh interpreters, reports the median wall time and
+the slowest modules from `python -X importtime`. The run fails if the import
+exceeds the budget or if any heavy client library is imported eagerly.
+
+Usage: python3 benchmarks/bench_startup.py [budget_ms] [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# These must only be imported on first use
+LAZY_MODULES = ["google.generativeai", "instaloader", "PIL.Image", "requests"]
+
+PROBE = f"""
+import sys, time, json
+start = time.perf_counter()
+import server
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "eager": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def run_probe():
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", PROBE],
+                         cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def importtime_top(limit=10):
+    out = subprocess.run([sys.executable, "-W", "ignore", "-X", "importtime", "-c", "import server"],
+                         cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+if __name__ == "__main__":
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 700
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    results = [run_probe() for _ in range(runs)]
+    median = statistics.median(r["ms"] for r in results)
+    eager = sorted({m for r in results for m in r["eager"]})
+
+    print(f"import server: median {median:.0f} ms over {runs} runs (budget {budget_ms:.0f} ms)")
+    print("slowest modules (cumulative us, self us):")
+    for cumulative, self_us, name in importtime_top():
+        print(f"  {cumulative:>9} {self_us:>9}  {name}")
+
+    failed = False
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager)}")
+        failed = True
+    if median > budget_ms:
+        print("FAIL: over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,194 @@
+"""
+Benchmark suite for the ingest, enrich, annotate, read (history, dashboard) and export paths, run
+against local fakes (see fakes.py) with 1k / 10k / 100k stored posts.
+
+Needs pytest-benchmark (`pip install pytest pytest-benchmark`). The file is
+not picked up by a plain `pytest` run; pass it explicitly:
+
+    python3 -m pytest benchmarks/bench_suite.py --benchmark-autosave
+    # later, compare against the last saved run and fail on regressions
+    python3 -m pytest benchmarks/bench_suite.py --benchmark-compare --benchmark-compare-fail=mean:15%
+
+Results are saved under .benchmarks/. BENCH_SIZES=1000,10000 limits the
+store sizes.
+"""
+import os
+import sys
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import AI_DATA, FakeAnnotate, FakeGemini, StubCDN, jpeg
+from catalog import SOURCE_INSTAGRAM
+from storage import read_json, write_json
+
+SIZES = [int(n) for n in os.getenv("BENCH_SIZES", "1000,10000,100000").split(",")]
+# Posts per enrich / annotate request and items per Apify import
+BATCH = 50
+APIFY_ITEMS = 100
+# Apify images are numbered above the stored posts so every one is new
+APIFY_OFFSET = 10_000_000
+
+
+@pytest.fixture(scope="module")
+def env(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("bench")
+    os.symlink(os.path.join(ROOT, "static"), workdir / "static")
+    cdn = StubCDN()
+    annotate = FakeAnnotate(latency=0.05)
+    gemini = FakeGemini(latency=0.05, rate_limit_every=10)
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with mock.patch.dict(os.environ, annotate.env()):
+            # server.py works relative to the current directory, so import it here
+            import server
+            from ai_processor import set_model
+            from fastapi.testclient import TestClient
+
+            set_model(gemini)
+            digests = [server.scraper.blobs.put(jpeg(i), ".jpg")[0] for i in range(BATCH)]
+            yield SimpleNamespace(server=server, scraper=server.scraper, client=TestClient(server.app),
+                                  cdn=cdn, gemini=gemini, annotate=annotate, digests=digests)
+    finally:
+        os.chdir(cwd)
+        cdn.close()
+        annotate.close()
+
+
+def make_posts(size, digests=()):
+    statuses = ("pending", "enriched", "completed")
+    posts = []
+    for i in range(size):
+        post_id = f"P{i:07d}"
+        status = "enriched" if i < len(digests) else statuses[i % 3]
+        posts.append({
+            "post_id": post_id,
+            "post_url": f"https://www.instagram.com/p/{post_id}/",
+            "caption": f"caption {i} " * 10,
+            "timestamp": "2024-01-01T00:00:00",
+            "scraped_at": "2024-01-01T00:00:00",
+            "username": f"user{i % 50}",
+            "status": status,
+            "image_path": f"/images/user{i % 50}/{post_id}.jpg",
+            "thumb_path": f"/thumbnails/user{i % 50}/{post_id}.jpg",
+            "sha256": digests[i] if i < len(digests) else f"{i:064x}",
+            "ai_data": AI_DATA if status != "pending" else {},
+        })
+    return posts
+
+
+def seed(env, size):
+    catalog = env.scraper.catalog
+    write_json(catalog.path, [catalog.prepare(p, SOURCE_INSTAGRAM) for p in make_posts(size, env.digests)])
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_metadata_load(benchmark, tmp_path, size):
+    path = str(tmp_path / "metadata.json")
+    write_json(path, make_posts(size))
+    posts = benchmark(read_json, path, [])
+    assert len(posts) == size
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_metadata_save(benchmark, tmp_path, size):
+    path = str(tmp_path / "metadata.json")
+    posts = make_posts(size)
+    benchmark(write_json, path, posts)
+    assert os.path.getsize(path) > 0
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_history(benchmark, env, size):
+    seed(env, size)
+    response = benchmark(env.client.get, "/api/history")
+    assert response.status_code == 200
+    assert len(response.json()) == size
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_dashboard(benchmark, env, size):
+    seed(env, size)
+
+    def dashboard():
+        stats = env.client.get("/api/stats").json()
+        pages = [env.client.get("/api/posts", params={"status": s, "source": SOURCE_INSTAGRAM}).json()
+                 for s in ("pending", "enriched", "completed")]
+        return stats, pages
+
+    stats, pages = benchmark(dashboard)
+    assert stats["total"] == size
+    assert sum(page["total"] for page in pages) == size
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_process_apify_json(benchmark, env, size):
+    seed(env, size)
+    items = [{
+        "shortCode": f"AP{n:06d}",
+        "ownerUsername": "apify",
+        "displayUrl": env.cdn.image_url(APIFY_OFFSET + n),
+        "caption": f"imported {n}",
+        "timestamp": "2024-01-01T00:00:00",
+    } for n in range(APIFY_ITEMS)]
+    ids = [item["shortCode"] for item in items]
+
+    def reset():
+        env.scraper.delete_posts(ids)
+        return (items,), {}
+
+    result = benchmark.pedantic(env.scraper.process_apify_json, setup=reset, rounds=3)
+    assert result["scraped_count"] == APIFY_ITEMS
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_enrich(benchmark, env, size):
+    seed(env, size)
+    post_ids = [f"P{i:07d}" for i in range(BATCH)]
+
+    response = benchmark.pedantic(env.client.post, args=("/api/enrich",),
+                                  kwargs={"json": {"post_ids": post_ids}}, rounds=3)
+    assert response.status_code == 200
+    results = response.json()
+    # The fake rate-limits every 10th call; those come back as per-post errors
+    assert sum(r["status"] == "success" for r in results) >= BATCH * 8 // 10
+    assert any("429" in r.get("message", "") for r in results)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_annotate(benchmark, env, size):
+    seed(env, size)
+    post_ids = [f"P{i:07d}" for i in range(BATCH)]
+
+    def reset():
+        env.scraper.set_status(post_ids, "enriched")
+        return ("/api/annotate",), {"json": {"post_ids": post_ids}}
+
+    # No Authorization header: the server signs in with the system account first
+    response = benchmark.pedantic(env.client.post, setup=reset, rounds=3)
+    assert response.status_code == 200
+    assert response.json()["status"] == "success"
+    completed = env.scraper.catalog.get_many(post_ids)
+    assert all(p["status"] == "completed" for p in completed)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("fmt", ["ndjson", "parquet"])
+def test_export(benchmark, env, size, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    seed(env, size)
+
+    def export():
+        response = env.client.get("/api/export", params={"format": fmt})
+        return response.status_code, len(response.content)
+
+    status, length = benchmark(export)
+    assert status == 200 and length > 0
@@ -0,0 +1,92 @@
+"""
+Uploading a folder of images: one POST /api/upload per file (old) versus
+POST /api/uploads batches, with `existing` uploads already stored.
+
+Runs the app in-process (TestClient) in a throwaway directory and reports
+wall time and catalog writes for each way.
+
+Usage: python3 benchmarks/bench_uploads.py [files] [existing] [batch]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import jpeg
+
+
+def seed(scraper, existing):
+    from catalog import SOURCE_UPLOAD
+
+    records = [{
+        "post_id": f"up_seed{i:07d}",
+        "username": "Manual Upload",
+        "status": "pending",
+        "caption": "",
+        "ai_data": {},
+        "timestamp": 0,
+        "image_path": f"/upload-images/up_seed{i:07d}.jpg",
+        "sha256": f"{i:064x}",
+    } for i in range(existing)]
+    scraper.catalog.add(records, SOURCE_UPLOAD)
+
+
+def run(name, upload, files, existing):
+    workdir = tempfile.mkdtemp(prefix="bench_uploads_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        os.symlink(os.path.join(ROOT, "static"), "static")
+        for module in ("server",):
+            sys.modules.pop(module, None)
+        import server
+        from fastapi.testclient import TestClient
+        from metrics import METADATA_SAVE_SECONDS
+
+        seed(server.scraper, existing)
+        client = TestClient(server.app)
+        saves_before = sum(entry[2] for key, entry in METADATA_SAVE_SECONDS._values.items() if key == ("posts.json",))
+        start = time.perf_counter()
+        stored = upload(client, files)
+        elapsed = time.perf_counter() - start
+        saves = sum(entry[2] for key, entry in METADATA_SAVE_SECONDS._values.items() if key == ("posts.json",)) - saves_before
+        print(f"{name:>24}: {elapsed * 1000:9.1f} ms, {stored} stored, {saves} catalog writes")
+        return elapsed
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def one_by_one(client, files):
+    stored = 0
+    for name, data in files:
+        response = client.post("/api/upload", files={"file": (name, data, "image/jpeg")})
+        stored += response.status_code == 200
+    return stored
+
+
+def batched(batch):
+    def upload(client, files):
+        stored = 0
+        for i in range(0, len(files), batch):
+            parts = [("files", (name, data, "image/jpeg")) for name, data in files[i:i + batch]]
+            stored += len(client.post("/api/uploads", files=parts).json()["uploaded"])
+        return stored
+    return upload
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    existing = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    batch = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    files = [(f"template_{i}.jpg", jpeg(i, size=256)) for i in range(count)]
+    print(f"{count} files of ~{sum(len(d) for _, d in files) // count} bytes, {existing} uploads already stored")
+    old = run("per-file /api/upload", one_by_one, files, existing)
+    new = run(f"/api/uploads x{batch}", batched(batch), files, existing)
+    print(f"speedup: {old / new:.1f}x")
@@ -0,0 +1,126 @@
+"""
+Throughput of the web app as the number of uvicorn worker processes grows.
+
+For each worker count, starts `uvicorn server:app --workers N` in a
+throwaway directory seeded with `posts` scraped posts, then hammers
+/api/history and image URLs from `clients` threads for `seconds` and
+reports requests per second. Scaling flattens out at the machine's core
+count.
+
+Usage: python3 benchmarks/bench_workers.py [workers,...] [posts] [clients] [seconds]
+"""
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog import SOURCE_INSTAGRAM
+from scraper import InstaScraper
+
+
+def seed(workdir, posts):
+    os.symlink(os.path.join(ROOT, "static"), os.path.join(workdir, "static"))
+    scraper = InstaScraper(storage_path=os.path.join(workdir, "storage"))
+    history = []
+    for i in range(posts):
+        post_id = f"P{i:07d}"
+        digest, _ = scraper.blobs.put(post_id.encode() * 512, ".jpg")
+        history.append({
+            "post_id": post_id,
+            "post_url": f"https://www.instagram.com/p/{post_id}/",
+            "caption": "caption " * 20,
+            "image_path": f"/images/bench/{post_id}.jpg",
+            "sha256": digest,
+            "timestamp": "2024-01-01T00:00:00",
+            "username": "bench",
+            "status": "enriched",
+            "ai_data": {"title": "Movie", "tags": [{"name": "tag", "category": "concept"}] * 8},
+        })
+    scraper.catalog.add(history, SOURCE_INSTAGRAM)
+    return [p["image_path"] for p in history]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(base, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base + "/api/history", timeout=5).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def hammer(base, image_paths, clients, seconds):
+    counts = [0] * clients
+    errors = [0] * clients
+    stop = time.time() + seconds
+
+    def client(n):
+        i = 0
+        while time.time() < stop:
+            # One history load for every few image loads, like a page view
+            path = "/api/history" if i % 8 == 0 else image_paths[(n + i * clients) % len(image_paths)]
+            i += 1
+            try:
+                urllib.request.urlopen(base + path, timeout=30).read()
+                counts[n] += 1
+            except OSError:
+                errors[n] += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts), sum(errors)
+
+
+def run(workers, workdir, image_paths, clients, seconds):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        wait_ready(base)
+        done, failed = hammer(base, image_paths, clients, seconds)
+        return done / seconds, failed
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    counts = [int(n) for n in sys.argv[1].split(",")] if len(sys.argv) > 1 else [1, 2, 4]
+    posts = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    clients = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    seconds = float(sys.argv[4]) if len(sys.argv) > 4 else 10
+
+    workdir = tempfile.mkdtemp(prefix="bench_workers_")
+    try:
+        image_paths = seed(workdir, posts)
+        print(f"{posts} posts, {clients} clients, {seconds:.0f}s per run, {os.cpu_count()} cpus")
+        baseline = None
+        for workers in counts:
+            rps, failed = run(workers, workdir, image_paths, clients, seconds)
+            baseline = baseline or rps
+            print(f"  workers={workers:<2} {rps:8.1f} req/s  ({rps / baseline:.2f}x, {failed} errors)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
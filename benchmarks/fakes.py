@@ -0,0 +1,328 @@
+"""
+Local stand-ins for the services the app talks to, so benchmarks are
+reproducible and run offline.
+
+StubCDN       serves a distinct small JPEG at /{n}.jpg, like Apify `displayUrl` links.
+FakeGemini    drop-in for the Gemini model (see ai_processor.set_model), with
+              configurable latency and injected 429 rate-limit errors.
+FakeAnnotate  the annotate API (POST /annotate) and Supabase sign-in (POST /signin).
+ReplayInstagram
+              replays recorded Instagram responses (profile page, web_profile_info,
+              post-listing GraphQL pages, images) to Instaloader; see
+              instagram_fixtures() for the recording format.
+"""
+import asyncio
+import io
+import json
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+# What Gemini returns for every image; passes the annotate actor/title filter
+AI_DATA = {
+    "title": "The Dark Knight",
+    "releaseYear": 2008,
+    "genre": "Action",
+    "director": "Christopher Nolan",
+    "emotionLabel": "Tension",
+    "emotionDescription": "A standoff where neither side is willing to blink.",
+    "relatedEmotions": ["Suspense", "Fear"],
+    "memeReleaseYear": 2016,
+    "actors": [{"name": "Heath Ledger", "dob": "1979-04-04",
+                "filmography": ["Brokeback Mountain", "A Knight's Tale", "10 Things I Hate About You"]}],
+    "dialogs": [{"text": "Why so serious?", "actor": "Heath Ledger"}],
+    "tags": [{"name": name, "category": "concept"} for name in ("Chaos", "Villain", "Interrogation", "Joker", "Gotham")],
+}
+
+
+@lru_cache(maxsize=None)
+def jpeg(n, size=64):
+    """A small JPEG whose bytes (and so sha256) differ for every `n`."""
+    from PIL import Image
+
+    img = Image.new("RGB", (size, size), ((n * 37) % 256, (n * 91) % 256, (n // 256) % 256))
+    img.putpixel((0, 0), (n % 256, (n >> 8) % 256, (n >> 16) % 256))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class _Server:
+    def __init__(self, handler):
+        handler.log_message = lambda *args: None
+        handler.fake = self
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _CDNHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        match = re.fullmatch(r"/(\d+)\.jpg", self.path)
+        if not match:
+            self.send_error(404)
+            return
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        body = jpeg(int(match.group(1)))
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.fake.requests += 1
+
+
+class StubCDN(_Server):
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        super().__init__(type("CDNHandler", (_CDNHandler,), {}))
+
+    def image_url(self, n):
+        return f"{self.url}/{n}.jpg"
+
+
+class RateLimited(Exception):
+    """Stands in for the SDK's ResourceExhausted error."""
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGemini:
+    """Answers `generate_content(_async)` with AI_DATA after `latency` seconds.
+
+    Every `rate_limit_every`-th call raises a 429 instead (0 disables it).
+    """
+
+    def __init__(self, latency=0.05, rate_limit_every=0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._text = json.dumps(AI_DATA)
+
+    def _next(self):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        if self.rate_limit_every and calls % self.rate_limit_every == 0:
+            raise RateLimited("429 Resource has been exhausted (e.g. check quota).")
+        return _Response(self._text)
+
+    def generate_content(self, contents):
+        time.sleep(self.latency)
+        return self._next()
+
+    async def generate_content_async(self, contents):
+        await asyncio.sleep(self.latency)
+        return self._next()
+
+
+class _AnnotateHandler(BaseHTTPRequestHandler):
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/signin":
+            self._reply(200, {"access_token": "fake-token", "user": {"id": "bench"}})
+            return
+        if self.path != "/annotate":
+            self._reply(404, {"error": "not found"})
+            return
+        if self.headers.get("Authorization") != "Bearer fake-token":
+            self._reply(401, {"error": "unauthorized"})
+            return
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        indices = sorted({int(i) for i in re.findall(rb'name="items\[(\d+)\]title"', body)})
+        self.fake.uploads += 1
+        self.fake.items += len(indices)
+        self._reply(201, {"status": "Success", "data": {"results": [{"index": i} for i in indices]}})
+
+
+class FakeAnnotate(_Server):
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.uploads = 0
+        self.items = 0
+        super().__init__(type("AnnotateHandler", (_AnnotateHandler,), {}))
+
+    def env(self):
+        """Environment variables pointing the server at this fake."""
+        return {
+            "ANNOTATE_API_URL": f"{self.url}/annotate",
+            "SUPABASE_SIGNIN_URL": f"{self.url}/signin",
+            "SUPABASE_USER": "bench",
+            "SUPABASE_PASSWORD": "bench",
+            "SUPABASE_ANON_KEY": "anon",
+        }
+
+
+# --- Instagram replay -------------------------------------------------------
+
+IG_PAGE_SIZE = 12
+IG_CDN = "scontent.cdninstagram.com"
+
+
+def _ig_post(username, n):
+    return {
+        "__typename": "GraphImage",
+        "id": str(9_000_000 + n),
+        "shortcode": f"RP{n:06d}",
+        "is_video": False,
+        "display_url": f"https://{IG_CDN}/{n}.jpg",
+        "taken_at_timestamp": 1_700_000_000 + n * 3600,
+        "edge_media_to_caption": {"edges": [{"node": {"text": f"replayed post {n}"}}]},
+        "owner": {"id": "4242", "username": username},
+    }
+
+
+def _ig_edges(username, numbers, cursor_after):
+    # Cursors name the last post of a page, as Instagram's do
+    return {
+        "count": len(numbers),
+        "page_info": {"has_next_page": cursor_after is not None, "end_cursor": cursor_after},
+        "edges": [{"node": _ig_post(username, n)} for n in numbers],
+    }
+
+
+def instagram_fixtures(username, posts):
+    """Recorded responses for a public profile with `posts` image posts (newest
+    first), keyed the way ReplayInstagram looks them up:
+
+        "GET www.instagram.com/"                             -> sets the csrftoken cookie
+        "GET www.instagram.com/{username}/"                  -> profile page (HTML with embedded JSON)
+        "GET www.instagram.com/api/v1/users/web_profile_info/" -> profile + first page of posts
+        "POST www.instagram.com/graphql/query after={cursor}" -> next page of posts
+        "GET scontent.cdninstagram.com/{n}.jpg"              -> image
+
+    Each value is `{"status", "headers", "body"}`; `body` is text, or a JSON
+    value to be serialized. A real session can be recorded into the same shape.
+    """
+    numbers = list(range(posts, 0, -1))
+    pages = [numbers[i:i + IG_PAGE_SIZE] for i in range(0, len(numbers), IG_PAGE_SIZE)] or [[]]
+
+    def cursor(index):
+        return f"c{pages[index][-1]}" if index + 1 < len(pages) else None
+
+    embedded = {"require": [{"__bbox": {"result": {"data": {"xig_user_by_username": {
+        "pk": "4242", "username": username, "full_name": username.title(), "is_private": False,
+        "media_count": posts}}}}}]}
+    fixtures = {
+        "GET www.instagram.com/": {"status": 200, "headers": {"Set-Cookie": "csrftoken=replaycsrf; Path=/"},
+                                   "body": "<html></html>"},
+        f"GET www.instagram.com/{username}/": {
+            "status": 200, "headers": {"Content-Type": "text/html"},
+            "body": f'<html><script type="application/json">{json.dumps(embedded)}</script></html>'},
+        "GET www.instagram.com/api/v1/users/web_profile_info/": {
+            "status": 200, "headers": {"ETag": f'"profile-{posts}"'},
+            "body": {"status": "ok", "data": {"user": {
+                "id": "4242", "username": username, "full_name": username.title(), "is_private": False,
+                "edge_owner_to_timeline_media": _ig_edges(username, pages[0], cursor(0))}}}},
+    }
+    for index in range(1, len(pages)):
+        fixtures[f"POST www.instagram.com/graphql/query after={cursor(index - 1)}"] = {
+            "status": 200, "headers": {},
+            "body": {"status": "ok", "data": {"user": {
+                "edge_owner_to_timeline_media": _ig_edges(username, pages[index], cursor(index))}}}}
+    return fixtures
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    def _replay(self, method, body=b""):
+        url = urlsplit(self.path)
+        host, _, path = url.path.lstrip("/").partition("/")
+        key = f"{method} {host}/{path}"
+        if method == "POST" and path == "graphql/query":
+            variables = json.loads(parse_qs(body.decode()).get("variables", ["{}"])[0])
+            key += f" after={variables.get('after')}"
+        self.fake.requests[key.split(" after=")[0]] += 1
+
+        match = re.fullmatch(rf"GET {re.escape(IG_CDN)}/(\d+)\.jpg", key)
+        if match:
+            fixture = {"status": 200, "headers": {"Content-Type": "image/jpeg"}, "body": jpeg(int(match.group(1)))}
+        else:
+            fixture = self.fake.fixtures.get(key, {"status": 404, "headers": {}, "body": {"status": "fail"}})
+
+        etag = fixture["headers"].get("ETag")
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.fake.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        payload = fixture["body"]
+        if not isinstance(payload, (bytes, str)):
+            payload = json.dumps(payload)
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        self.send_response(fixture["status"])
+        headers = {"Content-Type": "application/json", **fixture["headers"]}
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._replay("GET")
+
+    def do_POST(self):
+        self._replay("POST", self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+
+class ReplayInstagram(_Server):
+    """Serves `fixtures` (see instagram_fixtures) in place of Instagram.
+
+    Inside `with replay.redirect():` every HTTPS request made through
+    `requests` is sent here instead, with the original host as the first path
+    segment. `requests` counts the replayed requests per endpoint.
+    """
+
+    def __init__(self, fixtures, latency=0.0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.requests = Counter()
+        self.not_modified = 0
+        super().__init__(type("ReplayHandler", (_ReplayHandler,), {}))
+
+    @contextmanager
+    def redirect(self):
+        from requests.adapters import HTTPAdapter
+
+        send = HTTPAdapter.send
+        base = self.url
+
+        def replay_send(adapter, request, *args, **kwargs):
+            url = urlsplit(request.url)
+            if url.scheme == "https":
+                # Copy, so the session still files cookies under the original host
+                request = request.copy()
+                request.url = f"{base}/{url.netloc}{url.path}" + (f"?{url.query}" if url.query else "")
+            return send(adapter, request, *args, **kwargs)
+
+        with mock.patch.object(HTTPAdapter, "send", replay_send):
+            yield self
@@ -0,0 +1,151 @@
+import os
+import hashlib
+import threading
+from storage import file_lock, locked_json, read_json
+from metrics import CACHE_REQUESTS
+
+# Public URL prefix -> legacy flat folder (under the storage root) the images used to live in
+LEGACY_ROOTS = {
+    "/images/": "instagram",
+    "/upload-images/": "uploads",
+}
+
+
+class BlobStore:
+    """Content-addressed image storage.
+
+    Each distinct image is stored once at `{root}/ab/cd/{sha256}{ext}` and
+    reference counted, so reposts of the same template share one file and
+    no directory grows past a few hundred entries.
+
+    Reference counts are split into one small `{root}/ab/refs.json` per
+    top-level shard. Every change re-reads and rewrites its shard under a
+    file lock, so several worker processes can share the store safely.
+    """
+
+    def __init__(self, root=os.path.join("storage", "blobs")):
+        self.root = root
+        self._cache = {}  # shard -> (mtime, refs) for lock-free lookups
+        self._cache_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._split_legacy_refs()
+
+    def _split_legacy_refs(self):
+        # Earlier versions kept every count in a single {root}/refs.json
+        legacy = os.path.join(self.root, "refs.json")
+        if not os.path.exists(legacy):
+            return
+        with file_lock(legacy):
+            refs = read_json(legacy)
+            if refs is None:
+                return
+            by_shard = {}
+            for digest, entry in refs.items():
+                by_shard.setdefault(digest[:2], {})[digest] = entry
+            for shard, entries in by_shard.items():
+                with self._shard(shard) as shard_refs:
+                    shard_refs.update(entries)
+            os.remove(legacy)
+
+    def _shard_file(self, shard):
+        return os.path.join(self.root, shard, "refs.json")
+
+    def _shard(self, shard):
+        return locked_json(self._shard_file(shard), {})
+
+    def _shard_refs(self, shard):
+        path = self._shard_file(shard)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return {}
+        with self._cache_lock:
+            cached = self._cache.get(shard)
+        if cached and cached[0] == mtime:
+            CACHE_REQUESTS.inc(cache="blob_refs", result="hit")
+            return cached[1]
+        CACHE_REQUESTS.inc(cache="blob_refs", result="miss")
+        refs = read_json(path, {})
+        with self._cache_lock:
+            self._cache[shard] = (mtime, refs)
+        return refs
+
+    def path_for(self, digest, ext):
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{ext}")
+
+    def find(self, digest):
+        """Returns the blob path for a digest, or None if it is not stored."""
+        entry = self._shard_refs(digest[:2]).get(digest)
+        if entry:
+            path = self.path_for(digest, entry["ext"])
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _add(self, digest, ext, write):
+        # Identical bytes may arrive under another extension; keep the first one
+        with self._shard(digest[:2]) as refs:
+            entry = refs.setdefault(digest, {"ext": ext, "refs": 0})
+            path = self.path_for(digest, entry["ext"])
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                write(path)
+            entry["refs"] += 1
+        return path
+
+    def put(self, data, ext, digest=None):
+        """Stores `data` (if new) and takes a reference to it. Returns (digest, path)."""
+        digest = digest or hashlib.sha256(data).hexdigest()
+
+        def write(path):
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+        return digest, self._add(digest, ext, write)
+
+    def adopt(self, src_path, digest, ext):
+        """Hard-links an existing file into the store (no data copy) and takes a reference."""
+        return self._add(digest, ext, lambda path: os.link(src_path, path))
+
+    def release(self, digest):
+        """Drops one reference; the blob is unlinked when nothing points to it any more."""
+        with self._shard(digest[:2]) as refs:
+            entry = refs.get(digest)
+            if not entry:
+                return False
+            entry["refs"] -= 1
+            if entry["refs"] > 0:
+                return False
+            del refs[digest]
+            try:
+                os.remove(self.path_for(digest, entry["ext"]))
+            except FileNotFoundError:
+                pass
+        return True
+
+    def set_refs(self, digest, refs, ext, expected):
+        """Sets a blob's reference count, unless it is no longer `expected` (0 for
+        no entry). At 0 the entry and the file are removed. Returns True if set."""
+        with self._shard(digest[:2]) as shard_refs:
+            entry = shard_refs.get(digest)
+            if (entry["refs"] if entry else 0) != expected:
+                return False
+            ext = entry["ext"] if entry else ext
+            if refs > 0:
+                shard_refs[digest] = {"ext": ext, "refs": refs}
+                return True
+            shard_refs.pop(digest, None)
+            try:
+                os.remove(self.path_for(digest, ext))
+            except FileNotFoundError:
+                pass
+        return True
+
+
+def legacy_path(image_path, storage_path="storage"):
+    for prefix, folder in LEGACY_ROOTS.items():
+        if image_path.startswith(prefix):
+            return os.path.join(storage_path, folder, image_path[len(prefix):])
+    return image_path
@@ -0,0 +1,303 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from blobstore import legacy_path
+from changelog import ChangeLog
+from metrics import CACHE_REQUESTS
+from post_index import PostIndex
+from storage import file_lock, read_json, read_json_items, write_json
+
+SOURCE_INSTAGRAM = "instagram"
+SOURCE_UPLOAD = "upload"
+
+# The per-source stores the catalog replaced; merged into it on first start
+LEGACY_FILES = {
+    "metadata.json": SOURCE_INSTAGRAM,
+    "uploads_metadata.json": SOURCE_UPLOAD,
+}
+
+
+def post_time(post):
+    """When the post was published, as epoch seconds (0 if unknown)."""
+    # Scraped posts carry ISO strings, manual uploads epoch seconds
+    value = post.get("timestamp")
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _count_key(post):
+    return (post.get('status') or 'pending', post.get('source'), post.get('username'))
+
+
+def _stamp(posts):
+    # Taken under the lock and never behind a stored stamp, so every write
+    # lands after the watermark of any export that did not see it
+    newest = max((p.get('updated_at') or 0 for p in posts), default=0)
+    return max(time.time(), newest + 1e-6)
+
+
+def _tally(stats, key, delta):
+    if key is None:
+        return
+    status, source, username = key
+    stats['total'] += delta
+    groups = [stats['status']]
+    for counts, name in ((stats['source'], source), (stats['account'], username)):
+        entry = counts.setdefault(name or "unknown", {"total": 0})
+        entry['total'] += delta
+        groups.append(entry)
+        if not entry['total']:
+            del counts[name or "unknown"]
+    for counts in groups:
+        counts[status] = counts.get(status, 0) + delta
+        if not counts[status]:
+            del counts[status]
+
+
+class Catalog:
+    """Every post, scraped or uploaded, in one JSON file (`storage/posts.json`).
+
+    Each record carries its `source` ("instagram" or "upload") and the
+    `local_path` of its image, so callers neither probe several stores nor
+    map URLs to disk themselves. Reads come from an in-memory snapshot
+    indexed by `post_id` and `image_path`, reloaded whenever the file
+    changes (including writes by other worker processes). Reads return
+    read-only PostRecords (post_index.py) that behave like the stored dicts;
+    change posts through `update`.
+
+    Every write stamps the posts it adds or changes with `updated_at`
+    (epoch seconds), which incremental exports use as their watermark.
+
+    Post counts per status, source and account are kept in `stats.json`
+    and adjusted by every write under the catalog lock. The file records
+    which `posts.json` it counts; after a write from outside the catalog
+    (e.g. migrate_blobs.py) the counts are rebuilt on the next read.
+
+    Each write also becomes a revision in the change log (changelog.py),
+    which `changes` turns into per-post deltas for clients catching up.
+    """
+
+    def __init__(self, storage_path="storage", blobs=None):
+        self.storage_path = storage_path
+        self.blobs = blobs
+        self.path = os.path.join(storage_path, "posts.json")
+        self.stats_path = os.path.join(storage_path, "stats.json")
+        self.changelog = ChangeLog(os.path.join(storage_path, "changes.json"))
+        self._snapshot = None  # PostIndex of the current posts.json
+        self._lock = threading.Lock()
+        self._merge_legacy()
+
+    def _merge_legacy(self):
+        legacy = [(os.path.join(self.storage_path, name), source) for name, source in LEGACY_FILES.items()]
+        if not any(os.path.exists(path) for path, _ in legacy):
+            return
+        with file_lock(self.path):
+            posts = read_json(self.path, [])
+            known = {p['post_id'] for p in posts}
+            for path, source in legacy:
+                if not os.path.exists(path):
+                    continue
+                for record in read_json(path, []):
+                    if record['post_id'] not in known:
+                        known.add(record['post_id'])
+                        posts.append(self.prepare(record, source))
+            write_json(self.path, posts)
+            # Keep the old files around (renamed) in case something has to be checked
+            for path, _ in legacy:
+                if os.path.exists(path):
+                    os.replace(path, path + ".merged")
+
+    def prepare(self, record, source, now=None):
+        """Fills in `source`, `local_path` and `updated_at` of a record about to be stored."""
+        record.setdefault('source', source)
+        record.setdefault('updated_at', now or time.time())
+        if not record.get('local_path') and record.get('image_path'):
+            blob = self.blobs.find(record['sha256']) if self.blobs and record.get('sha256') else None
+            record['local_path'] = blob or legacy_path(record['image_path'], self.storage_path)
+        return record
+
+    def _file_key(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+    def _load(self):
+        key = self._file_key()
+        with self._lock:
+            if self._snapshot and self._snapshot.key == key:
+                CACHE_REQUESTS.inc(cache="catalog", result="hit")
+                return self._snapshot
+            CACHE_REQUESTS.inc(cache="catalog", result="miss")
+            try:
+                self._snapshot = PostIndex(read_json_items(self.path) if key else [], key, self._snapshot)
+            except ValueError:
+                # A damaged file reads as no posts, as with read_json
+                self._snapshot = PostIndex([], key)
+            return self._snapshot
+
+    def posts(self, source=None):
+        """All posts in stored order, optionally only those of one source."""
+        index = self._load()
+        if source is None:
+            return index.posts
+        return index.by_source.get(source, [])
+
+    def posts_json(self, source=None):
+        """`posts(source)` as a JSON array, encoded without decoding each post's `ai_data`."""
+        index = self._load()
+        return index.to_json(index.posts if source is None else index.by_source.get(source, []))
+
+    def get(self, post_id):
+        return self._load().by_id.get(post_id)
+
+    def get_many(self, post_ids):
+        """The posts for `post_ids` (in that order), skipping unknown ids."""
+        by_id = self._load().by_id
+        return [by_id[pid] for pid in post_ids if pid in by_id]
+
+    def page(self, status, source=None, offset=0, limit=50):
+        """One page of the posts with `status` (in stored order) and their total count."""
+        posts = self._load().by_status.get((source, status), [])
+        return posts[offset:offset + limit], len(posts)
+
+    def select(self, status, source=None, usernames=None):
+        """Posts with `status`, optionally of one source and some accounts only."""
+        return self._load().select(status, source, usernames)
+
+    def ids(self, status, source=None, usernames=None):
+        return [p.post_id for p in self.select(status, source, usernames)]
+
+    def stats(self):
+        """Post counts: `total`, per `status`, and per `source` and `account`
+        (each with its own `total` and per-status counts)."""
+        stats = read_json(self.stats_path)
+        if not stats or stats.get('catalog') != self._file_key():
+            with file_lock(self.path):
+                stats = self._count(read_json(self.path, []), [], None)
+        stats.pop('catalog', None)
+        return stats
+
+    def _count(self, posts, changes, previous_key):
+        """Applies `changes` ((post_id, before, after) count keys, None for absent) to the
+        stored counts if they were taken of the `previous_key` file, else counts
+        `posts` afresh. Call with the catalog lock held, after `posts.json` was written."""
+        stats = read_json(self.stats_path)
+        if stats and previous_key and stats.get('catalog') == previous_key:
+            for _, before, after in changes:
+                if before != after:
+                    _tally(stats, before, -1)
+                    _tally(stats, after, 1)
+        else:
+            stats = {"total": 0, "status": {}, "source": {}, "account": {}}
+            for post in posts:
+                _tally(stats, _count_key(post), 1)
+        stats['catalog'] = self._file_key()
+        write_json(self.stats_path, stats)
+        return stats
+
+    def _write(self, posts, changes):
+        previous_key = self._file_key()
+        write_json(self.path, posts)
+        self._count(posts, changes, previous_key)
+        ops = [("insert" if before is None else "delete" if after is None else "update", post_id)
+               for post_id, before, after in changes]
+        self.changelog.record(ops, previous_key, self._file_key())
+
+    def revision(self):
+        """The current revision, recording one if `posts.json` was written outside the catalog."""
+        log = self.changelog.read()
+        if log['catalog'] != self._file_key():
+            with file_lock(self.path):
+                log = self.changelog.read()
+                current_key = self._file_key()
+                if log['catalog'] != current_key:
+                    self.changelog.record([], log['catalog'], current_key, reset=True)
+                    # The counts are out of step as well
+                    self._count(read_json(self.path, []), [], None)
+                    log = self.changelog.read()
+        return log['revision']
+
+    def changes(self, since):
+        """Posts changed after revision `since`: `{"revision", "changes": [{"op",
+        "post_id", "post"}]}`, or `{"revision", "reset": True}` if `since` is
+        too old to catch up from and the client has to reload."""
+        self.revision()
+        revision, net = self.changelog.since(since)
+        if net is None:
+            return {"revision": revision, "reset": True}
+        changes = []
+        for op, post_id in net:
+            # The catalog may be a write ahead of the log read; the post itself decides
+            post = self.get(post_id)
+            if post is None:
+                op = "delete"
+            elif op == "delete":
+                op = "update"
+            changes.append({"op": op, "post_id": post_id, "post": post and post.to_dict()})
+        return {"revision": revision, "changes": changes}
+
+    def local_path(self, post):
+        return post.get('local_path') or legacy_path(post['image_path'], self.storage_path)
+
+    def resolve(self, image_path):
+        """Returns (local path, sha256 or None) for a public image URL."""
+        post = self._load().by_image.get(image_path)
+        if post is None:
+            return legacy_path(image_path, self.storage_path), None
+        return self.local_path(post), post.get('sha256')
+
+    def add(self, records, source):
+        """Appends records under the file lock, skipping ids another worker added meanwhile."""
+        with file_lock(self.path):
+            posts = read_json(self.path, [])
+            existing = {p['post_id'] for p in posts}
+            now = _stamp(posts)
+            added = [self.prepare(r, source, now) for r in records if r['post_id'] not in existing]
+            posts.extend(added)
+            self._write(posts, [(p['post_id'], None, _count_key(p)) for p in added])
+        return added
+
+    def update(self, post_ids, mutate):
+        """Applies `mutate(post)` to the matching posts in one locked pass.
+
+        `mutate` returns True to keep the post, False to remove it. Returns
+        the affected posts.
+        """
+        wanted = set(post_ids)
+        affected = []
+        if not wanted:
+            return affected
+        changes = []
+        with file_lock(self.path):
+            posts = read_json(self.path, [])
+            now = _stamp(posts)
+            kept = []
+            for post in posts:
+                if post['post_id'] in wanted:
+                    affected.append(post)
+                    before = _count_key(post)
+                    if not mutate(post):
+                        changes.append((post['post_id'], before, None))
+                        continue
+                    changes.append((post['post_id'], before, _count_key(post)))
+                    post['updated_at'] = now
+                kept.append(post)
+            self._write(kept, changes)
+        return affected
+
+    def remove_where(self, predicate):
+        """Removes every post matching `predicate` in one locked pass. Returns them."""
+        with file_lock(self.path):
+            posts = read_json(self.path, [])
+            removed = [p for p in posts if predicate(p)]
+            if removed:
+                self._write([p for p in posts if not predicate(p)], [(p['post_id'], _count_key(p), None) for p in removed])
+        return removed
@@ -0,0 +1,80 @@
+import os
+import threading
+
+from storage import read_json, write_json
+
+# Entries kept in the log; clients further behind reload everything
+LOG_SIZE = 10000
+
+
+class ChangeLog:
+    """Revision counter and recent changes of the catalog, in one JSON file
+    (`storage/changes.json`).
+
+    Every catalog write bumps `revision` by one and appends an
+    `[revision, op, post_id]` entry ("insert", "update" or "delete") per
+    post it touched. `floor` is the oldest revision a client can catch up
+    from: older entries have been dropped, or `posts.json` was written
+    outside the catalog. Written under the catalog lock only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._cache = None  # (file stat key, log) for lock-free reads
+        self._cache_lock = threading.Lock()
+
+    def read(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return {"revision": 0, "floor": 0, "catalog": None, "changes": []}
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with self._cache_lock:
+            if self._cache and self._cache[0] == key:
+                return self._cache[1]
+        log = read_json(self.path) or {"revision": 0, "floor": 0, "catalog": None, "changes": []}
+        with self._cache_lock:
+            self._cache = (key, log)
+        return log
+
+    def record(self, entries, previous_key, current_key, reset=False):
+        """Appends `(op, post_id)` entries as one new revision. `previous_key` is
+        the `posts.json` (stat key) the log should be in step with; if it is
+        not, or with `reset`, clients have to reload. Returns the new revision."""
+        log = read_json(self.path) or {"revision": 0, "floor": 0, "catalog": None, "changes": []}
+        revision = log['revision'] + 1
+        if reset or log['catalog'] != previous_key:
+            log['floor'] = revision
+            log['changes'] = []
+        log['changes'].extend([revision, op, post_id] for op, post_id in entries)
+        if len(log['changes']) > LOG_SIZE:
+            dropped = log['changes'][:-LOG_SIZE]
+            log['floor'] = max(log['floor'], dropped[-1][0])
+            log['changes'] = log['changes'][-LOG_SIZE:]
+        log['revision'] = revision
+        log['catalog'] = current_key
+        write_json(self.path, log, indent=None)
+        return revision
+
+    def since(self, revision):
+        """Returns the current revision and `(op, post_id)` per post changed after
+        `revision`, coalesced to the net change in order of last change (None
+        instead of the list if `revision` is too old, or from another store)."""
+        log = self.read()
+        if not log['floor'] <= revision <= log['revision']:
+            return log['revision'], None
+        first, last = {}, {}
+        for rev, op, post_id in log['changes']:
+            if rev <= revision:
+                continue
+            first.setdefault(post_id, op)
+            last.pop(post_id, None)
+            last[post_id] = op
+        net = []
+        for post_id, op in last.items():
+            if op == "delete":
+                if first[post_id] != "insert":
+                    net.append(("delete", post_id))
+            else:
+                net.append(("insert" if first[post_id] == "insert" else "update", post_id))
+        return log['revision'], net
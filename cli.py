@@ -0,0 +1,276 @@
+"""
+Command line for batch work without the web server. Uses the same catalog
+and blob store as server.py, so both can run against one storage folder.
+
+Usage:
+  python3 cli.py scrape nasa natgeo --limit 20 [--enrich] [--parallel 2]
+  python3 cli.py import-apify dataset.json [--enrich]
+  python3 cli.py enrich [--username nasa] [--limit 100] [--concurrency 8]
+  python3 cli.py annotate [--username nasa] [--batch-size 50] [--concurrency 2]
+  python3 cli.py export --format parquet --status enriched -o enriched.parquet
+  python3 cli.py reindex
+  python3 cli.py reconcile [--repair]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import exporter
+import reconcile
+from scraper import InstaScraper, apify_items
+
+# Results are written back to the catalog every this many posts
+FLUSH_EVERY = 50
+
+
+class Progress:
+    """`label done/total` on stderr: redrawn in place on a terminal, every 10% otherwise."""
+
+    def __init__(self, label, total):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self._tty = sys.stderr.isatty()
+        self._drawn = False
+        self._step = max(1, total // 10)
+        self._lock = threading.Lock()
+
+    def update(self, done=None, note=""):
+        with self._lock:
+            self.done = self.done + 1 if done is None else done
+            if self._tty:
+                self._drawn = True
+                print(f"\r{self.label} {self.done}/{self.total} {note}".ljust(80), end="", file=sys.stderr, flush=True)
+            elif self.done % self._step == 0 or self.done == self.total:
+                print(f"{self.label} {self.done}/{self.total}", file=sys.stderr, flush=True)
+
+    def close(self):
+        if self._drawn:
+            print(file=sys.stderr)
+
+
+def _select(scraper, args, status):
+    posts = scraper.catalog.get_many(args.ids) if args.ids else scraper.catalog.posts()
+    posts = [p for p in posts if p.get("status") == status
+             and (not args.username or p.get("username") in args.username)]
+    return posts[:args.limit] if args.limit else posts
+
+
+def cmd_scrape(scraper, args):
+    usernames = [u.split("instagram.com/")[1].split("/")[0] if "instagram.com/" in u else u.strip()
+                 for u in args.usernames]
+    progress = Progress("scrape", len(usernames))
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+        futures = {pool.submit(scraper.scrape_profile, u, args.limit, args.enrich): u for u in usernames}
+        for future in as_completed(futures):
+            username = futures[future]
+            result = future.result()
+            progress.update(note=username)
+            if "error" in result:
+                failed += 1
+                print(f"{username}: {result['error']}", file=sys.stderr)
+            else:
+                print(f"{username}: {result['scraped_count']} new posts")
+    progress.close()
+    return 1 if failed else 0
+
+
+def cmd_import_apify(scraper, args):
+    if args.file == "-":
+        data = json.load(sys.stdin)
+    else:
+        with open(args.file) as f:
+            data = json.load(f)
+    try:
+        items = apify_items(data)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    progress = Progress("import", len(items))
+    result = scraper.process_apify_json(items, lambda current, total, post_id: progress.update(current, post_id),
+                                        args.enrich)
+    progress.close()
+    print(f"Imported {result['scraped_count']} new posts from {len(items)} items")
+    return 0
+
+
+def cmd_enrich(scraper, args):
+    from ai_processor import extract_attributes
+
+    posts = _select(scraper, args, args.status)
+    progress = Progress("enrich", len(posts))
+    updates, failed = {}, []
+    lock = threading.Lock()
+
+    def enrich(post):
+        ai_data = extract_attributes(scraper.catalog.local_path(post), post.get("caption", ""))
+        with lock:
+            if "error" in ai_data:
+                failed.append((post["post_id"], ai_data["error"]))
+            else:
+                updates[post["post_id"]] = {"ai_data": ai_data, "status": "enriched"}
+            progress.update(note=post["post_id"])
+            if len(updates) >= FLUSH_EVERY:
+                # Store results as they come in, so an interrupted run keeps them
+                scraper.update_posts(updates, if_status=args.status)
+                updates.clear()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(enrich, posts))
+    if updates:
+        scraper.update_posts(updates, if_status=args.status)
+    progress.close()
+
+    for post_id, error in failed:
+        print(f"{post_id}: {error}", file=sys.stderr)
+    print(f"Enriched {len(posts) - len(failed)} posts, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+def cmd_annotate(scraper, args):
+    from annotate import get_supabase_token, upload_posts
+
+    posts = _select(scraper, args, "enriched")
+    if not posts:
+        print("No enriched posts to upload")
+        return 0
+    token = args.token or os.getenv("ANNOTATE_TOKEN") or get_supabase_token()
+    if not token:
+        print("No token: pass --token or set the SUPABASE_* credentials", file=sys.stderr)
+        return 1
+
+    batches = [posts[i:i + args.batch_size] for i in range(0, len(posts), args.batch_size)]
+    progress = Progress("annotate", len(posts))
+    completed, errors = 0, 0
+
+    def upload(batch):
+        try:
+            result, done = upload_posts(batch, token, scraper.catalog.local_path)
+        except Exception as e:
+            result, done = {"status": "error", "message": str(e)}, []
+        if done:
+            scraper.update_posts({post_id: {"status": "completed"} for post_id in done}, if_status="enriched")
+        return batch, result, done
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for batch, result, done in pool.map(upload, batches):
+            completed += len(done)
+            if result["status"] != "success":
+                errors += 1
+                print(f"batch of {len(batch)} failed: {result['message']}", file=sys.stderr)
+            progress.update(min(progress.done + len(batch), len(posts)))
+    progress.close()
+    print(f"Annotated {completed} of {len(posts)} posts")
+    return 1 if errors else 0
+
+
+def cmd_export(scraper, args):
+    exporter.run(scraper.catalog, args)
+    return 0
+
+
+def cmd_reindex(scraper, args):
+    from migrate_blobs import migrate
+
+    progress = Progress("legacy import", 0)
+
+    def on_legacy(current, total, post_id):
+        progress.total = total
+        progress.update(current, post_id)
+
+    imported = scraper.import_legacy_folders(args.legacy_root, on_legacy)
+    progress.close()
+    stats = {"legacy_imported": len(imported)}
+    stats.update(migrate(args.storage))
+
+    posts = scraper.catalog.posts()
+    progress = Progress("thumbnails", len(posts))
+    rebuilt = scraper.rebuild_thumbnails(posts, args.concurrency, progress.update)
+    progress.close()
+    stats["thumbnails_rebuilt"] = len(rebuilt)
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+def cmd_reconcile(scraper, args):
+    reconciler = reconcile.Reconciler(scraper, workers=args.workers)
+    progress = Progress("check", 0)
+
+    def on_progress(step, done, total):
+        progress.total = total
+        progress.update(done)
+
+    report = reconciler.run(repair=args.repair, drop_dangling=args.drop_dangling, full=args.full,
+                            delete_unreferenced=args.delete_unreferenced, progress=on_progress)
+    progress.close()
+    print(json.dumps(report, indent=2))
+    # Non-zero while problems remain that a repair run would not fix
+    return 1 if report["counts"]["corrupt"] or (report["counts"]["dangling"] and not args.drop_dangling) else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Scrape, import, enrich, annotate and export posts")
+    parser.add_argument("--storage", default="storage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("scrape", help="Scrape public profiles")
+    p.add_argument("usernames", nargs="+", help="Usernames or profile URLs")
+    p.add_argument("--limit", type=int, default=10, help="New image posts per profile")
+    p.add_argument("--enrich", action="store_true", help="Enrich new posts right away")
+    p.add_argument("--parallel", type=int, default=1, help="Profiles scraped at once")
+    p.set_defaults(func=cmd_scrape)
+
+    p = commands.add_parser("import-apify", help="Import an Apify Instagram export (JSON file or -)")
+    p.add_argument("file")
+    p.add_argument("--enrich", action="store_true", help="Enrich new posts right away")
+    p.set_defaults(func=cmd_import_apify)
+
+    for name, func, help in (("enrich", cmd_enrich, "Enrich posts with Gemini"),
+                             ("annotate", cmd_annotate, "Upload enriched posts to the annotate API")):
+        p = commands.add_parser(name, help=help)
+        p.add_argument("--ids", nargs="+", help="Only these post ids")
+        p.add_argument("--username", action="append", help="Only posts of this account (repeatable)")
+        p.add_argument("--limit", type=int, help="At most this many posts")
+        p.set_defaults(func=func)
+        if name == "enrich":
+            p.add_argument("--status", default="pending", help="Posts with this status (default: pending)")
+            p.add_argument("--concurrency", type=int, default=8, help="Gemini calls at once")
+        else:
+            p.add_argument("--batch-size", type=int, default=50, help="Posts per upload")
+            p.add_argument("--concurrency", type=int, default=2, help="Uploads at once")
+            p.add_argument("--token", help="Bearer token (default: ANNOTATE_TOKEN or the system account)")
+
+    p = commands.add_parser("export", help="Export posts as NDJSON or Parquet")
+    exporter.add_arguments(p)
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser("reindex", help="Merge old stores, migrate images into the blob store, rebuild thumbnails")
+    p.add_argument("--legacy-root", default="instagram", help="Folder of the old ig_scraper.py stores")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.set_defaults(func=cmd_reindex)
+
+    p = commands.add_parser("reconcile", help="Find orphaned files, dangling posts and corrupt images")
+    reconcile.add_arguments(p)
+    p.set_defaults(func=cmd_reconcile)
+    return parser
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    args = build_parser().parse_args(argv)
+    scraper = InstaScraper(args.storage)
+    sys.exit(args.func(scraper, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Streams the catalog out as NDJSON or Parquet, optionally bundled with the
+images in a tar archive.
+
+Posts can be filtered by status, account, source and publish date. For
+incremental exports pass the `watermark` of the previous export as `since`:
+only posts added or changed after it are included. (Deleted posts are not
+reported.)
+
+Output is produced in chunks, so memory stays flat however large the export
+or archive gets. Parquet needs the optional `pyarrow` package.
+
+Usage: python3 exporter.py [--format ndjson|parquet] [--images] [--status enriched]
+                           [--username nasa] [--since 1767225600 | --watermark-file FILE]
+                           [--output out.ndjson]
+"""
+import argparse
+import json
+import os
+import sys
+import tarfile
+import tempfile
+from datetime import datetime
+
+from catalog import Catalog, post_time
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", ".ndjson"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+TAR_MEDIA_TYPE = "application/x-tar"
+
+# Posts per NDJSON chunk / Parquet row group
+BATCH_SIZE = 2000
+# Metadata file bundled into a tar is kept in memory up to this size, then spilled to disk
+SPOOL_BYTES = 8 * 1024 * 1024
+
+# Fields only meaningful inside this server
+PRIVATE_FIELDS = ("local_path",)
+
+
+def parse_time(value):
+    """Epoch seconds from a number or an ISO date/time string (None passes through)."""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
+
+class ExportFilter:
+    def __init__(self, status=None, usernames=None, source=None, date_from=None, date_to=None, since=None):
+        self.status = set(status) if status else None
+        self.usernames = set(usernames) if usernames else None
+        self.source = source
+        self.date_from = parse_time(date_from)
+        self.date_to = parse_time(date_to)
+        self.since = parse_time(since)
+
+    def __call__(self, post):
+        if self.status and post.get("status") not in self.status:
+            return False
+        if self.usernames and post.get("username") not in self.usernames:
+            return False
+        if self.source and post.get("source") != self.source:
+            return False
+        if self.since is not None and post.get("updated_at", 0) <= self.since:
+            return False
+        if self.date_from is not None or self.date_to is not None:
+            published = post_time(post)
+            if self.date_from is not None and published < self.date_from:
+                return False
+            if self.date_to is not None and published > self.date_to:
+                return False
+        return True
+
+
+class Export:
+    """One export over a snapshot of the catalog.
+
+    `watermark` is the newest `updated_at` in that snapshot; pass it as
+    `since` next time to get only what changed after this export.
+    """
+
+    def __init__(self, catalog, fmt="ndjson", images=False, **filters):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if fmt == "parquet":
+            _require_pyarrow()
+        self.catalog = catalog
+        self.format = fmt
+        self.images = images
+        snapshot = catalog.posts()
+        wanted = ExportFilter(**filters)
+        self.posts = [p for p in snapshot if wanted(p)]
+        self.watermark = max((p.get("updated_at", 0) for p in snapshot), default=0)
+
+    @property
+    def media_type(self):
+        return TAR_MEDIA_TYPE if self.images else FORMATS[self.format][0]
+
+    @property
+    def filename(self):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        return f"posts-{stamp}" + (".tar" if self.images else FORMATS[self.format][1])
+
+    def records(self):
+        for post in self.posts:
+            record = {k: v for k, v in post.items() if k not in PRIVATE_FIELDS}
+            if self.images:
+                record["image_file"] = self._image_name(post)
+            yield record
+
+    def _image_name(self, post):
+        ext = os.path.splitext(self.catalog.local_path(post))[1] or ".jpg"
+        return f"images/{post['post_id']}{ext}"
+
+    def __iter__(self):
+        """The export as a stream of byte chunks."""
+        if self.images:
+            return self._tar_chunks()
+        if self.format == "parquet":
+            return parquet_chunks(self.records())
+        return ndjson_chunks(self.records())
+
+    def _tar_chunks(self):
+        sink = _ChunkSink()
+        data_name = "posts" + FORMATS[self.format][1]
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as data:
+            writer = parquet_chunks if self.format == "parquet" else ndjson_chunks
+            for chunk in writer(self.records()):
+                data.write(chunk)
+            size = data.tell()
+            data.seek(0)
+
+            with tarfile.open(fileobj=sink, mode="w|") as tar:
+                info = tarfile.TarInfo(data_name)
+                info.size = size
+                info.mtime = int(self.watermark)
+                tar.addfile(info, data)
+                yield from sink.drain()
+
+                for post in self.posts:
+                    path = self.catalog.local_path(post)
+                    try:
+                        with open(path, "rb") as f:
+                            info = tar.gettarinfo(arcname=self._image_name(post), fileobj=f)
+                            info.uid = info.gid = 0
+                            info.uname = info.gname = ""
+                            tar.addfile(info, f)
+                    except FileNotFoundError:
+                        continue
+                    yield from sink.drain()
+        yield from sink.drain()
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are handed out by `drain()`."""
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+        self.closed = False
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+            self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def ndjson_chunks(records):
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+# --- Parquet ---------------------------------------------------------------
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+
+
+def _names(items, key="name"):
+    return [str(i.get(key)) if isinstance(i, dict) else str(i) for i in (items or []) if i]
+
+
+def flatten(record):
+    """One Parquet row: the post fields plus the Gemini attributes as columns,
+    actors and tags as lists of names. The full `ai_data` is kept as JSON."""
+    ai = record.get("ai_data") or {}
+    return {
+        "post_id": record.get("post_id"),
+        "source": record.get("source"),
+        "username": record.get("username"),
+        "status": record.get("status"),
+        "caption": record.get("caption"),
+        "published_at": post_time(record) or None,
+        "updated_at": record.get("updated_at"),
+        "url": record.get("post_url"),
+        "image_path": record.get("image_path"),
+        "image_file": record.get("image_file"),
+        "sha256": record.get("sha256"),
+        "title": _str(ai.get("title")),
+        "release_year": _str(ai.get("releaseYear")),
+        "genre": _str(ai.get("genre")),
+        "director": _str(ai.get("director")),
+        "emotion_label": _str(ai.get("emotionLabel")),
+        "emotion_description": _str(ai.get("emotionDescription")),
+        "related_emotions": _names(ai.get("relatedEmotions")),
+        "meme_release_year": _str(ai.get("memeReleaseYear")),
+        "actors": _names(ai.get("actors")),
+        "tags": _names(ai.get("tags")),
+        "tag_categories": _names(ai.get("tags"), "category"),
+        "ai_error": _str(ai.get("error")),
+        "ai_data": json.dumps(ai, ensure_ascii=False) if ai else None,
+    }
+
+
+def _str(value):
+    return None if value is None else str(value)
+
+
+def _schema():
+    import pyarrow as pa
+
+    text, texts = pa.string(), pa.list_(pa.string())
+    return pa.schema([
+        ("post_id", text), ("source", text), ("username", text), ("status", text),
+        ("caption", text), ("published_at", pa.float64()), ("updated_at", pa.float64()),
+        ("url", text), ("image_path", text), ("image_file", text), ("sha256", text),
+        ("title", text), ("release_year", text), ("genre", text), ("director", text),
+        ("emotion_label", text), ("emotion_description", text), ("related_emotions", texts),
+        ("meme_release_year", text), ("actors", texts), ("tags", texts), ("tag_categories", texts),
+        ("ai_error", text), ("ai_data", text),
+    ])
+
+
+def parquet_chunks(records):
+    """Writes one row group per BATCH_SIZE posts and yields the bytes as they are produced."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    rows = []
+    for record in records:
+        rows.append(flatten(record))
+        if len(rows) >= BATCH_SIZE:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            rows = []
+            yield from sink.drain()
+    if rows:
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+    writer.close()
+    yield from sink.drain()
+
+
+def add_arguments(parser):
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--images", action="store_true", help="Bundle the images into a tar archive")
+    parser.add_argument("--status", action="append", help="Only posts with this status (repeatable)")
+    parser.add_argument("--username", action="append", help="Only posts of this account (repeatable)")
+    parser.add_argument("--source", choices=["instagram", "upload"])
+    parser.add_argument("--from", dest="date_from", help="Published at or after (ISO date or epoch)")
+    parser.add_argument("--to", dest="date_to", help="Published at or before (ISO date or epoch)")
+    parser.add_argument("--since", help="Only posts changed after this watermark")
+    parser.add_argument("--watermark-file",
+                        help="Read --since from this file and store the new watermark there after the export")
+    parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+
+
+def run(catalog, args):
+    since = args.since
+    if args.watermark_file and since is None and os.path.exists(args.watermark_file):
+        with open(args.watermark_file) as f:
+            since = f.read().strip() or None
+
+    export = Export(catalog, args.format, images=args.images, status=args.status,
+                    usernames=args.username, source=args.source, date_from=args.date_from,
+                    date_to=args.date_to, since=since)
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in export:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+    if args.watermark_file:
+        with open(args.watermark_file, "w") as f:
+            f.write(repr(export.watermark))
+    print(f"Exported {len(export.posts)} posts, watermark {export.watermark!r}", file=sys.stderr)
+    return export
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export posts as NDJSON or Parquet")
+    parser.add_argument("--storage", default="storage")
+    add_arguments(parser)
+    args = parser.parse_args()
+    run(Catalog(args.storage), args)
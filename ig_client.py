@@ -0,0 +1,209 @@
+"""
+Session reuse and response caching for the Instaloader client.
+
+SessionStore keeps Instaloader's cookies between runs: a logged-in session
+file (Instaloader's own format, e.g. from `instaloader --login USER
+--sessionfile ...`) or, anonymously, the cookies Instagram handed out.
+
+ResponseCache sits in front of the context's profile and post-listing
+requests. Profile pages and the newest listing page are kept for a short
+TTL; older listing pages are keyed by their cursor and kept for days, so a
+re-scrape only fetches what is new. Stale JSON entries that came with an
+ETag or Last-Modified are revalidated with a conditional request.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+
+from metrics import CACHE_REQUESTS
+from storage import file_lock, read_json, write_json
+
+log = logging.getLogger(__name__)
+
+# Seconds a profile page or the newest page of posts is served from the cache
+PROFILE_TTL = 900
+# Seconds an older page of posts (fetched with a cursor) is served from the cache
+PAGE_TTL = 7 * 24 * 3600
+
+
+class SessionStore:
+    def __init__(self, root, username=None, session_file=None):
+        self.username = username or None
+        if session_file:
+            self.path = session_file
+        elif self.username:
+            self.path = os.path.join(root, f"session-{self.username}")
+        else:
+            self.path = os.path.join(root, "anonymous.json")
+
+    @classmethod
+    def from_env(cls, storage_path):
+        return cls(os.path.join(storage_path, "sessions"),
+                   username=os.getenv("INSTAGRAM_USER"),
+                   session_file=os.getenv("INSTAGRAM_SESSION_FILE"))
+
+    def load(self, context):
+        if not os.path.exists(self.path):
+            if self.username:
+                log.warning("no instagram session file for user=%s path=%s; scraping anonymously",
+                            self.username, self.path)
+            return False
+        try:
+            if self.username:
+                with open(self.path, "rb") as f:
+                    context.load_session_from_file(self.username, f)
+            else:
+                context.update_cookies(read_json(self.path, {}))
+        except Exception as e:
+            log.warning("instagram session not loaded path=%s error=%s", self.path, e)
+            return False
+        log.info("instagram session loaded user=%s", self.username or "anonymous")
+        return True
+
+    def save(self, context):
+        # A session file for another account than the configured one is left alone
+        if self.username and context.username != self.username:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with file_lock(self.path):
+            if self.username:
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    pickle.dump(context.save_session(), f)
+                os.replace(tmp, self.path)
+            else:
+                write_json(self.path, context.save_session())
+
+
+class ResponseCache:
+    def __init__(self, root, profile_ttl=PROFILE_TTL, page_ttl=PAGE_TTL):
+        self.root = root
+        self.profile_ttl = profile_ttl
+        self.page_ttl = page_ttl
+
+    @classmethod
+    def from_env(cls, storage_path):
+        return cls(os.path.join(storage_path, "cache", "instagram"),
+                   profile_ttl=float(os.getenv("INSTAGRAM_CACHE_TTL", str(PROFILE_TTL))),
+                   page_ttl=float(os.getenv("INSTAGRAM_CACHE_PAGE_TTL", str(PAGE_TTL))))
+
+    def install(self, context):
+        """Routes the context's cacheable requests through this cache."""
+        fetch_json, fetch_page = context.get_json, context.get_page_data
+
+        def get_json(path, params, host="www.instagram.com", session=None, _attempt=1,
+                     response_headers=None, use_post=False):
+            call = dict(path=path, params=params, host=host, session=session, _attempt=_attempt,
+                        response_headers=response_headers, use_post=use_post)
+            ttl = self._json_ttl(path, params)
+            if not ttl or _attempt > 1:
+                return fetch_json(**call)
+            key = self._key(context, "POST" if use_post else "GET", host, path, params)
+            return self._get(key, ttl, lambda headers: fetch_json(**dict(call, response_headers=headers)),
+                             context, call, response_headers)
+
+        def get_page_data(path):
+            key = self._key(context, "PAGE", "www.instagram.com", path, {})
+            return self._get(key, self.profile_ttl, lambda headers: fetch_page(path))
+
+        context.get_json = get_json
+        context.get_page_data = get_page_data
+
+    def _json_ttl(self, path, params):
+        if path.startswith("api/v1/users/web_profile_info"):
+            return self.profile_ttl
+        if path == "graphql/query":
+            variables = params.get("variables") or "{}"
+            # Pages after the first are addressed by cursor and do not change once written
+            return self.page_ttl if '"after":' in variables else self.profile_ttl
+        return 0
+
+    def _key(self, context, method, host, path, params):
+        raw = json.dumps([context.username, method, host, path, sorted(params.items())], default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _get(self, key, ttl, fetch, context=None, call=None, caller_headers=None):
+        path = self._path(key)
+        entry = read_json(path)
+        now = time.time()
+        if entry and now - entry["stored_at"] < ttl:
+            CACHE_REQUESTS.inc(cache="instagram", result="hit")
+            return entry["body"]
+
+        if entry and call and not call["use_post"] and (entry.get("etag") or entry.get("last_modified")):
+            body = self._revalidate(context, call, entry)
+            if body is not None:
+                entry["stored_at"] = now
+                entry["body"] = body
+                self._store(path, entry)
+                return body
+
+        CACHE_REQUESTS.inc(cache="instagram", result="miss")
+        headers = {}
+        body = fetch(headers)
+        if caller_headers is not None:
+            caller_headers.clear()
+            caller_headers.update(headers)
+        validators = {k.lower(): v for k, v in headers.items()}
+        self._store(path, {
+            "stored_at": now,
+            "etag": validators.get("etag"),
+            "last_modified": validators.get("last-modified"),
+            "body": body,
+        })
+        return body
+
+    def _revalidate(self, context, call, entry):
+        """Conditional GET for a stale entry. Returns the (possibly new) body,
+        or None to fall back to a normal request."""
+        conditional = {}
+        if entry.get("etag"):
+            conditional["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            conditional["If-Modified-Since"] = entry["last_modified"]
+        session = call["session"] or context._session
+        try:
+            context.do_sleep()
+            resp = session.get(f"https://{call['host']}/{call['path']}", params=call["params"],
+                               headers=conditional, allow_redirects=False)
+        except Exception as e:
+            log.debug("instagram revalidation failed path=%s error=%s", call["path"], e)
+            return None
+        if resp.status_code == 304:
+            CACHE_REQUESTS.inc(cache="instagram", result="revalidated")
+            return entry["body"]
+        if resp.status_code == 200:
+            try:
+                body = resp.json()
+            except ValueError:
+                return None
+            CACHE_REQUESTS.inc(cache="instagram", result="miss")
+            entry["etag"] = resp.headers.get("ETag")
+            entry["last_modified"] = resp.headers.get("Last-Modified")
+            return body
+        return None
+
+    def _store(self, path, entry):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_json(path, entry, indent=None)
+
+    def prune(self):
+        """Deletes entries older than the page TTL. Returns how many were removed."""
+        removed = 0
+        cutoff = time.time() - max(self.profile_ttl, self.page_ttl)
+        if not os.path.isdir(self.root):
+            return 0
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+        return removed
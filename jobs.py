@@ -0,0 +1,74 @@
+import os
+import time
+import uuid
+
+from storage import locked_json, read_json
+
+
+class JobStore:
+    """Progress and state of long-running jobs, shared by all worker processes.
+
+    Each job is a small JSON file under `storage/jobs/`, so a client can start
+    a job on one worker and poll or stream its progress from any other.
+    """
+
+    def __init__(self, root=os.path.join("storage", "jobs")):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, job_id):
+        # Job ids are generated hex strings; refuse anything that could escape the folder
+        if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def create(self, kind, **fields):
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "running",
+            "created_at": now,
+            "updated_at": now,
+            "pid": os.getpid(),
+        }
+        job.update(fields)
+        with locked_json(self._path(job["id"]), {}) as stored:
+            stored.update(job)
+        return job
+
+    def get(self, job_id):
+        try:
+            return read_json(self._path(job_id))
+        except KeyError:
+            return None
+
+    def update(self, job_id, **fields):
+        with locked_json(self._path(job_id), {}) as job:
+            job.update(fields)
+            job["updated_at"] = time.time()
+            return dict(job)
+
+    def claim(self, job_id, owner, lease):
+        """Makes `owner` the job's runner unless another owner has sent a
+        heartbeat within `lease` seconds. Returns the job, or None if taken."""
+        path = self._path(job_id)
+        if not os.path.exists(path):
+            return None
+        with locked_json(path, {}) as job:
+            now = time.time()
+            if job.get("owner") not in (None, owner) and now - job.get("heartbeat", 0) < lease:
+                return None
+            job["owner"] = owner
+            job["heartbeat"] = now
+            return dict(job)
+
+    def list(self, kind=None):
+        jobs = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            job = read_json(os.path.join(self.root, name))
+            if job and (kind is None or job.get("kind") == kind):
+                jobs.append(job)
+        return sorted(jobs, key=lambda j: j["created_at"], reverse=True)
@@ -0,0 +1,196 @@
+"""
+Process-local metrics, exposed by the server at /metrics in the Prometheus
+text format.
+
+Only what the app needs: counters, gauges (set directly or computed when
+scraped) and histograms, each with optional labels. Every worker process
+keeps its own values; scrape each worker (or run a single one) to see them.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Bytes, 1 KiB .. 64 MiB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))
+# Items per request
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames) or set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return [(key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down. With `collect`, the value is computed
+    when /metrics is scraped: `collect()` returns `[(labels_dict, value), ...]`."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect=None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self.collect is None:
+            return super()._samples()
+        return [(self._key(labels), value) for labels, value in self.collect()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the block. An `outcome` label left out is
+        filled in with "ok", or "error" if the block raises."""
+        fill_outcome = "outcome" in self.labelnames and "outcome" not in labels
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            if fill_outcome:
+                labels["outcome"] = "error"
+            raise
+        finally:
+            if fill_outcome:
+                labels.setdefault("outcome", "ok")
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            samples = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in samples:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                labels = _format_labels(pairs + [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics of the app ----------------------------------------------------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "Request latency per endpoint.", ("method", "route", "status"))
+
+GEMINI_REQUEST_SECONDS = Histogram(
+    "gemini_request_seconds", "Latency of Gemini generate_content calls.", ("outcome",))
+
+IMAGE_DOWNLOAD_SECONDS = Histogram(
+    "image_download_seconds", "Time to download one image.", ("source", "outcome"))
+IMAGE_DOWNLOAD_BYTES = Histogram(
+    "image_download_bytes", "Size of downloaded images.", ("source",), buckets=SIZE_BUCKETS)
+
+ANNOTATE_UPLOAD_SECONDS = Histogram(
+    "annotate_upload_seconds", "Latency of the annotate API upload.", ("outcome",))
+ANNOTATE_BATCH_SIZE = Histogram(
+    "annotate_batch_size", "Posts sent per annotate upload.", buckets=BATCH_BUCKETS)
+
+METADATA_LOAD_SECONDS = Histogram(
+    "metadata_load_seconds", "Time to read and parse a JSON store.", ("file",))
+METADATA_SAVE_SECONDS = Histogram(
+    "metadata_save_seconds", "Time to serialize and write a JSON store.", ("file",))
+METADATA_SIZE_BYTES = Gauge(
+    "metadata_size_bytes", "Size of a JSON store when last read or written.", ("file",))
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds", "Time a pipeline stage spends on one job.", ("stage", "outcome"))
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result"))
+
+AUTO_ENRICH_POSTS = Counter(
+    "auto_enrich_posts_total", "Posts handled by the auto-enrich worker, by outcome.", ("outcome",))
@@ -0,0 +1,117 @@
+"""
+Moves the flat storage/instagram/{username}/ and storage/uploads/ trees into
+the content-addressed blob store.
+
+Files are hard-linked into storage/blobs/ab/cd/{sha256}{ext} and the legacy
+name is then unlinked, so no image data is copied. Duplicate reposts collapse
+onto a single blob. Image URLs stay the same; each post's `local_path` in the
+catalog is pointed at its blob.
+
+Legacy names are only unlinked once the catalog pointing at the blobs has been
+written, so an interrupted run loses nothing and can simply be run again (at
+worst some blobs are left with too high a reference count, which
+`cli.py reconcile --repair` corrects).
+
+Usage: python3 migrate_blobs.py [--storage storage] [--keep-legacy] [--dry-run]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+
+from blobstore import BlobStore, legacy_path
+from catalog import Catalog, LEGACY_FILES
+from storage import file_lock, read_json, write_json
+
+log = logging.getLogger(__name__)
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _same_image(path, blob, digest):
+    """True if `path` is the blob itself (a hard link) or a copy of it."""
+    if not os.path.isfile(path):
+        return False
+    return os.path.samefile(path, blob) or file_digest(path) == digest
+
+
+def migrate(storage_path="storage", keep_legacy=False, dry_run=False):
+    blobs = BlobStore(os.path.join(storage_path, "blobs"))
+    stats = {"migrated": 0, "already": 0, "missing": 0, "duplicates": 0, "bytes_saved": 0}
+
+    catalog_file = os.path.join(storage_path, "posts.json")
+    if not dry_run:
+        # Merges the older per-source metadata files into the catalog first
+        Catalog(storage_path, blobs)
+
+    # Writers in a running server wait on this lock until the catalog is migrated
+    with file_lock(catalog_file):
+        records = read_json(catalog_file, [])
+        if dry_run:
+            for name in LEGACY_FILES:
+                records += read_json(os.path.join(storage_path, name), [])
+
+        changed = False
+        unlink = []
+        for record in records:
+            blob = record.get("sha256") and blobs.find(record["sha256"])
+            if blob:
+                stats["already"] += 1
+                if record.get("local_path") != blob:
+                    record["local_path"] = blob
+                    changed = True
+                # Left behind by a run interrupted after the catalog was written
+                src = legacy_path(record["image_path"], storage_path)
+                if not keep_legacy and not dry_run and _same_image(src, blob, record["sha256"]):
+                    unlink.append(src)
+                continue
+
+            src = legacy_path(record["image_path"], storage_path)
+            if not os.path.isfile(src):
+                log.warning("missing image post_id=%s path=%s", record['post_id'], src)
+                stats["missing"] += 1
+                continue
+
+            digest = file_digest(src)
+            ext = os.path.splitext(src)[1].lower() or ".jpg"
+            if blobs.find(digest):
+                stats["duplicates"] += 1
+                stats["bytes_saved"] += os.path.getsize(src)
+
+            if not dry_run:
+                record["local_path"] = blobs.adopt(src, digest, ext)
+                unlink.append(src)
+            record["sha256"] = digest
+            changed = True
+            stats["migrated"] += 1
+
+        if changed and not dry_run:
+            write_json(catalog_file, records)
+        if not keep_legacy and not dry_run:
+            for src in unlink:
+                try:
+                    os.remove(src)
+                except FileNotFoundError:
+                    pass
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate flat image folders into the blob store")
+    parser.add_argument("--storage", default="storage")
+    parser.add_argument("--keep-legacy", action="store_true", help="Keep the old file names as extra hard links")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    result = migrate(args.storage, keep_legacy=args.keep_legacy, dry_run=args.dry_run)
+    print(json.dumps(result, indent=2))
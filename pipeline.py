@@ -0,0 +1,173 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from metrics import Gauge, PIPELINE_STAGE_SECONDS
+
+log = logging.getLogger(__name__)
+
+# Sentinel pushed through the queues to tell workers the input is exhausted
+_DONE = object()
+
+# Stats of the most recent pipeline runs, exposed via /api/pipeline/stats
+_recent_runs = deque(maxlen=10)
+_recent_lock = threading.Lock()
+
+
+class Stage:
+    """A named step of the pipeline. `func(job)` returns the job to pass on, or None to drop it."""
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _record(self, elapsed, outcome):
+        PIPELINE_STAGE_SECONDS.observe(elapsed, stage=self.name, outcome=outcome)
+        with self._lock:
+            self.busy_seconds += elapsed
+            if outcome == "ok":
+                self.processed += 1
+            elif outcome == "dropped":
+                self.dropped += 1
+            else:
+                self.errors += 1
+
+
+class Pipeline:
+    """Runs jobs through a chain of stages connected by bounded queues.
+
+    Every stage has its own worker threads. A full queue blocks the stage
+    feeding it, so a slow stage (e.g. enrichment) throttles the fetchers
+    instead of letting downloaded images pile up in memory.
+    """
+
+    def __init__(self, name, stages, maxsize=32):
+        self.name = name
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=maxsize) for _ in stages]
+        self.results = []
+        self.fed = 0
+        self.started_at = None
+        self.finished_at = None
+        self._results_lock = threading.Lock()
+
+    def _worker(self, index, remaining):
+        stage = self.stages[index]
+        inbox = self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            job = inbox.get()
+            if job is _DONE:
+                break
+
+            start = time.perf_counter()
+            try:
+                out = stage.func(job)
+                outcome = "ok" if out is not None else "dropped"
+            except Exception as e:
+                log.warning("stage failed pipeline=%s stage=%s post_id=%s error=%s",
+                            self.name, stage.name, job.get('post_id'), e)
+                job.setdefault("error", f"{stage.name}: {e}")
+                out = None
+                outcome = "error"
+            stage._record(time.perf_counter() - start, outcome)
+
+            if out is None:
+                continue
+            if outbox is not None:
+                outbox.put(out)
+            else:
+                with self._results_lock:
+                    self.results.append(out)
+
+        # The last worker of a stage to finish shuts down the next stage
+        with remaining["lock"]:
+            remaining["count"] -= 1
+            last = remaining["count"] == 0
+        if last and outbox is not None:
+            for _ in range(self.stages[index + 1].workers):
+                outbox.put(_DONE)
+
+    def run(self, jobs):
+        """Feeds `jobs` (any iterable, consumed lazily) and blocks until every stage drains."""
+        self.started_at = time.time()
+        with _recent_lock:
+            _recent_runs.append(self)
+
+        threads = []
+        for index, stage in enumerate(self.stages):
+            remaining = {"count": stage.workers, "lock": threading.Lock()}
+            for n in range(stage.workers):
+                t = threading.Thread(
+                    target=self._worker,
+                    args=(index, remaining),
+                    name=f"{self.name}-{stage.name}-{n}",
+                    daemon=True,
+                )
+                t.start()
+                threads.append(t)
+
+        try:
+            for job in jobs:
+                job.setdefault("seq", self.fed)
+                self.fed += 1
+                self.queues[0].put(job)
+        finally:
+            for _ in range(self.stages[0].workers):
+                self.queues[0].put(_DONE)
+            for t in threads:
+                t.join()
+            self.finished_at = time.time()
+
+        self.results.sort(key=lambda j: j["seq"])
+        return self.results
+
+    def stats(self):
+        elapsed = (self.finished_at or time.time()) - (self.started_at or time.time())
+        return {
+            "name": self.name,
+            "fed": self.fed,
+            "completed": len(self.results),
+            "running": self.finished_at is None,
+            "elapsed_seconds": round(elapsed, 3),
+            "stages": [
+                {
+                    "name": stage.name,
+                    "workers": stage.workers,
+                    "queue_depth": self.queues[i].qsize(),
+                    "processed": stage.processed,
+                    "dropped": stage.dropped,
+                    "errors": stage.errors,
+                    "busy_seconds": round(stage.busy_seconds, 3),
+                    "throughput_per_sec": round(stage.processed / elapsed, 2) if elapsed > 0 else 0.0,
+                }
+                for i, stage in enumerate(self.stages)
+            ],
+        }
+
+
+def _queue_depths():
+    with _recent_lock:
+        running = [run for run in _recent_runs if run.finished_at is None]
+    return [({"pipeline": run.name, "stage": stage.name}, run.queues[i].qsize())
+            for run in running for i, stage in enumerate(run.stages)]
+
+
+PIPELINE_QUEUE_DEPTH = Gauge(
+    "pipeline_queue_depth", "Jobs waiting in front of each stage of running pipelines.",
+    ("pipeline", "stage"), collect=_queue_depths)
+
+
+def recent_stats():
+    with _recent_lock:
+        runs = list(_recent_runs)
+    return [run.stats() for run in reversed(runs)]
@@ -0,0 +1,158 @@
+"""
+Compact read-only view of the catalog that every worker keeps in memory.
+
+Each post becomes a PostRecord: the fields the hot read paths use (id,
+account, source, status, paths, timestamps) live in slots, the other small
+fields in a plain dict, and `ai_data`, by far the largest part of an
+enriched post, stays encoded as JSON until it is asked for. A PostIndex
+holds the records with lookup by id and image URL and buckets per source,
+status and account. An index is never changed; the catalog builds a new
+one after each write to `posts.json`.
+"""
+import json
+import sys
+from collections.abc import Mapping
+
+# Fields kept in slots; None means the post does not have it
+SUMMARY_FIELDS = ("post_id", "username", "source", "status", "image_path", "thumb_path",
+                  "local_path", "sha256", "timestamp", "updated_at")
+# Short strings repeated across many posts, shared in memory
+_INTERNED = ("username", "source", "status", "timestamp")
+
+_MISSING = object()
+
+
+class PostRecord(Mapping):
+    """One post as a read-only mapping, so `post['status']`, `post.get(...)`,
+    `dict(post)` work as they do on the stored dict. `ai_data` is decoded on
+    every access: keep the result rather than asking twice in a loop."""
+
+    __slots__ = SUMMARY_FIELDS + ("_extra", "_ai")
+
+    def __init__(self, post):
+        # Takes the dict apart: pass a copy if it is used elsewhere
+        for name in SUMMARY_FIELDS:
+            value = post.pop(name, None)
+            if name in _INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, name, value)
+        ai_data = post.pop("ai_data", _MISSING)
+        self._ai = None if ai_data is _MISSING else json.dumps(ai_data, ensure_ascii=False, separators=(",", ":"))
+        self._extra = post or None
+
+    def matches(self, post):
+        """True if the stored dict `post` has this record's summary fields (`updated_at` included)."""
+        for name in SUMMARY_FIELDS:
+            if post.get(name) != getattr(self, name):
+                return False
+        return True
+
+    @property
+    def ai_data(self):
+        return None if self._ai is None else json.loads(self._ai)
+
+    def __getitem__(self, key):
+        if key in SUMMARY_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif key == "ai_data":
+            if self._ai is not None:
+                return json.loads(self._ai)
+        elif self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if key in SUMMARY_FIELDS:
+            return getattr(self, key) is not None
+        if key == "ai_data":
+            return self._ai is not None
+        return bool(self._extra) and key in self._extra
+
+    def __iter__(self):
+        for name in SUMMARY_FIELDS:
+            if getattr(self, name) is not None:
+                yield name
+        if self._extra:
+            yield from self._extra
+        if self._ai is not None:
+            yield "ai_data"
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"PostRecord({self.post_id!r}, status={self.status!r})"
+
+    def to_dict(self):
+        """The post as a new plain dict."""
+        post = {name: getattr(self, name) for name in SUMMARY_FIELDS if getattr(self, name) is not None}
+        if self._extra:
+            post.update(self._extra)
+        if self._ai is not None:
+            post["ai_data"] = json.loads(self._ai)
+        return post
+
+    def to_json(self):
+        """The post as a JSON object, without decoding `ai_data`."""
+        post = {name: getattr(self, name) for name in SUMMARY_FIELDS if getattr(self, name) is not None}
+        if self._extra:
+            post.update(self._extra)
+        text = json.dumps(post, ensure_ascii=False, separators=(",", ":"))
+        if self._ai is None:
+            return text
+        return f'{text[:-1]}{"," if post else ""}"ai_data":{self._ai}}}'
+
+
+class PostIndex:
+    """The catalog at one `posts.json` version (`key`), as PostRecords.
+
+    Built from post dicts one at a time, so the whole list is never held as
+    dicts. Every catalog write stamps the posts it changes with a new
+    `updated_at`: records of the `previous` index whose summary fields
+    (that stamp included) are unchanged are reused as they are.
+    """
+
+    def __init__(self, posts, key=None, previous=None):
+        self.key = key
+        self.posts = []
+        reuse = previous.by_id if previous else {}
+        for post in posts:
+            record = reuse.get(post.get('post_id'))
+            if record is None or not record.matches(post):
+                record = PostRecord(post)
+            self.posts.append(record)
+        self.by_id = {}
+        self.by_image = {}
+        # Posts per source, per (source, status) and (None, status), and per account, in stored order
+        self.by_source = {}
+        self.by_status = {}
+        self.by_username = {}
+        for post in self.posts:
+            self.by_id[post.post_id] = post
+            if post.image_path:
+                self.by_image[post.image_path] = post
+            status = post.status or "pending"
+            self.by_source.setdefault(post.source, []).append(post)
+            self.by_status.setdefault((post.source, status), []).append(post)
+            self.by_status.setdefault((None, status), []).append(post)
+            self.by_username.setdefault(post.username, []).append(post)
+
+    def select(self, status, source=None, usernames=None):
+        """Posts with `status`, optionally of one source and some accounts only
+        (then account by account), otherwise in stored order."""
+        if not usernames:
+            return self.by_status.get((source, status), [])
+        return [p for username in dict.fromkeys(usernames) for p in self.by_username.get(username, ())
+                if (p.status or "pending") == status and (source is None or p.source == source)]
+
+    def to_json(self, posts):
+        """A list of records as a JSON array."""
+        return "[" + ",".join(post.to_json() for post in posts) + "]"
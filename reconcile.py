@@ -0,0 +1,403 @@
+"""
+Cross-checks the files under the storage folder against the catalog, and
+repairs what it can.
+
+Scanned are `blobs/` (where images live), the flat `instagram/` and
+`uploads/` folders of trees not migrated yet, `thumbnails/` and `tmp/`.
+A run reports:
+  orphans             files no post points at (left-over temp files included)
+  dangling            posts whose image file is gone
+  stale_paths         posts whose image is there, but not where the catalog says
+  corrupt             images that do not decode, or blobs whose bytes no longer match their sha256
+  refcounts           blob reference counts that disagree with the catalog
+  missing_thumbnails  posts without a thumbnail
+
+Folders are listed with os.scandir across a thread pool. Every folder's
+listing (with each file's mtime, size and check result) is kept in
+`storage/reconcile.json`: a folder whose mtime has not changed is not listed
+again (its files are only stat'ed), and a file is only checked when it is
+new or its mtime/size changed.
+`--full` lists and checks everything again.
+
+A post whose image is not where the catalog says is looked for under its
+blob, and in its flat folder as `{post_id}.*` or `{post_id}_N.*` (older
+scrapes saved .webp files and carousel images under names the catalog
+never recorded); files named that way after any post are never orphans.
+
+Repairs (`--repair`): posts are pointed at their image again (stale_paths),
+reference counts are corrected, missing or corrupt thumbnails are rebuilt,
+and temp files and unreferenced blobs older than GRACE_SECONDS are deleted.
+Unreferenced images in the flat folders and thumbnails are only deleted
+with `--delete-unreferenced`, dangling posts only with `--drop-dangling`.
+Corrupt images are reported, not touched.
+
+Usage: python3 cli.py reconcile [--repair] [--delete-unreferenced] [--drop-dangling] [--full] [--workers 16]
+"""
+import logging
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from blobstore import legacy_path
+from migrate_blobs import file_digest
+from storage import file_lock, read_json, write_json
+
+log = logging.getLogger(__name__)
+
+ROOTS = ("blobs", "instagram", "uploads", "thumbnails", "tmp")
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+# Files this new may belong to an ingest or upload still in progress, and are not deleted
+GRACE_SECONDS = 3600
+# Entries listed per finding in a report (the counts are always complete)
+LIST_LIMIT = 200
+
+
+def _decode(path):
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.load()
+
+
+def _check(rel, path):
+    """None if the file is fine, else what is wrong with it."""
+    try:
+        if rel.startswith("blobs" + os.sep):
+            digest = os.path.basename(rel).split(".", 1)[0]
+            if file_digest(path) != digest:
+                return "content does not match its sha256"
+        else:
+            _decode(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        return str(e) or type(e).__name__
+    return None
+
+
+def _kind(rel):
+    """What a scanned file is: "blob", "image", "thumbnail", "temp" or None (not ours)."""
+    root, _, rest = rel.partition(os.sep)
+    name = rel.rpartition(os.sep)[2]
+    if name.endswith(".lock"):
+        return None
+    if root == "tmp" or name.endswith(".tmp"):
+        return "temp"
+    if name[name.rfind("."):].lower() not in IMAGE_SUFFIXES:
+        return None
+    if root == "blobs":
+        return "blob" if rest.count(os.sep) == 2 else None
+    return "thumbnail" if root == "thumbnails" else "image"
+
+
+_PART = re.compile(r"(.+)_\d+")
+
+
+def _owners(rel):
+    """Post ids a flat-folder image may belong to: `{post_id}.*` or `{post_id}_N.*`."""
+    stem = rel.rpartition(os.sep)[2].rpartition(".")[0]
+    part = _PART.fullmatch(stem)
+    return (stem, part.group(1)) if part else (stem,)
+
+
+class Reconciler:
+    def __init__(self, scraper, workers=16):
+        self.scraper = scraper
+        self.catalog = scraper.catalog
+        self.blobs = scraper.blobs
+        self.root = scraper.storage_path
+        self.workers = max(1, workers)
+        self.state_path = os.path.join(self.root, "reconcile.json")
+
+    def last_report(self):
+        return (read_json(self.state_path) or {}).get("report")
+
+    def run(self, repair=False, drop_dangling=False, full=False, delete_unreferenced=False, progress=None):
+        """Scans, cross-checks and (with `repair`) fixes. Returns the report.
+
+        `progress(step, done, total)` is called as the run goes on.
+        """
+        # One run at a time; the listings of the last run are its starting point
+        with file_lock(self.state_path):
+            started = time.time()
+            state = {} if full else (read_json(self.state_path) or {})
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="reconcile") as pool:
+                dirs, listed = self._scan(pool, state.get("dirs", {}))
+                files = {rel + os.sep + name: entry
+                         for rel, listing in dirs.items() for name, entry in listing["files"].items()}
+                checked = self._verify(pool, files, progress)
+                report, relink = self._cross_check(files, started)
+                report["files"] = dict(Counter(rel.partition(os.sep)[0] for rel in files))
+                report["listed_dirs"] = listed
+                report["checked"] = checked
+                if repair:
+                    report["repaired"] = self._repair(report, relink, drop_dangling, delete_unreferenced, started)
+            report["seconds"] = round(time.time() - started, 3)
+            findings = ("orphans", "dangling", "stale_paths", "corrupt", "refcounts", "missing_thumbnails")
+            report["counts"] = {key: len(report[key]) for key in findings}
+            for key in findings:
+                report[key] = report[key][:LIST_LIMIT]
+            write_json(self.state_path, {"dirs": dirs, "report": report}, indent=None)
+        log.info("reconcile finished seconds=%.2f listed_dirs=%d checked=%d %s", report["seconds"], listed, checked,
+                 " ".join(f"{k}={v}" for k, v in report["counts"].items()))
+        return report
+
+    def _list(self, rel, cached):
+        """A folder's files ({name: [mtime_ns, size, problem]}) and subfolders.
+        The cached names are reused while the folder's mtime is unchanged;
+        returns (listing, listed again?), or (None, False) if the folder is gone."""
+        path = os.path.join(self.root, rel)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if cached and cached["mtime"] == mtime:
+                # Writing into a file (a truncated or rewritten image) leaves
+                # the folder's mtime alone, so each file is still stat'ed
+                files = {}
+                for name, seen in cached["files"].items():
+                    try:
+                        st = os.stat(os.path.join(path, name))
+                    except FileNotFoundError:
+                        continue
+                    files[name] = self._entry(st, seen)
+                return dict(cached, files=files), False
+            previous = cached["files"] if cached else {}
+            files, subdirs = {}, []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file(follow_symlinks=False):
+                        files[entry.name] = self._entry(entry.stat(), previous.get(entry.name))
+        except FileNotFoundError:
+            return None, False
+        # A folder changed this very moment may change again within the same mtime tick
+        if time.time_ns() - mtime < 2 * 10**9:
+            mtime = None
+        return {"mtime": mtime, "files": files, "dirs": sorted(subdirs)}, True
+
+    @staticmethod
+    def _entry(st, seen):
+        # The last check result holds while the file's mtime and size are unchanged
+        if seen and seen[0] == st.st_mtime_ns and seen[1] == st.st_size:
+            return seen
+        return [st.st_mtime_ns, st.st_size, False]  # not checked yet
+
+    def _walk(self, rel, cached):
+        """Lists a folder and everything below it. Returns ({rel: listing}, folders listed again)."""
+        dirs, listed, stack = {}, 0, [rel]
+        while stack:
+            rel = stack.pop()
+            listing, relisted = self._list(rel, cached.get(rel))
+            if listing is None:
+                continue
+            dirs[rel] = listing
+            listed += relisted
+            stack.extend(rel + os.sep + name for name in listing["dirs"])
+        return dirs, listed
+
+    def _scan(self, pool, cached):
+        # One task per folder right below a root: a blob shard, an account's folder
+        dirs, listed, subtrees = {}, 0, []
+        for rel in ROOTS:
+            listing, relisted = self._list(rel, cached.get(rel))
+            if listing is not None:
+                dirs[rel] = listing
+                listed += relisted
+                subtrees.extend(rel + os.sep + name for name in listing["dirs"])
+        for subtree, relisted in pool.map(lambda rel: self._walk(rel, cached), subtrees):
+            dirs.update(subtree)
+            listed += relisted
+        return dirs, listed
+
+    def _verify(self, pool, files, progress):
+        # entry[2]: False = not checked yet, None = fine, str = what is wrong
+        todo = []
+        for rel, entry in files.items():
+            if entry[2] is False:
+                if _kind(rel) in ("blob", "image", "thumbnail"):
+                    todo.append(rel)
+                else:
+                    entry[2] = None
+
+        def check(rel):
+            return rel, _check(rel, os.path.join(self.root, rel))
+
+        for done, (rel, problem) in enumerate(pool.map(check, todo), 1):
+            files[rel][2] = problem
+            if progress:
+                progress("check", done, len(todo))
+        return len(todo)
+
+    def _rel(self, path):
+        # Catalog paths are almost always "{storage}/..." already
+        prefix = os.path.join(self.root, "")
+        if path.startswith(prefix) and os.pardir not in path:
+            return path[len(prefix):]
+        rel = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        return None if rel.startswith(os.pardir) else rel
+
+    def _cross_check(self, files, started):
+        report = {"started_at": started, "orphans": [], "dangling": [], "stale_paths": [], "corrupt": [],
+                  "refcounts": [], "missing_thumbnails": []}
+        relink = {}
+        referenced = set()
+        expected = Counter()
+        corrupt = {}
+        folders = {}  # folder -> file names, filled on first use
+
+        def find_by_name(post_id, *paths):
+            # {post_id}.{any ext} first, then {post_id}_1.*, {post_id}_2.*, ... (carousel parts)
+            if not folders:
+                for rel in files:
+                    folder, _, name = rel.rpartition(os.sep)
+                    folders.setdefault(folder, []).append(name)
+            pattern = re.compile(re.escape(post_id) + r"(?:_(\d+))?\.[^.]+")
+            for folder in dict.fromkeys(os.path.dirname(path) for path in paths if path):
+                matches = []
+                for name in folders.get(folder, ()):
+                    match = pattern.fullmatch(name)
+                    if match and _kind(folder + os.sep + name) == "image":
+                        matches.append((int(match.group(1) or 0), name))
+                if matches:
+                    return [folder + os.sep + name for _, name in sorted(matches)]
+            return []
+
+        post_ids = set()
+        for post in self.catalog.posts():
+            post_id = post['post_id']
+            post_ids.add(post_id)
+            image = self.catalog.local_path(post)
+            rel = self._rel(image)
+            legacy = self._rel(legacy_path(post['image_path'], self.root))
+            referenced.update(r for r in (rel, legacy) if r)
+            if post.get('sha256'):
+                expected[post['sha256']] += 1
+            thumb = post.get('thumb_path') or f"/thumbnails/{post['username']}/{post_id}.jpg"
+            thumb = "thumbnails" + os.sep + thumb[len("/thumbnails/"):].replace("/", os.sep)
+            referenced.add(thumb)
+
+            if rel in files or (rel is None and os.path.isfile(image)):
+                if rel in files and files[rel][2]:
+                    corrupt.setdefault(rel, []).append(post_id)
+            else:
+                # The image may still be around under its blob or its old flat path
+                blob = post.get('sha256') and self.blobs.find(post['sha256'])
+                by_name = None
+                if not blob:
+                    names = [legacy] if legacy in files else find_by_name(post_id, rel, legacy)
+                    referenced.update(names)
+                    by_name = names[0] if names else None
+                found = blob or (by_name and os.path.join(self.root, by_name))
+                if found:
+                    report["stale_paths"].append(post_id)
+                    relink[post_id] = found
+                else:
+                    report["dangling"].append(post_id)
+                    continue
+
+            if thumb not in files:
+                report["missing_thumbnails"].append(post_id)
+            elif files[thumb][2]:
+                corrupt.setdefault(thumb, []).append(post_id)
+
+        blob_files = {}
+        for rel, (mtime, size, problem) in files.items():
+            kind = _kind(rel)
+            if kind == "blob":
+                digest = os.path.basename(rel).split(".", 1)[0]
+                blob_files[digest] = (rel, mtime)
+                if problem and rel not in corrupt:
+                    corrupt[rel] = []
+            elif kind == "temp" or (kind in ("image", "thumbnail") and rel not in referenced
+                                    and not (kind == "image" and not post_ids.isdisjoint(_owners(rel)))):
+                report["orphans"].append(rel)
+            elif kind and problem and rel not in corrupt:
+                corrupt[rel] = []
+
+        # Reference counts, per digest stored, counted or with a file
+        stored = {}
+        for rel in files:
+            if rel.startswith("blobs" + os.sep) and os.path.basename(rel) == "refs.json":
+                stored.update(read_json(os.path.join(self.root, rel), {}))
+        for digest in set(stored) | set(expected) | set(blob_files):
+            refs = stored[digest]["refs"] if digest in stored else 0
+            if refs != expected[digest]:
+                report["refcounts"].append({"sha256": digest, "stored": refs, "expected": expected[digest]})
+            elif not refs and digest in blob_files:
+                report["orphans"].append(blob_files[digest][0])
+
+        report["corrupt"] = [{"path": rel, "error": files[rel][2], "post_ids": post_ids}
+                             for rel, post_ids in sorted(corrupt.items())]
+        return report, relink
+
+    def _settled(self, rel, started):
+        # Not written during the grace period (and not during this run)
+        try:
+            return os.stat(os.path.join(self.root, rel)).st_mtime < started - GRACE_SECONDS
+        except FileNotFoundError:
+            return True
+
+    def _repair(self, report, relink, drop_dangling, delete_unreferenced, started):
+        repaired = {"relinked": 0, "refcounts": 0, "orphans_removed": 0, "thumbnails": 0, "dropped": 0}
+        if relink:
+            def point(post):
+                post['local_path'] = relink[post['post_id']]
+                return True
+
+            repaired["relinked"] = len(self.catalog.update(relink, point))
+
+        for mismatch in report["refcounts"]:
+            digest, refs, expected = mismatch["sha256"], mismatch["stored"], mismatch["expected"]
+            blob = self.blobs.find(digest)
+            shard = os.path.join("blobs", digest[:2], "refs.json")
+            # Counts are only lowered once nothing in the shard has changed for a
+            # while: a new post takes its blob reference before it is in the catalog
+            if refs > expected and not (self._settled(shard, started)
+                                        and (blob is None or self._settled(self._rel(blob), started))):
+                continue
+            ext = os.path.splitext(blob)[1] if blob else ".jpg"
+            if self.blobs.set_refs(digest, expected, ext, refs):
+                repaired["refcounts"] += 1
+                if not expected:
+                    repaired["orphans_removed"] += 1
+
+        for rel in report["orphans"]:
+            # Images in the flat folders may be the only copy of something; those stay unless asked
+            if _kind(rel) in ("image", "thumbnail") and not delete_unreferenced:
+                continue
+            if self._settled(rel, started):
+                try:
+                    os.remove(os.path.join(self.root, rel))
+                    repaired["orphans_removed"] += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    log.warning("orphan not removed path=%s error=%s", rel, e)
+
+        rebuild = set(report["missing_thumbnails"])
+        for item in report["corrupt"]:
+            if item["path"].startswith("thumbnails" + os.sep) and item["post_ids"]:
+                try:
+                    os.remove(os.path.join(self.root, item["path"]))
+                except FileNotFoundError:
+                    pass
+                rebuild.update(item["post_ids"])
+        rebuilt = self.scraper.rebuild_thumbnails(self.catalog.get_many(rebuild), self.workers)
+        repaired["thumbnails"] = len(rebuilt)
+
+        if drop_dangling and report["dangling"]:
+            repaired["dropped"] = len(self.scraper.delete_posts(report["dangling"]))
+        return repaired
+
+
+def add_arguments(parser):
+    parser.add_argument("--repair", action="store_true", help="Fix what can be fixed (default: report only)")
+    parser.add_argument("--delete-unreferenced", action="store_true",
+                        help="With --repair, also delete images in instagram/, uploads/ and thumbnails/ "
+                             "no post points at")
+    parser.add_argument("--drop-dangling", action="store_true",
+                        help="With --repair, delete posts whose image is gone for good")
+    parser.add_argument("--full", action="store_true", help="List and check every file, not only changed ones")
+    parser.add_argument("--workers", type=int, default=16, help="Threads listing and checking files")
@@ -1,226 +1,531 @@
 
-import instaloader
 import os
-import json
 import time
 from datetime import datetime
-import requests
 import shutil
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pipeline import Pipeline, Stage
+from blobstore import BlobStore, legacy_path
+from catalog import Catalog, SOURCE_INSTAGRAM
+from ig_client import ResponseCache, SessionStore
+from metrics import IMAGE_DOWNLOAD_BYTES, IMAGE_DOWNLOAD_SECONDS
+from storage import read_json
+
+log = logging.getLogger(__name__)
+
+# Browser-like headers so the Instagram CDN does not block image downloads
+CDN_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# PIL format name -> file extension used on disk
+IMAGE_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+
+THUMBNAIL_SIZE = (320, 320)
+
+# Default worker count per ingest stage
+STAGE_WORKERS = {
+    "fetch": 8,
+    "validate": 2,
+    "hash": 1,
+    "thumbnail": 2,
+    "persist": 2,
+    "enrich": 4,
+}
+
+def apify_items(data):
+    """The item list of an Apify export, which may come wrapped in a dict."""
+    if isinstance(data, dict):
+        # Look for common keys where lists might be stored
+        if "items" in data: data = data["items"]
+        elif "data" in data: data = data["data"]
+        else: data = [data] # Treat single object as a list
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of items.")
+    return data
 
 class InstaScraper:
+    # Seconds to wait after each image download of a profile scrape
+    download_delay = 2
+
     def __init__(self, storage_path="storage"):
-        self.L = instaloader.Instaloader(
-            download_pictures=True,
-            download_videos=False,
-            download_video_thumbnails=False,
-            download_geotags=False,
-            download_comments=False,
-            save_metadata=False,
-            compress_json=False,
-            dirname_pattern=os.path.join(storage_path, "instagram", "{profile}"),
-            filename_pattern="{shortcode}"
-        )
+        self._loader = None
+        self.session_store = None
+        self.response_cache = None
+        self._loader_lock = threading.Lock()
         self.storage_path = storage_path
-        self.metadata_file = os.path.join(storage_path, "metadata.json")
-        
+        self.thumbnail_dir = os.path.join(storage_path, "thumbnails")
+        self.blobs = BlobStore(os.path.join(storage_path, "blobs"))
+        self.catalog = Catalog(storage_path, self.blobs)
+
         # Ensure base directories exist
         os.makedirs(os.path.join(self.storage_path, "instagram"), exist_ok=True)
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
 
-    def _get_history(self):
-        if os.path.exists(self.metadata_file):
-            try:
-                with open(self.metadata_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
-
-    def _save_history(self, history):
-        with open(self.metadata_file, 'w') as f:
-            json.dump(history, f, indent=2)
-
-    def scrape_profile(self, username, limit=10):
-        print(f"Starting Instaloader scrape for @{username} (limit: {limit})")
+    @property
+    def L(self):
+        """The Instaloader instance, created on first use (importing instaloader is slow)."""
+        if self._loader is None:
+            with self._loader_lock:
+                if self._loader is None:
+                    import instaloader
+                    self._loader = instaloader.Instaloader(
+                        download_pictures=True,
+                        download_videos=False,
+                        download_video_thumbnails=False,
+                        download_geotags=False,
+                        download_comments=False,
+                        save_metadata=False,
+                        compress_json=False,
+                        post_metadata_txt_pattern="",
+                        storyitem_metadata_txt_pattern="",
+                        dirname_pattern=os.path.join(self.storage_path, "instagram", "{profile}"),
+                        filename_pattern="{shortcode}"
+                    )
+                    # Reuse the cookies (or login) of earlier runs, and serve repeated
+                    # profile/listing requests from the response cache (INSTAGRAM_CACHE=0 disables it)
+                    self.session_store = SessionStore.from_env(self.storage_path)
+                    self.session_store.load(self._loader.context)
+                    if os.getenv("INSTAGRAM_CACHE", "1") != "0":
+                        self.response_cache = ResponseCache.from_env(self.storage_path)
+                        self.response_cache.install(self._loader.context)
+        return self._loader
+
+    def scrape_profile(self, username, limit=10, auto_enrich=False):
+        import instaloader
+
+        log.info("scrape started username=%s limit=%s", username, limit)
         try:
             profile = instaloader.Profile.from_username(self.L.context, username)
         except Exception as e:
-            print(f"Instaloader Error: {e}")
+            log.warning("instaloader profile lookup failed username=%s error=%s", username, e)
             return {"error": str(e)}
 
-        history = self._get_history()
-        scraped_posts = []
+        history = self.catalog.posts()
+        known_ids = {h['post_id'] for h in history}
+        # `limit` counts downloaded posts: a failed download frees its slot for the next post
+        slots = threading.Condition()
+        counts = {"queued": 0, "downloaded": 0}
 
-        count = 0
-        for post in profile.get_posts():
-            if count >= limit:
-                break
+        def download(post):
+            downloaded = False
+            try:
+                with IMAGE_DOWNLOAD_SECONDS.time(source="instaloader"):
+                    data = self._download_image(post, username)
+                downloaded = True
+            finally:
+                with slots:
+                    counts["queued"] -= 1
+                    counts["downloaded"] += downloaded
+                    slots.notify()
+            IMAGE_DOWNLOAD_BYTES.observe(len(data), source="instaloader")
 
-            # Filter for images only
-            if post.is_video:
-                continue
+            # Rate limiting (scrape pipelines run a single fetch worker)
+            time.sleep(self.download_delay)
+            return data
 
-            post_id = post.shortcode
-            post_url = f"https://www.instagram.com/p/{post_id}/"
-            
-            # Check if already scraped
-            if any(h['post_id'] == post_id for h in history):
-                continue
+        def jobs():
+            for post in profile.get_posts():
+                # Wait for downloads in flight before deciding whether more are needed
+                with slots:
+                    slots.wait_for(lambda: counts["queued"] + counts["downloaded"] < limit
+                                   or counts["downloaded"] >= limit)
+                    if counts["downloaded"] >= limit:
+                        break
 
-            # Download post
-            try:
-                self.L.download_post(post, target=username)
-                
-                # Cleanup: Instaloader downloads .json.xz and .txt files too. Delete them.
-                profile_dir = os.path.join(self.storage_path, "instagram", username)
-                for file in os.listdir(profile_dir):
-                    if not file.endswith(".jpg") and not file.endswith(".jpeg") and not file.endswith(".png"):
-                        try:
-                            os.remove(os.path.join(profile_dir, file))
-                        except:
-                            pass
-
-                metadata = {
+                # Filter for images only
+                if post.is_video:
+                    continue
+
+                post_id = post.shortcode
+
+                # Check if already scraped
+                if post_id in known_ids:
+                    continue
+
+                with slots:
+                    counts["queued"] += 1
+                yield {
                     "post_id": post_id,
-                    "post_url": post_url,
-                    "caption": post.caption or "No description",
-                    "image_path": f"/images/{username}/{post_id}.jpg",
-                    "timestamp": post.date.isoformat(),
-                    "scraped_at": datetime.now().isoformat(),
                     "username": username,
-                    "status": "pending"
+                    "fetch": lambda post=post: download(post),
+                    "url_prefix": f"/images/{username}",
+                    "record": {
+                        "post_id": post_id,
+                        "post_url": f"https://www.instagram.com/p/{post_id}/",
+                        "caption": post.caption or "No description",
+                        "timestamp": post.date.isoformat(),
+                        "scraped_at": datetime.now().isoformat(),
+                        "username": username,
+                        "status": "pending"
+                    },
                 }
-                
-                history.append(metadata)
-                scraped_posts.append(metadata)
-                count += 1
-                print(f"Saved: {post_id}")
-                
-                # Rate limiting
-                time.sleep(2)
-                
-            except Exception as e:
-                print(f"Error downloading {post_id}: {e}")
-                continue
-
-        self._save_history(history)
+
+        try:
+            scraped_posts = self.ingest(jobs(), known=history, auto_enrich=auto_enrich,
+                                        workers={"fetch": 1}, name=f"scrape:{username}")
+        finally:
+            # Keep the cookies Instagram handed out for the next run
+            self.session_store.save(self.L.context)
+        scraped_posts = self.catalog.add(scraped_posts, SOURCE_INSTAGRAM)
+        log.info("scrape finished username=%s saved=%d", username, len(scraped_posts))
         return {"scraped_count": len(scraped_posts), "posts": scraped_posts}
 
-    def delete_post(self, post_id):
-        history = self._get_history()
-        post_to_delete = next((h for h in history if h['post_id'] == post_id), None)
-        
-        if post_to_delete:
-            # Delete physical file
-            # image_path is e.g., /images/username/postid.jpg
-            # We need to map it to storage/instagram/username/postid.jpg
-            parts = post_to_delete['image_path'].split('/')
-            if len(parts) >= 4:
-                username = parts[2]
-                filename = parts[3]
-                full_path = os.path.join(self.storage_path, "instagram", username, filename)
-                
-                if os.path.exists(full_path):
-                    try:
-                        os.remove(full_path)
-                    except:
-                        pass
-            
-            # Remove from history
-            new_history = [h for h in history if h['post_id'] != post_id]
-            self._save_history(new_history)
-            return True
-        return False
+    def _download_image(self, post, username):
+        # Fetch just the image through Instaloader's session; the persist stage
+        # writes it straight to its final path, so no sidecars are created and
+        # the profile folder never has to be scanned for cleanup.
+        return self.L.context.get_raw(post.url).content
 
-    def delete_folder(self, username):
-        history = self._get_history()
-        
-        # Delete directory
-        profile_dir = os.path.join(self.storage_path, "instagram", username)
-        if os.path.exists(profile_dir):
+    def release_image(self, post):
+        # Drop the blob reference, and the legacy flat file for posts not yet migrated
+        if post.get('sha256'):
+            self.blobs.release(post['sha256'])
+        paths = [legacy_path(post['image_path'], self.storage_path)]
+        if post.get('thumb_path'):
+            paths.append(os.path.join(self.thumbnail_dir, post['thumb_path'][len("/thumbnails/"):]))
+        for full_path in paths:
             try:
-                shutil.rmtree(profile_dir)
-            except:
+                os.remove(full_path)
+            except OSError:
                 pass
+
+    def release_images(self, posts):
+        """Releases the images of many posts, unlinking files in a thread pool."""
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(self.release_image, posts))
+
+    def delete_posts(self, post_ids):
+        """Deletes posts (scraped or uploaded) and their images. Returns the deleted posts."""
+        deleted = self.catalog.update(post_ids, lambda post: False)
+        self.release_images(deleted)
+        return deleted
+
+    def set_status(self, post_ids, status):
+        """Moves posts to `status` ('pending' clears previous enrichment). Returns the updated posts."""
+        def mutate(post):
+            post['status'] = status
+            if status == 'pending':
+                post['ai_data'] = {}
+            return True
+
+        return self.catalog.update(post_ids, mutate)
+
+    def update_posts(self, updates, if_status=None):
+        """Merges `{post_id: {field: value}}` into the stored posts in one locked pass.
+
+        Long-running jobs (enrich, annotate) apply their results through this
+        instead of rewriting a copy loaded before the job started, so edits
+        made meanwhile by other requests or workers are kept. With `if_status`,
+        posts whose status has changed since are left alone.
+        """
+        def mutate(post):
+            if if_status is None or post.get('status') == if_status:
+                post.update(updates[post['post_id']])
+            return True
+
+        return self.catalog.update(updates.keys(), mutate)
+
+    def rebuild_thumbnail(self, post):
+        """Recreates a post's missing thumbnail from its image. Returns the
+        thumb_path written, or None if there was nothing to do (or no image)."""
+        thumb_path = post.get('thumb_path') or f"/thumbnails/{post['username']}/{post['post_id']}.jpg"
+        full_path = os.path.join(self.thumbnail_dir, thumb_path[len("/thumbnails/"):])
+        image = self.catalog.local_path(post)
+        if os.path.exists(full_path) or not os.path.isfile(image):
+            return None
+        try:
+            thumb = self._stage_thumbnail({"file": image})["thumb"]
+        except Exception as e:
+            log.warning("thumbnail rebuild failed post_id=%s error=%s", post['post_id'], e)
+            return None
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(thumb)
+        return thumb_path
+
+    def rebuild_thumbnails(self, posts, workers=16, progress=None):
+        """Runs `rebuild_thumbnail` over many posts in a thread pool (`progress()`
+        is called per post). Returns `{post_id: thumb_path}` of those rebuilt."""
+        def rebuild(post):
+            path = self.rebuild_thumbnail(post)
+            if progress:
+                progress()
+            return post['post_id'], path
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            rebuilt = {post_id: path for post_id, path in pool.map(rebuild, posts) if path}
+        # Posts from before thumbnails existed get their thumb_path now
+        without_path = {p['post_id'] for p in posts if not p.get('thumb_path')}
+        self.update_posts({post_id: {"thumb_path": path} for post_id, path in rebuilt.items()
+                           if post_id in without_path})
+        return rebuilt
+
+    def delete_post(self, post_id):
+        return bool(self.delete_posts([post_id]))
+
+    def delete_folder(self, username):
+        # Remove all scraped posts of this user
+        removed = self.catalog.remove_where(
+            lambda p: p.get('source') == SOURCE_INSTAGRAM and p['username'] == username)
+
+        for post in removed:
+            if post.get('sha256'):
+                self.blobs.release(post['sha256'])
         
-        # Remove all posts for this user from history
-        new_history = [h for h in history if h['username'] != username]
-        self._save_history(new_history)
+        # Delete directories; whatever is left behind is found by reconcile.py
+        for folder in (os.path.join(self.storage_path, "instagram", username),
+                       os.path.join(self.thumbnail_dir, username)):
+            if os.path.exists(folder):
+                shutil.rmtree(folder, onerror=lambda func, path, exc: log.warning(
+                    "folder delete failed path=%s error=%s", path, exc[1]))
         return True
 
-    def process_apify_json(self, items, progress_callback=None):
+    def process_apify_json(self, items, progress_callback=None, auto_enrich=False):
         """Processes a list of items from an Apify Instagram Scraper export."""
-        history = self._get_history()
-        scraped_posts = []
+        history = self.catalog.posts()
+        known_ids = {h['post_id'] for h in history}
         total = len(items)
         
-        print(f"Processing {total} items from Apify JSON...")
-        
-        for index, item in enumerate(items):
-            post_id = item.get("shortCode")
-            
-            # Update progress
-            if progress_callback:
-                progress_callback(index + 1, total, post_id or "scanning")
-
-            if not post_id:
-                continue
-                
-            # Check if already scraped
-            if any(h['post_id'] == post_id for h in history):
-                continue
-
-            username = item.get("ownerUsername") or "unknown"
-            image_url = item.get("displayUrl")
-            if not image_url:
-                continue
-
-            # Ensure directory exists
-            profile_dir = os.path.join(self.storage_path, "instagram", username)
-            os.makedirs(profile_dir, exist_ok=True)
-
-            # Download image
-            try:
-                # Use headers to avoid being blocked by CDN
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                
-                # Determine extension from URL or fallback to jpg
-                ext = ".jpg"
-                if ".webp" in image_url.lower(): ext = ".webp"
-                elif ".png" in image_url.lower(): ext = ".png"
-                
-                img_filename = f"{post_id}{ext}"
-                img_path = os.path.join(profile_dir, img_filename)
-                
-                response = requests.get(image_url, headers=headers, timeout=20, stream=True)
-                if response.status_code == 200:
-                    with open(img_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    
-                    metadata = {
+        log.info("apify import started items=%d", total)
+
+        def jobs():
+            for index, item in enumerate(items):
+                post_id = item.get("shortCode")
+
+                # Update progress
+                if progress_callback:
+                    progress_callback(index + 1, total, post_id or "scanning")
+
+                if not post_id:
+                    continue
+
+                # Check if already scraped (also skips duplicates inside the export)
+                if post_id in known_ids:
+                    continue
+
+                username = item.get("ownerUsername") or "unknown"
+                image_url = item.get("displayUrl")
+                if not image_url:
+                    continue
+                known_ids.add(post_id)
+
+                yield {
+                    "post_id": post_id,
+                    "username": username,
+                    "url": image_url,
+                    "url_prefix": f"/images/{username}",
+                    "record": {
                         "post_id": post_id,
                         "post_url": item.get("url") or f"https://www.instagram.com/p/{post_id}/",
                         "caption": item.get("caption", "No description"),
-                        "image_path": f"/images/{username}/{img_filename}",
                         "timestamp": item.get("timestamp") or datetime.now().isoformat(),
                         "scraped_at": datetime.now().isoformat(),
                         "username": username,
                         "status": "pending"
-                    }
-                    
-                    history.append(metadata)
-                    scraped_posts.append(metadata)
-                    print(f"Processed from JSON: {post_id}")
-                else:
-                    print(f"Failed to download image for {post_id}: HTTP {response.status_code}")
-            except Exception as e:
-                print(f"Error processing {post_id}: {e}")
-
-        self._save_history(history)
+                    },
+                }
+
+        scraped_posts = self.ingest(jobs(), known=history, auto_enrich=auto_enrich, name="apify")
+        scraped_posts = self.catalog.add(scraped_posts, SOURCE_INSTAGRAM)
+        log.info("apify import finished items=%d saved=%d", total, len(scraped_posts))
         return {"scraped_count": len(scraped_posts), "posts": scraped_posts}
 
+    def import_legacy_folders(self, root="instagram", progress_callback=None):
+        """Merges the stores written by the old standalone ig_scraper.py
+        (`{root}/{username}/metadata.json` plus the images next to it) into the catalog.
+
+        Images are moved into the blob store; each merged metadata.json is
+        renamed to `metadata.json.merged`. Returns the new posts.
+        """
+        from migrate_blobs import file_digest
+
+        stores = []
+        if os.path.isdir(root):
+            for username in sorted(os.listdir(root)):
+                path = os.path.join(root, username, "metadata.json")
+                if os.path.isfile(path):
+                    stores.append((username, path, read_json(path, [])))
+        if not stores:
+            return []
+
+        known_ids = {p['post_id'] for p in self.catalog.posts()}
+        total = sum(len(records) for _, _, records in stores)
+
+        def jobs():
+            index = 0
+            for username, _, records in stores:
+                for item in records:
+                    index += 1
+                    if progress_callback:
+                        progress_callback(index, total, item.get("post_id"))
+                    post_id = item.get("post_id")
+                    image = item.get("image_path") or ""
+                    if not post_id or post_id in known_ids or not os.path.isfile(image):
+                        continue
+                    known_ids.add(post_id)
+                    yield {
+                        "post_id": post_id,
+                        "username": username,
+                        "file": image,
+                        "sha256": file_digest(image),
+                        "url_prefix": f"/images/{username}",
+                        "record": {
+                            "post_id": post_id,
+                            "post_url": item.get("post_url") or f"https://www.instagram.com/p/{post_id}/",
+                            "caption": item.get("caption") or "No description",
+                            "timestamp": item.get("timestamp"),
+                            "scraped_at": item.get("scraped_at") or datetime.now().isoformat(),
+                            "username": username,
+                            "status": "pending"
+                        },
+                    }
+
+        imported = self.ingest(jobs(), known=self.catalog.posts(), name="legacy-import")
+        imported = self.catalog.add(imported, SOURCE_INSTAGRAM)
+        for _, path, _ in stores:
+            os.replace(path, path + ".merged")
+        log.info("legacy import finished stores=%d saved=%d", len(stores), len(imported))
+        return imported
+
+    # --- Ingest pipeline -------------------------------------------------
+    #
+    # Every ingest entry point (profile scrape, Apify import, manual upload)
+    # describes its posts as job dicts and runs them through the same stages:
+    #   fetch -> validate -> hash -> thumbnail -> persist [-> enrich]
+    # A job carries `post_id`, `username`, `url_prefix`, a base `record` and
+    # one image source: `data` (bytes), `fetch` (callable), `url`, or `file`
+    # (a temp file already hashed into `sha256`, moved into the blob store).
+    # Jobs that are dropped say why in `error`.
+    #
+    # Image bytes go to the content-addressed blob store; `image_path` keeps
+    # the public `{url_prefix}/{post_id}{ext}` URL and `local_path` the blob
+    # file it is served from.
+
+    def ingest(self, jobs, known=(), auto_enrich=False, workers=None, name="ingest", drop_duplicates=False):
+        """Runs jobs through the ingest pipeline and returns the new metadata records.
+
+        Reposts of an already stored image share its blob. With
+        `drop_duplicates` they are skipped instead (used for manual uploads).
+        """
+        stage_workers = dict(STAGE_WORKERS)
+        stage_workers.update(workers or {})
+
+        seen_digests = {h['sha256'] for h in known if h.get('sha256')} if drop_duplicates else None
+        digest_lock = threading.Lock()
+
+        def dedup(job):
+            return self._stage_hash(job, seen_digests, digest_lock)
+
+        stages = [
+            Stage("fetch", self._stage_fetch, stage_workers["fetch"]),
+            Stage("validate", self._stage_validate, stage_workers["validate"]),
+            Stage("hash", dedup, stage_workers["hash"]),
+            Stage("thumbnail", self._stage_thumbnail, stage_workers["thumbnail"]),
+            Stage("persist", self._stage_persist, stage_workers["persist"]),
+        ]
+        if auto_enrich:
+            stages.append(Stage("enrich", self._stage_enrich, stage_workers["enrich"]))
+
+        done = Pipeline(name, stages).run(jobs)
+        return [job["record"] for job in done]
+
+    def _stage_fetch(self, job):
+        import requests
+
+        if job.get("data") is not None or job.get("file"):
+            return job
+        if job.get("fetch"):
+            job["data"] = job["fetch"]()
+            return job
+
+        with IMAGE_DOWNLOAD_SECONDS.time(source="cdn"):
+            response = requests.get(job["url"], headers=CDN_HEADERS, timeout=20, stream=True)
+            if response.status_code != 200:
+                raise IOError(f"HTTP {response.status_code}")
+            job["data"] = b"".join(response.iter_content(chunk_size=8192))
+        IMAGE_DOWNLOAD_BYTES.observe(len(job["data"]), source="cdn")
+        return job
+
+    def _stage_validate(self, job):
+        from PIL import Image
+
+        # Trust the decoded bytes rather than the URL or the client's content type
+        with Image.open(job.get("file") or io.BytesIO(job["data"])) as img:
+            img.verify()
+            ext = IMAGE_EXTENSIONS.get(img.format)
+        if ext is None:
+            log.warning("unsupported image format post_id=%s", job['post_id'])
+            job["error"] = "unsupported image format"
+            return None
+        job["ext"] = ext
+        return job
+
+    def _stage_hash(self, job, seen_digests, lock):
+        digest = job.get("sha256") or hashlib.sha256(job["data"]).hexdigest()
+        if seen_digests is not None:
+            with lock:
+                if digest in seen_digests:
+                    log.info("duplicate image skipped post_id=%s sha256=%s", job['post_id'], digest)
+                    job["error"] = "duplicate image"
+                    return None
+                seen_digests.add(digest)
+        job["sha256"] = digest
+        return job
+
+    def _stage_thumbnail(self, job):
+        from PIL import Image
+
+        with Image.open(job.get("file") or io.BytesIO(job["data"])) as img:
+            img = img.convert("RGB")
+            img.thumbnail(THUMBNAIL_SIZE)
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=80)
+        job["thumb"] = buffer.getvalue()
+        return job
+
+    def _stage_persist(self, job):
+        post_id = job["post_id"]
+        filename = f"{post_id}{job['ext']}"
+        if job.get("file"):
+            # Already on disk: link it into the store instead of writing it again
+            blob_path = self.blobs.adopt(job["file"], job["sha256"], job["ext"])
+            os.remove(job["file"])
+        else:
+            _, blob_path = self.blobs.put(job["data"], job["ext"], job["sha256"])
+
+        thumb_dir = os.path.join(self.thumbnail_dir, job["username"])
+        os.makedirs(thumb_dir, exist_ok=True)
+        with open(os.path.join(thumb_dir, f"{post_id}.jpg"), 'wb') as f:
+            f.write(job["thumb"])
+
+        # Drop the image bytes as soon as they are on disk
+        job["data"] = job["thumb"] = None
+
+        record = job["record"]
+        record["image_path"] = f"{job['url_prefix']}/{filename}"
+        record["thumb_path"] = f"/thumbnails/{job['username']}/{post_id}.jpg"
+        record["sha256"] = job["sha256"]
+        record["local_path"] = job["local_path"] = blob_path
+        return job
+
+    def _stage_enrich(self, job):
+        from ai_processor import extract_attributes
+
+        record = job["record"]
+        ai_data = extract_attributes(job["local_path"], record.get("caption", ""))
+        if "error" in ai_data:
+            log.warning("auto-enrich failed post_id=%s error=%s", job['post_id'], ai_data['error'])
+        else:
+            record["ai_data"] = ai_data
+            record["status"] = "enriched"
+        return job
+
 if __name__ == "__main__":
-    scraper = InstaScraper()
-    # print(scraper.scrape_profile("nasa", limit=2))
+    # The command line lives in cli.py
+    from cli import main
+    main()
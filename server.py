@@ -1,22 +1,91 @@
-from fastapi import FastAPI, HTTPException, Request, Body, UploadFile, File
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Request, Body, Query
+from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse, Response
 from pydantic import BaseModel
+from dotenv import load_dotenv
 import os
 import json
-from scraper import InstaScraper
+import logging
+import uuid
 import asyncio
 import time
-from ai_processor import extract_attributes, extract_attributes_async
-import requests
+from contextlib import asynccontextmanager
+
+# Before the project modules: some read their settings (UPLOAD_MAX_BYTES, ...) at import
+load_dotenv()
+
+from scraper import InstaScraper, apify_items
+from ai_processor import extract_attributes, extract_attributes_async, get_model
 from typing import List
+from pipeline import recent_stats
+from static_assets import StaticAssets, IMMUTABLE, REVALIDATE
+from jobs import JobStore
+from auto_enrich import AutoEnricher
+from batch import STEPS, BatchRunner
+from annotate import get_supabase_token, upload_posts
+from catalog import SOURCE_INSTAGRAM, SOURCE_UPLOAD
+from exporter import Export
+from reconcile import Reconciler
+from uploads import receive_files
+import metrics
+from metrics import CACHE_REQUESTS, HTTP_REQUEST_SECONDS
+
+# LOG_LEVEL=DEBUG shows per-item detail (never tokens or credentials)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s %(message)s")
+log = logging.getLogger("server")
 
-app = FastAPI()
 scraper = InstaScraper()
+jobs = JobStore()
+reconciler = Reconciler(scraper)
+
+# How often the change feed checks for a new revision, and the keepalive interval when idle
+CHANGE_POLL_SECONDS = 0.5
+CHANGE_KEEPALIVE_SECONDS = 15
+
+@asynccontextmanager
+async def lifespan(app):
+    # Heavy clients (Gemini SDK, Instaloader) are created on first use so the
+    # worker starts serving immediately. PRELOAD_CLIENTS=1 warms them up in
+    # the background instead, to keep that cost off the first request.
+    if os.getenv("PRELOAD_CLIENTS") == "1":
+        loop = asyncio.get_event_loop()
+        loop.run_in_executor(None, get_model)
+        loop.run_in_executor(None, lambda: scraper.L)
+    # AUTO_ENRICH=1 drains pending posts in the background (every worker
+    # process runs one; claims in the shared state file keep them apart)
+    if os.getenv("AUTO_ENRICH") == "1":
+        auto_enricher.start()
+    # Batch jobs interrupted by a restart (or a dead worker) are picked up again
+    batch_runner.watch()
+    yield
+    auto_enricher.stop()
+    batch_runner.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (/api/jobs/{job_id}), not the raw path
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                     route=route.path if route else "unmatched", status=status)
+catalog = scraper.catalog
+auto_enricher = AutoEnricher.from_env(scraper)
+batch_runner = BatchRunner.from_env(scraper, jobs)
+# DEV_RELOAD=1 re-reads edited frontend files without a restart
+assets = StaticAssets("static", reload=os.getenv("DEV_RELOAD") == "1")
 
 # Ensure directories exist
 os.makedirs("storage/instagram", exist_ok=True)
 os.makedirs("storage/uploads", exist_ok=True)
+os.makedirs("storage/thumbnails", exist_ok=True)
 
 class UploadMetadata(BaseModel):
     post_id: str
@@ -29,73 +98,245 @@ class UploadMetadata(BaseModel):
 class ScrapeRequest(BaseModel):
     username: str
     limit: int = 10
+    auto_enrich: bool = False
 
 class BulkPostRequest(BaseModel):
     post_ids: List[str]
 
+class BulkStatusRequest(BaseModel):
+    post_ids: List[str]
+    status: str
+
+class BatchJobRequest(BaseModel):
+    # Either explicit post ids or a query (status, accounts, source)
+    post_ids: List[str] = None
+    status: str = "pending"
+    username: List[str] = None
+    source: str = None
+    steps: List[str] = list(STEPS)
+
 class SigninRequest(BaseModel):
     emailOrUsername: str
     password: str
 
 @app.post("/api/scrape")
 async def scrape(req: ScrapeRequest):
-    result = scraper.scrape_profile(req.username, limit=req.limit)
+    # Instaloader blocks for the whole scrape; keep it off the event loop
+    loop = asyncio.get_event_loop()
+    result = await loop.run_in_executor(
+        None, lambda: scraper.scrape_profile(req.username, limit=req.limit, auto_enrich=req.auto_enrich))
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
 
 @app.post("/api/import-apify")
-async def import_apify(items = Body(...)):
-    # If it's a dict instead of a list (e.g. sometimes Apify sends wrapped data)
-    if isinstance(items, dict):
-        # Look for common keys where lists might be stored
-        if "items" in items: items = items["items"]
-        elif "data" in items: items = items["data"]
-        else: items = [items] # Treat single object as a list
-        
-    if not isinstance(items, list):
-        raise HTTPException(status_code=400, detail="Expected a list of items.")
-
-    async def progress_generator():
-        queue = asyncio.Queue()
-
-        def progress_cb(current, total, post_id):
-            # Put progress data into the queue
-            queue.put_nowait(json.dumps({
-                "type": "progress",
-                "current": current,
-                "total": total,
-                "post_id": post_id
-            }))
-
-        # Run the processing in a separate thread to not block the event loop
-        loop = asyncio.get_event_loop()
-        
-        # This will run the blocking scraper code
-        future = loop.run_in_executor(None, scraper.process_apify_json, items, progress_cb)
-        
-        while not future.done() or not queue.empty():
-            try:
-                # Wait for progress updates with a timeout
-                data = await asyncio.wait_for(queue.get(), timeout=0.1)
-                yield f"data: {data}\n\n"
-            except asyncio.TimeoutError:
-                if future.done() and queue.empty():
-                    break
-                continue
-
-        # Final result
-        result = future.result()
-        yield f"data: {json.dumps({'type': 'complete', 'scraped_count': result['scraped_count']})}\n\n"
-
-    return StreamingResponse(progress_generator(), media_type="text/event-stream")
+async def import_apify(items = Body(...), auto_enrich: bool = False):
+    try:
+        items = apify_items(items)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job = jobs.create("import-apify", total=len(items), current=0, post_id=None)
+    last_write = [0.0]
+
+    def progress_cb(current, total, post_id):
+        # Progress lives in the shared job store (throttled), so any worker can report it
+        now = time.time()
+        if now - last_write[0] >= 0.25 or current == total:
+            last_write[0] = now
+            jobs.update(job["id"], current=current, total=total, post_id=post_id)
+
+    def run():
+        try:
+            result = scraper.process_apify_json(items, progress_cb, auto_enrich)
+            jobs.update(job["id"], status="completed", scraped_count=result["scraped_count"])
+        except Exception as e:
+            jobs.update(job["id"], status="failed", error=str(e))
+
+    # Run the processing in a separate thread to not block the event loop.
+    # It keeps going if the client disconnects; progress can be re-read from /api/jobs/{id}.
+    asyncio.get_event_loop().run_in_executor(None, run)
+
+    return StreamingResponse(_job_events(job["id"]), media_type="text/event-stream")
+
+# Job fields reported in progress events (batch jobs add their per-step counts)
+PROGRESS_FIELDS = ("status", "current", "total", "post_id", "enriched", "annotated", "skipped", "failed")
+
+async def _job_events(job_id):
+    yield f"data: {json.dumps({'type': 'job', 'job_id': job_id})}\n\n"
+    last = None
+    while True:
+        job = jobs.get(job_id)
+        if job is None:
+            yield f"data: {json.dumps({'type': 'error', 'message': 'Job not found'})}\n\n"
+            return
+        progress = {key: job[key] for key in PROGRESS_FIELDS if key in job}
+        if progress != last and (job.get("current") or job["status"] != "running"):
+            last = progress
+            yield f"data: {json.dumps({'type': 'progress', **progress})}\n\n"
+        if job["status"] == "completed":
+            yield f"data: {json.dumps({'type': 'complete', **progress, 'scraped_count': job.get('scraped_count', 0)})}\n\n"
+            return
+        if job["status"] == "failed":
+            yield f"data: {json.dumps({'type': 'error', 'message': job.get('error')})}\n\n"
+            return
+        if job["status"] == "cancelled":
+            yield f"data: {json.dumps({'type': 'cancelled', **progress})}\n\n"
+            return
+        await asyncio.sleep(0.25)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    return StreamingResponse(_job_events(job_id), media_type="text/event-stream")
+
+@app.post("/api/batch-jobs")
+async def create_batch_job(req: BatchJobRequest, request: Request):
+    # Enriches and/or annotates any number of posts on the server; follow it at /api/jobs/{id}/events
+    post_ids = req.post_ids if req.post_ids is not None else batch_runner.select(req.status, req.username, req.source)
+    try:
+        return batch_runner.create(post_ids, req.steps, token=_request_token(request))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/batch-jobs")
+async def list_batch_jobs():
+    return jobs.list("batch")
+
+@app.post("/api/batch-jobs/{job_id}/{action}")
+async def control_batch_job(job_id: str, action: str, request: Request):
+    if action not in ("pause", "resume", "cancel"):
+        raise HTTPException(status_code=404, detail="Unknown action")
+    try:
+        if action == "resume":
+            return batch_runner.resume(job_id, token=_request_token(request))
+        return getattr(batch_runner, action)(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/api/reconcile")
+async def start_reconcile(repair: bool = False, drop_dangling: bool = False, full: bool = False,
+                          delete_unreferenced: bool = False):
+    # Storage check as a job; the report ends up on the job record and at GET /api/reconcile
+    job = jobs.create("reconcile", total=0, current=0, post_id=None, repair=repair)
+    last_write = [0.0]
+
+    def progress_cb(step, current, total):
+        now = time.time()
+        if now - last_write[0] >= 0.25 or current == total:
+            last_write[0] = now
+            jobs.update(job["id"], current=current, total=total)
+
+    def run():
+        try:
+            report = reconciler.run(repair=repair, drop_dangling=drop_dangling, full=full,
+                                    delete_unreferenced=delete_unreferenced, progress=progress_cb)
+            jobs.update(job["id"], status="completed", report=report)
+        except Exception as e:
+            log.exception("reconcile failed job_id=%s", job["id"])
+            jobs.update(job["id"], status="failed", error=str(e))
+
+    asyncio.get_event_loop().run_in_executor(None, run)
+    return job
+
+@app.get("/api/reconcile")
+async def last_reconcile():
+    report = reconciler.last_report()
+    if report is None:
+        raise HTTPException(status_code=404, detail="No reconcile run yet")
+    return report
+
+@app.get("/api/pipeline/stats")
+async def pipeline_stats():
+    return recent_stats()
+
+@app.get("/api/auto-enrich")
+async def auto_enrich_status():
+    status = auto_enricher.status()
+    status["enabled"] = os.getenv("AUTO_ENRICH") == "1"
+    return status
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/history")
 async def get_history():
-    if os.path.exists("storage/metadata.json"):
-        with open("storage/metadata.json", "r") as f:
-            return json.load(f)
-    return []
+    return Response(catalog.posts_json(SOURCE_INSTAGRAM), media_type="application/json")
+
+@app.get("/api/stats")
+async def get_stats():
+    # Counts per status, source and account, kept up to date by every catalog write
+    return catalog.stats()
+
+@app.get("/api/posts")
+async def get_posts(status: str = "pending", source: str = None,
+                    offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    # One page of a dashboard column, from the catalog's status index
+    posts, total = catalog.page(status, source, offset, limit)
+    return {"posts": [p.to_dict() for p in posts], "total": total, "offset": offset, "limit": limit}
+
+@app.get("/api/posts/ids")
+async def get_post_ids(status: str = "pending", source: str = None):
+    return catalog.ids(status, source)
+
+@app.get("/api/changes")
+async def get_changes(since: int = None):
+    # Without `since` only the current revision, to start following the feed from
+    if since is None:
+        return {"revision": catalog.revision(), "changes": []}
+    return catalog.changes(since)
+
+async def _change_events(request, since):
+    idle = 0.0
+    while not await request.is_disconnected():
+        if catalog.revision() != since:
+            delta = catalog.changes(since)
+            since = delta["revision"]
+            # The id lets EventSource resume from here (Last-Event-ID) after a reconnect
+            yield f"id: {since}\ndata: {json.dumps(delta)}\n\n"
+            idle = 0.0
+        elif idle >= CHANGE_KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            idle = 0.0
+        await asyncio.sleep(CHANGE_POLL_SECONDS)
+        idle += CHANGE_POLL_SECONDS
+
+@app.get("/api/changes/events")
+async def change_events(request: Request, since: int = None):
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    elif since is None:
+        since = catalog.revision()
+    return StreamingResponse(_change_events(request, since), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/export")
+async def export_posts(format: str = "ndjson", images: bool = False,
+                       status: List[str] = Query(None), username: List[str] = Query(None),
+                       source: str = None, date_from: str = Query(None, alias="from"),
+                       date_to: str = Query(None, alias="to"), since: str = None):
+    # Streams NDJSON/Parquet (or a tar with the images); X-Export-Watermark is the `since` for the next run
+    try:
+        export = Export(catalog, format, images=images, status=status, usernames=username, source=source,
+                        date_from=date_from, date_to=date_to, since=since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {
+        "Content-Disposition": f'attachment; filename="{export.filename}"',
+        "X-Export-Watermark": repr(export.watermark),
+        "X-Export-Count": str(len(export.posts)),
+    }
+    return StreamingResponse(iter(export), media_type=export.media_type, headers=headers)
 
 @app.delete("/api/folder/{username}")
 async def delete_folder(username: str):
@@ -106,46 +347,40 @@ async def delete_folder(username: str):
 
 @app.delete("/api/meme/{post_id}")
 async def delete_meme(post_id: str):
-    # 1. Try to find in scraped history
-    scraped_path = "storage/metadata.json"
-    if os.path.exists(scraped_path):
-        with open(scraped_path, "r") as f:
-            scraped_history = json.load(f)
-        
-        post_index = next((i for i, p in enumerate(scraped_history) if p['post_id'] == post_id), None)
-        if post_index is not None:
-            post = scraped_history.pop(post_index)
-            # Delete image file
-            img_path = post['image_path'].replace("/images/", "storage/instagram/")
-            if os.path.exists(img_path):
-                os.remove(img_path)
-            
-            with open(scraped_path, "w") as f:
-                json.dump(scraped_history, f, indent=2)
-            return {"message": "Meme deleted from archive"}
-
-    # 2. Try to find in manual uploads
-    manual_path = "storage/uploads_metadata.json"
-    if os.path.exists(manual_path):
-        with open(manual_path, "r") as f:
-            manual_history = json.load(f)
-        
-        post_index = next((i for i, p in enumerate(manual_history) if p['post_id'] == post_id), None)
-        if post_index is not None:
-            post = manual_history.pop(post_index)
-            # Delete image file
-            img_path = post['image_path'].replace("/upload-images/", "storage/uploads/")
-            if os.path.exists(img_path):
-                os.remove(img_path)
-            
-            with open(manual_path, "w") as f:
-                json.dump(manual_history, f, indent=2)
-            return {"message": "Meme deleted from uploads"}
+    # Removes the post and releases its image blob (or deletes the legacy file)
+    deleted = scraper.delete_posts([post_id])
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Meme not found")
+    if deleted[0].get('source') == SOURCE_UPLOAD:
+        return {"message": "Meme deleted from uploads"}
+    return {"message": "Meme deleted from archive"}
+
+@app.post("/api/memes/bulk-delete")
+async def bulk_delete_memes(req: BulkPostRequest):
+    loop = asyncio.get_event_loop()
+    deleted = await loop.run_in_executor(None, scraper.delete_posts, req.post_ids)
+    deleted_ids = {p['post_id'] for p in deleted}
+    return {
+        "deleted": len(deleted_ids),
+        "not_found": [pid for pid in req.post_ids if pid not in deleted_ids]
+    }
 
-    raise HTTPException(status_code=404, detail="Meme not found")
+@app.post("/api/memes/bulk-status")
+async def bulk_set_status(req: BulkStatusRequest):
+    # Only the manual workflow moves are allowed: reset to pending, or mark completed
+    if req.status not in ("pending", "completed"):
+        raise HTTPException(status_code=400, detail="Status must be 'pending' or 'completed'")
+    loop = asyncio.get_event_loop()
+    updated = await loop.run_in_executor(None, scraper.set_status, req.post_ids, req.status)
+    updated_ids = {p['post_id'] for p in updated}
+    return {
+        "updated": len(updated_ids),
+        "not_found": [pid for pid in req.post_ids if pid not in updated_ids]
+    }
 
 @app.post("/api/auth/signin")
 async def signin(req: SigninRequest):
+    import requests
     url = os.getenv("SUPABASE_SIGNIN_URL")
     anon_key = os.getenv("SUPABASE_ANON_KEY")
     
@@ -159,9 +394,7 @@ async def signin(req: SigninRequest):
             "emailOrUsername": req.emailOrUsername,
             "password": req.password
         }
-        print(f"DEBUG: Proxied Supabase Sign-in - URL: {url}")
-        print(f"DEBUG: Proxied Supabase Sign-in - Headers: {headers}")
-        print(f"DEBUG: Proxied Supabase Sign-in - Body: {payload}")
+        log.debug("proxying supabase sign-in url=%s", url)
         response = requests.post(url, json=payload, headers=headers)
         if response.status_code == 200:
             return response.json() # Returns {access_token, user, etc}
@@ -172,23 +405,19 @@ async def signin(req: SigninRequest):
 
 @app.post("/api/enrich")
 async def enrich_memes(req: BulkPostRequest):
-    print(f"Enriching memes in parallel: {req.post_ids}")
-    history = []
-    if os.path.exists("storage/metadata.json"):
-        with open("storage/metadata.json", "r") as f:
-            history = json.load(f)
+    log.info("enrich started posts=%d", len(req.post_ids))
+    updates = {}
     
     semaphore = asyncio.Semaphore(20) # Process 20 at a time
     
     async def enrich_single(post_id):
         async with semaphore:
             start = time.time()
-            print(f"[{post_id}] Started at {start}")
-            post = next((h for h in history if h['post_id'] == post_id), None)
+            post = catalog.get(post_id)
             if not post:
                 return {"post_id": post_id, "status": "error", "message": "Post not found"}
                 
-            img_path = post['image_path'].replace("/images/", "storage/instagram/")
+            img_path = catalog.local_path(post)
             if not os.path.exists(img_path):
                  return {"post_id": post_id, "status": "error", "message": "Image file not found"}
                  
@@ -198,360 +427,269 @@ async def enrich_memes(req: BulkPostRequest):
                 if "error" in ai_data:
                     return {"post_id": post_id, "status": "error", "message": ai_data["error"]}
                     
-                post['ai_data'] = ai_data
-                post['status'] = 'enriched'
-                print(f"[{post_id}] Finished in {time.time() - start:.2f}s")
+                updates[post_id] = {"ai_data": ai_data, "status": "enriched"}
+                log.debug("enrich finished post_id=%s seconds=%.2f", post_id, time.time() - start)
                 return {"post_id": post_id, "status": "success"}
             except Exception as e:
-                print(f"[{post_id}] Failed in {time.time() - start:.2f}s: {e}")
+                log.warning("enrich failed post_id=%s seconds=%.2f error=%s", post_id, time.time() - start, e)
                 return {"post_id": post_id, "status": "error", "message": str(e)}
 
     # Run all tasks in parallel
     results = await asyncio.gather(*(enrich_single(pid) for pid in req.post_ids))
     
-    # Save history if any were successful
-    if any(r['status'] == 'success' for r in results):
-        with open("storage/metadata.json", "w") as f:
-            json.dump(history, f, indent=2)
+    # Merge the results into the current store (other workers may have written meanwhile)
+    if updates:
+        scraper.update_posts(updates)
             
     return results
 
-def get_supabase_token():
-    url = os.getenv("SUPABASE_SIGNIN_URL")
-    user = os.getenv("SUPABASE_USER")
-    password = os.getenv("SUPABASE_PASSWORD")
-    anon_key = os.getenv("SUPABASE_ANON_KEY")
-    
-    if not user or not password or user == "YOUR_EMAIL_OR_USERNAME":
-        print("Warning: Supabase credentials not set in .env")
-        return None
-
-    try:
-        payload = {
-            "emailOrUsername": user,
-            "password": password
-        }
-        headers = {
-            "apikey": anon_key,
-            "Authorization": f"Bearer {anon_key}",
-            "Content-Type": "application/json"
-        }
-        print(f"DEBUG: Supabase Auth Request (System) - URL: {url}")
-        print(f"DEBUG: Supabase Auth Request (System) - Headers: {headers}")
-        print(f"DEBUG: Supabase Auth Request (System) - Body: {payload}")
-        response = requests.post(url, json=payload, headers=headers)
-        if response.status_code == 200:
-            return response.json().get("access_token")
-        else:
-            print(f"Supabase login failed: {response.status_code} - {response.text}")
-            return None
-    except Exception as e:
-        print(f"Error getting Supabase token: {e}")
-        return None
+def _request_token(request):
+    # 1. Check Authorization header (Bearer)
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        log.debug("annotate token source=authorization")
+        return auth_header.split(" ")[1]
 
-def is_unknown(text):
-    if not text:
-        return True
-    text_lower = str(text).lower()
-    forbidden = ["unknown", "uncredited", "n/a", "not available", "character unknown"]
-    return any(f in text_lower for f in forbidden)
+    # 2. Check X-Supabase-Auth header (Backward compatibility)
+    token = request.headers.get("X-Supabase-Auth")
+    if token:
+        log.debug("annotate token source=x-supabase-auth")
+    return token
 
 @app.post("/api/annotate")
 async def annotate_bulk(req: BulkPostRequest, request: Request):
-    print(f"Annotating memes: {req.post_ids}")
-    # Load both scraped and manual metadata
-    scraped_history = []
-    if os.path.exists("storage/metadata.json"):
-        with open("storage/metadata.json", "r") as f:
-            scraped_history = json.load(f)
-            
-    manual_history = []
-    if os.path.exists("storage/uploads_metadata.json"):
-        with open("storage/uploads_metadata.json", "r") as f:
-            manual_history = json.load(f)
-            
-    all_history = scraped_history + manual_history
-    posts_to_upload = [h for h in all_history if h['post_id'] in req.post_ids and h.get('status') == 'enriched']
+    log.info("annotate started posts=%d", len(req.post_ids))
+    posts_to_upload = [p for p in catalog.get_many(req.post_ids) if p.get('status') == 'enriched']
     
     if not posts_to_upload:
         raise HTTPException(status_code=400, detail="No enriched posts found to upload.")
     
-    # Token Extraction Logic
-    token = None
-    
-    # 1. Check Authorization header (Bearer)
-    auth_header = request.headers.get("Authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ")[1]
-        print("DEBUG: Token extracted from Authorization header")
-    
-    # 3. Check X-Supabase-Auth header (Backward compatibility)
-    if not token:
-        token = request.headers.get("X-Supabase-Auth")
-        if token:
-            print("DEBUG: Token extracted from X-Supabase-Auth header")
-            
-    # 4. Fallback to system token
+    token = _request_token(request)
+
+    # Fallback to system token
     if not token:
-        print("DEBUG: No user token found in headers, falling back to system token")
+        log.debug("annotate token source=system")
         token = get_supabase_token()
         
     if not token:
         raise HTTPException(status_code=401, detail="Authentication required. Please sign in.")
 
-    anon_key = os.getenv("SUPABASE_ANON_KEY")
-    
-    # Format data for the weird form-data structure
-    form_data = {}
-    files = {}
-    file_handles = []
-
     try:
-        import mimetypes
-        import io
-        from PIL import Image
-        
-        for i, post in enumerate(posts_to_upload):
-            data = post.get('ai_data', {})
-            # Filter actors
-            valid_actors = [a for a in data.get("actors", []) if not is_unknown(a.get("name"))]
-            
-            # Skip item if no valid actors or title is unknown
-            if not valid_actors or is_unknown(data.get("title")):
-                print(f"DEBUG: Skipping item {i} ({post['post_id']}) - Unknown actors or title")
-                continue
-
-            # Standard flat notation required by the API
-            form_data[f"items[{i}]title"] = data.get("title", "")
-            form_data[f"items[{i}]releaseYear"] = str(data.get("releaseYear", ""))
-            form_data[f"items[{i}]genre"] = data.get("genre", "")
-            form_data[f"items[{i}]director"] = data.get("director", "")
-            form_data[f"items[{i}]emotionLabel"] = data.get("emotionLabel", "")
-            form_data[f"items[{i}]emotionDescription"] = data.get("emotionDescription", "")
-            form_data[f"items[{i}]memeReleaseYear"] = str(data.get("memeReleaseYear", ""))
-            form_data[f"items[{i}]imageSize"] = "1024,1024"
-            form_data[f"items[{i}]status"] = "approved"
-            
-            # File Upload with Format Compatibility Fix
-            img_path = post['image_path']
-            if img_path.startswith("/images/"):
-                img_path = img_path.replace("/images/", "storage/instagram/")
-            else:
-                img_path = img_path.replace("/upload-images/", "storage/uploads/")
-
-            if os.path.exists(img_path):
-                try:
-                    with Image.open(img_path) as img:
-                        # Determine actual format
-                        actual_format = img.format.lower() if img.format else "unknown"
-                        
-                        # Allowed by API: jpeg, png, gif
-                        allowed_formats = ['jpeg', 'jpg', 'png', 'gif']
-                        
-                        # We also force conversion if it's named .webp even if internal data is jpeg
-                        # because some APIs reject .webp extensions regardless of content
-                        if actual_format in allowed_formats and not img_path.lower().endswith('.webp'):
-                            # File is fine as is
-                            f_handle = open(img_path, 'rb')
-                            file_handles.append(f_handle)
-                            mime = f"image/{actual_format if actual_format != 'jpg' else 'jpeg'}"
-                            files[f"items[{i}]media"] = (os.path.basename(img_path), f_handle, mime)
-                            print(f"DEBUG: Item {i} - Sending original {actual_format} file", flush=True)
-                        else:
-                            # Convert to JPEG for better compatibility
-                            img = img.convert("RGB")
-                            buffer = io.BytesIO()
-                            img.save(buffer, format="JPEG", quality=90)
-                            buffer.seek(0)
-                            
-                            new_filename = os.path.splitext(os.path.basename(img_path))[0] + ".jpg"
-                            files[f"items[{i}]media"] = (new_filename, buffer, "image/jpeg")
-                            print(f"DEBUG: Item {i} - Converted {actual_format} (or WebP) to JPEG", flush=True)
-                            
-                except Exception as img_err:
-                    print(f"DEBUG: Error processing image {img_path}: {img_err}", flush=True)
-            else:
-                print(f"DEBUG: Item {i} - File NOT FOUND: {img_path}", flush=True)
-            
-            # Actors (using filtered valid_actors)
-            for j, actor in enumerate(valid_actors):
-                form_data[f"items[{i}]actors[{j}]name"] = actor.get("name", "")
-                form_data[f"items[{i}]actors[{j}]dob"] = actor.get("dob", "")
-                form_data[f"items[{i}]actors[{j}]filmography"] = " • ".join(actor.get("filmography", [])) if isinstance(actor.get("filmography"), list) else actor.get("filmography", "")
-                
-            # Dialogs (filter unknown actors)
-            valid_dialogs = [d for d in data.get("dialogs", []) if not is_unknown(d.get("actor"))]
-            for j, dialog in enumerate(valid_dialogs):
-                form_data[f"items[{i}]dialogs[{j}]text"] = dialog.get("text", "")
-                form_data[f"items[{i}]dialogs[{j}]actor"] = dialog.get("actor", "")
-                
-            # Tags
-            for j, tag in enumerate(data.get("tags", [])):
-                form_data[f"items[{i}]tags[{j}]name"] = tag.get("name", "")
-                form_data[f"items[{i}]tags[{j}]category"] = tag.get("category", "")
-
-        # Send to external API
-        url = os.getenv("ANNOTATE_API_URL")
-        headers = {
-            "Authorization": f"Bearer {token}"
-        }
-        
-        print(f"DEBUG: Annotate Request - URL: {url}", flush=True)
-        print(f"DEBUG: Annotate Request - Headers (Actual): {headers}", flush=True)
-        print(f"DEBUG: Annotate Request - Form Data Keys: {list(form_data.keys())}", flush=True)
-        print(f"DEBUG: Annotate Request - Files Keys: {list(files.keys())}", flush=True)
-        
-        response = requests.post(url, data=form_data, files=files, headers=headers)
-        print(f"DEBUG: Annotate Response - Status: {response.status_code}", flush=True)
-        print(f"DEBUG: Annotate Response - Body: {response.text}", flush=True)
-        
-        if response.status_code in [200, 201]:
-            # Try to parse response for granular success tracking
-            success_indices = set()
-            try:
-                resp_data = response.json()
-                if resp_data.get("status") == "Success" and "data" in resp_data:
-                    results = resp_data["data"].get("results", [])
-                    success_indices = {item["index"] for item in results if "index" in item}
-            except Exception as e:
-                print(f"Warning: Could not parse granular success from API: {e}")
-                # Fallback: if we can't parse but status is 200, assume all OK unless told otherwise
-                # But safer to assume none if we're expecting partials
-                success_indices = set(range(len(posts_to_upload)))
-
-            # Mark as completed in both histories (only if successful)
-            updated_scraped = False
-            updated_manual = False
-            
-            for i, post in enumerate(posts_to_upload):
-                if i in success_indices:
-                    post['status'] = 'completed'
-                    if post['post_id'].startswith("up_"):
-                        updated_manual = True
-                    else:
-                        updated_scraped = True
-            
-            if updated_scraped:
-                if os.path.exists("storage/metadata.json"):
-                    with open("storage/metadata.json", "w") as f:
-                        json.dump(scraped_history, f, indent=2)
-            
-            if updated_manual:
-                if os.path.exists("storage/uploads_metadata.json"):
-                    with open("storage/uploads_metadata.json", "w") as f:
-                        json.dump(manual_history, f, indent=2)
-                
-            return {"status": "success", "message": "Bulk upload processed", "api_response": response.text}
-        else:
-            return {"status": "error", "message": f"API returned {response.status_code}", "detail": response.text}
-            
+        result, completed = upload_posts(posts_to_upload, token, catalog.local_path)
     except Exception as e:
-        print(f"Error in annotate_bulk: {e}")
+        log.exception("annotate failed")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Crucial: close all file handles
-        for fh in file_handles:
-            fh.close()
 
-# File Upload for Manual Images
+    # Mark as completed (only the posts the API accepted)
+    if completed:
+        scraper.update_posts({post_id: {"status": "completed"} for post_id in completed})
+    return result
+
+async def _ingest_uploads(files, auto_enrich):
+    """Decodes, deduplicates and stores received files as upload posts.
+    Returns (new posts, [{"filename", "reason"}] of the files not stored)."""
+    rejected = [{"filename": f.filename, "reason": f.error} for f in files if f.error]
+    pending = []
+    for f in files:
+        if f.error:
+            continue
+        post_id = f"up_{uuid.uuid4().hex}"
+        pending.append((f, {
+            "post_id": post_id,
+            "username": "Manual Upload",
+            "file": f.path,
+            "sha256": f.sha256,
+            "url_prefix": "/upload-images",
+            "record": {
+                "post_id": post_id,
+                "username": "Manual Upload",
+                "status": "pending",
+                "caption": "",
+                "ai_data": {},
+                "timestamp": time.time()
+            },
+        }))
+
+    loop = asyncio.get_event_loop()
+    try:
+        records = await loop.run_in_executor(None, lambda: scraper.ingest(
+            [job for _, job in pending], known=catalog.posts(SOURCE_UPLOAD), auto_enrich=auto_enrich,
+            name="upload", drop_duplicates=True))
+    finally:
+        # Stored files were moved into the blob store; drop the rest
+        for f, _ in pending:
+            f.discard()
+
+    stored = {r['post_id'] for r in records}
+    for f, job in pending:
+        if job["post_id"] not in stored:
+            # Decode errors name the temp file; report them plainly
+            reason = job.get("error") or "invalid image"
+            rejected.append({"filename": f.filename,
+                             "reason": "could not decode image" if reason.startswith("validate:") else reason})
+    uploaded = catalog.add(records, SOURCE_UPLOAD) if records else []
+    return uploaded, rejected
+
+# File Upload for Manual Images: the first file part of the request is
+# streamed to disk and checked by its magic bytes, like /api/uploads
 @app.post("/api/upload")
-async def upload_image(file: UploadFile = File(...)):
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    
-    post_id = f"up_{int(time.time() * 1000)}"
-    file_extension = os.path.splitext(file.filename)[1]
-    if not file_extension:
-        file_extension = ".jpg"
-        
-    filename = f"{post_id}{file_extension}"
-    save_path = os.path.join("storage/uploads", filename)
-    
-    with open(save_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
-        
-    # Update manual metadata
-    uploads = []
-    metadata_path = "storage/uploads_metadata.json"
-    if os.path.exists(metadata_path):
-        with open(metadata_path, "r") as f:
-            uploads = json.load(f)
-            
-    new_upload = {
-        "post_id": post_id,
-        "username": "Manual Upload",
-        "image_path": f"/upload-images/{filename}",
-        "status": "pending",
-        "caption": "",
-        "ai_data": {},
-        "timestamp": time.time()
-    }
-    uploads.append(new_upload)
-    
-    with open(metadata_path, "w") as f:
-        json.dump(uploads, f, indent=2)
-        
-    return new_upload
+async def upload_image(request: Request, auto_enrich: bool = False):
+    try:
+        files = await receive_files(request, os.path.join("storage", "tmp"), max_files=1)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not files:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+
+    uploaded, rejected = await _ingest_uploads(files[:1], auto_enrich)
+    for f in files[1:]:
+        f.discard()
+    if not uploaded:
+        raise HTTPException(status_code=400, detail=rejected[0]["reason"] if rejected else "Image is invalid")
+    return uploaded[0]
+
+# Multi-file upload: each part is streamed to disk (size-limited, checked by
+# magic bytes and hashed while it arrives), then decoded, deduplicated and
+# moved into the blob store; all new posts are stored in one catalog write.
+@app.post("/api/uploads")
+async def upload_images(request: Request, auto_enrich: bool = False):
+    try:
+        files = await receive_files(request, os.path.join("storage", "tmp"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    uploaded, rejected = await _ingest_uploads(files, auto_enrich)
+    log.info("upload finished files=%d stored=%d rejected=%d", len(files), len(uploaded), len(rejected))
+    return {"uploaded": uploaded, "rejected": rejected}
 
 @app.get("/api/uploads/history")
 async def get_uploads_history():
-    metadata_path = "storage/uploads_metadata.json"
-    if os.path.exists(metadata_path):
-        with open(metadata_path, "r") as f:
-            return json.load(f)
-    return []
+    return Response(catalog.posts_json(SOURCE_UPLOAD), media_type="application/json")
 
 @app.post("/api/uploads/enrich")
 async def enrich_uploads(req: BulkPostRequest):
-    metadata_path = "storage/uploads_metadata.json"
-    uploads = []
-    if os.path.exists(metadata_path):
-        with open(metadata_path, "r") as f:
-            uploads = json.load(f)
+    updates = {}
             
     semaphore = asyncio.Semaphore(10)
     
     async def enrich_single_upload(post_id):
         async with semaphore:
-            upload = next((u for u in uploads if u['post_id'] == post_id), None)
-            if not upload:
+            upload = catalog.get(post_id)
+            if not upload or upload.get('source') != SOURCE_UPLOAD:
                 return {"post_id": post_id, "status": "error", "message": "Upload not found"}
             
-            img_path = upload['image_path'].replace("/upload-images/", "storage/uploads/")
+            img_path = catalog.local_path(upload)
             try:
                 ai_data = await extract_attributes_async(img_path, upload.get('caption', ''))
                 if "error" in ai_data:
                     return {"post_id": post_id, "status": "error", "message": ai_data["error"]}
                 
-                upload['ai_data'] = ai_data
-                upload['status'] = 'enriched'
+                updates[post_id] = {"ai_data": ai_data, "status": "enriched"}
                 return {"post_id": post_id, "status": "success"}
             except Exception as e:
                 return {"post_id": post_id, "status": "error", "message": str(e)}
 
     results = await asyncio.gather(*(enrich_single_upload(pid) for pid in req.post_ids))
     
-    if any(r['status'] == 'success' for r in results):
-        with open(metadata_path, "w") as f:
-            json.dump(uploads, f, indent=2)
+    if updates:
+        scraper.update_posts(updates)
             
     return results
 
-# Serve uploaded images
-app.mount("/upload-images", StaticFiles(directory="storage/uploads"), name="upload_images")
-
-# Serve images from storage/instagram
-app.mount("/images", StaticFiles(directory="storage/instagram"), name="images")
 
-# Serve frontend
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Image and asset URLs carry a content hash (`?v=`), so matching requests are
+# cached forever; anything else is revalidated against its ETag.
+# app.js versions image URLs with this many hex digits of the image's sha256
+IMAGE_VERSION_LENGTH = 16
+
+def _etag_matches(request, etag):
+    if_none_match = request.headers.get("if-none-match")
+    return bool(if_none_match) and etag in [t.strip() for t in if_none_match.split(",")]
+
+def _file_response(request, local_path, digest=None):
+    if not os.path.isfile(local_path):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    version = request.query_params.get("v")
+    cache_control = IMMUTABLE if digest and version == digest[:IMAGE_VERSION_LENGTH] else REVALIDATE
+    if digest:
+        etag = f'"{digest[:32]}"'
+    else:
+        stat = os.stat(local_path)
+        etag = f'"{int(stat.st_mtime)}-{stat.st_size}"'
+
+    if _etag_matches(request, etag):
+        CACHE_REQUESTS.inc(cache="http_etag", result="hit")
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    CACHE_REQUESTS.inc(cache="http_etag", result="miss")
+    # FileResponse handles Range requests for partial image loads
+    return FileResponse(local_path, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def _safe_path(path):
+    if ".." in path.split("/"):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return path
+
+# Serve thumbnails generated by the ingest pipeline, versioned by their post's image sha256
+def _thumbnail_digest(path):
+    post_id = os.path.splitext(os.path.basename(path))[0]
+    post = catalog.get(post_id)
+    if post is None:
+        return None
+    thumb_path = post.get("thumb_path") or f"/thumbnails/{post['username']}/{post_id}.jpg"
+    return post.get("sha256") if thumb_path == f"/thumbnails/{path}" else None
+
+@app.get("/thumbnails/{path:path}")
+async def serve_thumbnail(path: str, request: Request):
+    path = _safe_path(path)
+    return _file_response(request, os.path.join("storage/thumbnails", path), _thumbnail_digest(path))
+
+# Serve scraped and uploaded images. Their URLs are stable while the bytes live
+# in the content-addressed blob store (or the legacy flat folders until migrated).
+@app.get("/images/{path:path}")
+async def serve_image(path: str, request: Request):
+    local_path, digest = catalog.resolve(f"/images/{_safe_path(path)}")
+    return _file_response(request, local_path, digest)
+
+@app.get("/upload-images/{path:path}")
+async def serve_upload_image(path: str, request: Request):
+    local_path, digest = catalog.resolve(f"/upload-images/{_safe_path(path)}")
+    return _file_response(request, local_path, digest)
+
+# Serve frontend from memory, precompressed
+def _asset_response(request, asset, cache_control):
+    headers = {"ETag": asset.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if _etag_matches(request, asset.etag):
+        CACHE_REQUESTS.inc(cache="http_etag", result="hit")
+        return Response(status_code=304, headers=headers)
+    CACHE_REQUESTS.inc(cache="http_etag", result="miss")
+    body, encoding = asset.encoded(request.headers.get("accept-encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=asset.media_type, headers=headers)
+
+@app.get("/static/{path:path}")
+async def serve_static(path: str, request: Request):
+    asset = assets.get(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    version = request.query_params.get("v")
+    cache_control = IMMUTABLE if version == asset.version else REVALIDATE
+    return _asset_response(request, asset, cache_control)
 
 @app.get("/", response_class=HTMLResponse)
-async def read_index():
-    with open("static/index.html", "r") as f:
-        return f.read()
+async def read_index(request: Request):
+    index = assets.index()
+    if index is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    # index.html itself is always revalidated so new asset hashes are picked up
+    return _asset_response(request, index, REVALIDATE)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # State lives in locked files, so several worker processes can share it
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        uvicorn.run("server:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -42,7 +42,11 @@ document.addEventListener('DOMContentLoaded', () => {
     const selectedCountDisplay = document.getElementById('selected-count');
     const enrichBtn = document.getElementById('enrich-btn'); // Restored
     const annotateBtn = document.getElementById('annotate-btn'); // Restored
+    const enrichAnnotateBtn = document.getElementById('enrich-annotate-btn');
     const clearSelectionBtn = document.getElementById('clear-selection');
+    const resetBtn = document.getElementById('reset-btn');
+    const completeBtn = document.getElementById('complete-btn');
+    const bulkDeleteBtn = document.getElementById('bulk-delete-btn');
 
     // AI Progress elements
     const aiProgressContainer = document.getElementById('ai-progress-container');
@@ -50,6 +54,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const aiProgressPercent = document.getElementById('ai-progress-percent');
     const aiProgressFill = document.getElementById('ai-progress-fill');
     const aiCurrentWorkingOn = document.getElementById('ai-current-working-on');
+    const aiPauseBtn = document.getElementById('ai-pause-btn');
+    const aiCancelBtn = document.getElementById('ai-cancel-btn');
 
     // Auth Elements
     const authOverlay = document.getElementById('auth-overlay');
@@ -84,7 +90,23 @@ document.addEventListener('DOMContentLoaded', () => {
     let dragTargetState = true; // true = selecting, false = deselecting
     let currentUser = null;
     let manualPosts = []; // Metadata for manual uploads
+    let dashboardPosts = new Map(); // post_id -> post, for the loaded dashboard pages
+    let postStatus = new Map(); // post_id -> status of dashboard posts seen so far (pages and Select All)
+    let manualLoaded = false;
+    let revision = null; // Catalog revision the views are up to date with (see startChangeFeed)
+    let batchJobId = null; // Batch job shown in the AI progress bar
+    let batchJobFeed = null;
+    const WORKFLOW_STATUSES = ['pending', 'enriched', 'completed'];
+    const COLUMN_PAGE_SIZE = 60;
+
+    // Content-hashed image URLs are cached by the browser without revalidation
+    function imageUrl(p) {
+        return p.sha256 ? `${p.image_path}?v=${p.sha256.slice(0, 16)}` : p.image_path;
+    }
 
+    function thumbUrl(p) {
+        return p.thumb_path && p.sha256 ? `${p.thumb_path}?v=${p.sha256.slice(0, 16)}` : imageUrl(p);
+    }
 
     // Tab Switching
     tabBtns.forEach(btn => {
@@ -97,14 +119,16 @@ document.addEventListener('DOMContentLoaded', () => {
             btn.classList.add('active');
             document.getElementById(tabId).classList.add('active');
 
+            // The change feed keeps the loaded posts current, so switching tabs renders from memory
             if (tabId === 'history') {
                 currentFolder = null;
                 archiveHeader.classList.add('hidden');
-                loadHistory();
+                renderHistory();
             } else if (tabId === 'dashboard') {
-                loadHistory(); // Refresh statuses for dashboard
+                renderDashboard();
             } else if (tabId === 'manual') {
-                loadManualHistory();
+                if (manualLoaded) renderManualGrid();
+                else loadManualHistory();
             }
             updateSelectionUI();
         });
@@ -139,7 +163,6 @@ document.addEventListener('DOMContentLoaded', () => {
                 } else {
                     statusMessage.textContent = `Successfully archived ${data.posts.length} new posts.`;
                     renderGrid(data.posts, resultGrid);
-                    loadHistory();
                 }
             } else {
                 statusMessage.textContent = `Error: ${data.detail || 'Failed to scrape'}`;
@@ -195,7 +218,6 @@ document.addEventListener('DOMContentLoaded', () => {
                                     progressFill.style.width = `${percent}%`;
                                 } else if (data.type === 'complete') {
                                     statusMessage.textContent = `Successfully imported ${data.scraped_count} new posts.`;
-                                    loadHistory();
                                     progressContainer.classList.add('hidden');
                                 }
                             } catch (e) { }
@@ -253,28 +275,41 @@ document.addEventListener('DOMContentLoaded', () => {
         if (files.length > 0) handleManualFiles(files);
     });
 
+    // Files are sent in batches; the server streams each one to disk and
+    // stores the whole batch in one write
+    const UPLOAD_BATCH_SIZE = 50;
+
     async function handleManualFiles(files) {
-        statusMessage.textContent = `Uploading ${files.length} images...`;
+        const rejected = [];
+        let uploaded = 0;
+
+        for (let i = 0; i < files.length; i += UPLOAD_BATCH_SIZE) {
+            const batch = files.slice(i, i + UPLOAD_BATCH_SIZE);
+            statusMessage.textContent = `Uploading ${Math.min(i + batch.length, files.length)} / ${files.length} images...`;
 
-        for (const file of files) {
             const formData = new FormData();
-            formData.append('file', file);
+            batch.forEach(file => formData.append('files', file));
 
             try {
-                const response = await fetch('/api/upload', {
+                const response = await fetch('/api/uploads', {
                     method: 'POST',
                     body: formData
                 });
 
                 if (!response.ok) throw new Error('Upload failed');
+                const result = await response.json();
+                uploaded += result.uploaded.length;
+                rejected.push(...result.rejected);
             } catch (err) {
                 console.error(err);
-                alert(`Failed to upload ${file.name}`);
+                batch.forEach(file => rejected.push({ filename: file.name, reason: 'upload failed' }));
             }
         }
 
-        statusMessage.textContent = 'Upload complete.';
-        loadManualHistory();
+        statusMessage.textContent = `Upload complete: ${uploaded} added${rejected.length ? `, ${rejected.length} skipped` : ''}.`;
+        if (rejected.length) {
+            alert(`Skipped:\n${rejected.map(r => `${r.filename}: ${r.reason}`).join('\n')}`);
+        }
     }
 
     // Filtering
@@ -308,7 +343,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (response.ok) {
                 currentFolder = null;
                 archiveHeader.classList.add('hidden');
-                loadHistory();
+                renderHistory();
             } else {
                 alert('Litzchill: Failed to delete folder');
             }
@@ -324,6 +359,46 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
 
+    bulkDeleteBtn.addEventListener('click', async () => {
+        const ids = Array.from(selectedPosts);
+        if (ids.length === 0) return;
+        if (!confirm(`Litzchill: Delete ${ids.length} selected memes? This cannot be undone.`)) return;
+        await runBulkAction('/api/memes/bulk-delete', { post_ids: ids }, bulkDeleteBtn);
+    });
+
+    resetBtn.addEventListener('click', async () => {
+        const ids = Array.from(selectedPosts);
+        if (ids.length === 0) return;
+        if (!confirm(`Litzchill: Reset ${ids.length} memes to pending? Their AI data will be cleared.`)) return;
+        await runBulkAction('/api/memes/bulk-status', { post_ids: ids, status: 'pending' }, resetBtn);
+    });
+
+    completeBtn.addEventListener('click', async () => {
+        const ids = Array.from(selectedPosts);
+        if (ids.length === 0) return;
+        await runBulkAction('/api/memes/bulk-status', { post_ids: ids, status: 'completed' }, completeBtn);
+    });
+
+    // One request for the whole selection; the server updates each store in a single pass
+    async function runBulkAction(endpoint, body, btn) {
+        setLoading(true, btn);
+        try {
+            const response = await fetch(endpoint, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(body)
+            });
+            if (!response.ok) throw new Error('Bulk action failed');
+            selectedPosts.clear();
+        } catch (err) {
+            console.error(err);
+            alert('Litzchill: Bulk action failed');
+        } finally {
+            setLoading(false, btn);
+            updateSelectionUI();
+        }
+    }
+
     // Auth Actions
     loginForm.addEventListener('submit', async (e) => {
         e.preventDefault();
@@ -430,13 +505,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const ids = Array.from(selectedPosts);
         if (ids.length === 0) return;
 
-        const activeTab = document.querySelector('.tab-btn.active')?.getAttribute('data-tab');
-        const sourcePosts = activeTab === 'manual' ? manualPosts : allPosts;
-
-        const pendingIds = ids.filter(id => {
-            const post = sourcePosts.find(p => p.post_id === id);
-            return post && (!post.status || post.status === 'pending');
-        });
+        const pendingIds = ids.filter(id => statusOf(id) === 'pending');
 
         if (pendingIds.length === 0) {
             alert('Selection contains no pending items.');
@@ -445,13 +514,19 @@ document.addEventListener('DOMContentLoaded', () => {
         await startAIProcess('enrich', pendingIds);
     });
 
+    enrichAnnotateBtn.addEventListener('click', async () => {
+        const pendingIds = Array.from(selectedPosts).filter(id => statusOf(id) === 'pending');
+        if (pendingIds.length === 0) {
+            alert('Selection contains no pending items.');
+            return;
+        }
+        await startAIProcess('both', pendingIds);
+    });
+
     annotateBtn.addEventListener('click', async () => {
         const ids = Array.from(selectedPosts);
         if (ids.length === 0) return;
-        const enrichedIds = ids.filter(id => {
-            const post = allPosts.find(p => p.post_id === id);
-            return post.status === 'enriched';
-        });
+        const enrichedIds = ids.filter(id => statusOf(id) === 'enriched');
         if (enrichedIds.length === 0) {
             alert('Selection contains no enriched items.');
             return;
@@ -459,76 +534,99 @@ document.addEventListener('DOMContentLoaded', () => {
         await startAIProcess('annotate', enrichedIds);
     });
 
+    // Enrich / annotate run as a server-side batch job: it keeps going when the
+    // tab is closed, and the progress bar follows it from any page load
     async function startAIProcess(type, ids) {
-        console.log(`DEBUG: AI Process - Type: ${type}, IDs:`, ids);
-        console.log('DEBUG: AI Process - Current User State:', currentUser);
-
-        const total = ids.length;
-        const batchSize = 20;
-        const batches = [];
-        for (let i = 0; i < ids.length; i += batchSize) {
-            batches.push(ids.slice(i, i + batchSize));
-        }
-
-        aiProgressContainer.classList.remove('hidden');
-        setLoading(true, type === 'enrich' ? enrichBtn : annotateBtn);
-
-        let totalSuccess = 0;
-        const activeTab = document.querySelector('.tab-btn.active')?.getAttribute('data-tab');
-        const isManual = activeTab === 'manual';
-
+        const btn = { enrich: enrichBtn, annotate: annotateBtn, both: enrichAnnotateBtn }[type];
+        setLoading(true, btn);
         try {
-            for (let i = 0; i < batches.length; i++) {
-                const batch = batches[i];
-                const currentBatchNum = i + 1;
-                const totalBatches = batches.length;
-
-                aiProgressStatus.innerHTML = `<i class="fas fa-circle-notch fa-spin"></i> ${type === 'enrich' ? 'Enriching' : 'Annotating'} batch ${currentBatchNum}/${totalBatches} (${batch.length} items)...`;
-                aiCurrentWorkingOn.textContent = `Batch progress: ${Math.round(((currentBatchNum - 1) / totalBatches) * 100)}%`;
-                aiProgressFill.style.width = `${((currentBatchNum - 1) / totalBatches) * 100}%`;
-
-                let endpoint = type === 'enrich' ? '/api/enrich' : '/api/annotate';
-                if (isManual && type === 'enrich') endpoint = '/api/uploads/enrich';
-
-                const headers = { 'Content-Type': 'application/json' };
-                if (type === 'annotate' && currentUser?.access_token) {
-                    headers['Authorization'] = `Bearer ${currentUser.access_token}`;
-                }
-
-                const response = await fetch(endpoint, {
-                    method: 'POST',
-                    headers: headers,
-                    body: JSON.stringify({ post_ids: batch })
-                });
+            const response = await fetch('/api/batch-jobs', {
+                method: 'POST',
+                headers: authHeaders(),
+                body: JSON.stringify({ post_ids: ids, steps: type === 'both' ? ['enrich', 'annotate'] : [type] })
+            });
+            if (!response.ok) throw new Error('Batch job not started');
+            selectedPosts.clear();
+            updateSelectionUI();
+            followBatchJob(await response.json());
+        } catch (err) {
+            console.error(err);
+            aiProgressContainer.classList.remove('hidden');
+            aiProgressStatus.textContent = 'Could not start the AI job.';
+        } finally {
+            setLoading(false, btn);
+        }
+    }
 
-                const result = await response.json();
+    function authHeaders() {
+        const headers = { 'Content-Type': 'application/json' };
+        if (currentUser?.access_token) {
+            headers['Authorization'] = `Bearer ${currentUser.access_token}`;
+        }
+        return headers;
+    }
 
-                if (type === 'enrich') {
-                    totalSuccess += result.filter(r => r.status === 'success').length;
+    function followBatchJob(job) {
+        batchJobFeed?.close();
+        batchJobId = job.id;
+        aiProgressContainer.classList.remove('hidden');
+        showBatchProgress(job);
+
+        batchJobFeed = new EventSource(`/api/jobs/${job.id}/events`);
+        batchJobFeed.onmessage = (e) => {
+            const data = JSON.parse(e.data);
+            if (data.type === 'progress') {
+                showBatchProgress(data);
+            } else if (['complete', 'cancelled', 'error'].includes(data.type)) {
+                batchJobFeed.close();
+                batchJobFeed = null;
+                if (data.type === 'error') {
+                    aiProgressStatus.textContent = `AI job failed: ${data.message}`;
+                    aiPauseBtn.classList.add('hidden');
+                    aiCancelBtn.classList.add('hidden');
                 } else {
-                    if (result.status === 'success') totalSuccess += batch.length;
+                    showBatchProgress(data);
                 }
-
-                // Partial progress update
-                aiProgressFill.style.width = `${(currentBatchNum / totalBatches) * 100}%`;
+                setTimeout(() => aiProgressContainer.classList.add('hidden'), 5000);
             }
+        };
+    }
 
-            aiProgressStatus.innerHTML = `<i class="fas fa-check-circle"></i> Complete: ${totalSuccess}/${total} success`;
-        } catch (err) {
-            console.error(err);
-            aiProgressStatus.textContent = 'Process failed during batch execution.';
-        } finally {
-            aiProgressFill.style.width = `100%`;
-            aiCurrentWorkingOn.textContent = '';
-            selectedPosts.clear();
+    function showBatchProgress(job) {
+        const percent = job.total ? Math.round((job.current / job.total) * 100) : 100;
+        const labels = { running: 'Processing', paused: 'Paused', completed: 'Complete', cancelled: 'Cancelled' };
+        const icons = { running: 'fa-circle-notch fa-spin', paused: 'fa-pause-circle', completed: 'fa-check-circle', cancelled: 'fa-times-circle' };
+        aiProgressStatus.innerHTML = `<i class="fas ${icons[job.status] || 'fa-info-circle'}"></i> ${labels[job.status] || job.status}: ${job.current}/${job.total}`;
+        aiCurrentWorkingOn.textContent = `${job.enriched} enriched, ${job.annotated} annotated, ${job.failed} failed`;
+        aiProgressPercent.textContent = `${percent}%`;
+        aiProgressFill.style.width = `${percent}%`;
+
+        const active = job.status === 'running' || job.status === 'paused';
+        aiPauseBtn.classList.toggle('hidden', !active);
+        aiCancelBtn.classList.toggle('hidden', !active);
+        aiPauseBtn.textContent = job.status === 'paused' ? 'Resume' : 'Pause';
+    }
+
+    aiPauseBtn.addEventListener('click', async () => {
+        if (!batchJobId) return;
+        const action = aiPauseBtn.textContent === 'Resume' ? 'resume' : 'pause';
+        const response = await fetch(`/api/batch-jobs/${batchJobId}/${action}`, { method: 'POST', headers: authHeaders() });
+        if (response.ok) showBatchProgress(await response.json());
+    });
 
-            if (activeTab === 'manual') await loadManualHistory();
-            else await loadHistory();
+    aiCancelBtn.addEventListener('click', async () => {
+        if (!batchJobId || !confirm('Litzchill: Cancel this AI job? Posts already processed keep their results.')) return;
+        const response = await fetch(`/api/batch-jobs/${batchJobId}/cancel`, { method: 'POST' });
+        if (response.ok) showBatchProgress(await response.json());
+    });
 
-            updateSelectionUI();
-            setLoading(false, type === 'enrich' ? enrichBtn : annotateBtn);
-            setTimeout(() => aiProgressContainer.classList.add('hidden'), 5000);
-        }
+    // A job started earlier (in this tab or another) is followed again on load
+    async function followRunningBatchJob() {
+        try {
+            const response = await fetch('/api/batch-jobs');
+            const job = (await response.json()).find(j => j.status === 'running' || j.status === 'paused');
+            if (job) followBatchJob(job);
+        } catch (err) { console.error(err); }
     }
 
     function updateSelectionUI() {
@@ -539,17 +637,22 @@ document.addEventListener('DOMContentLoaded', () => {
         if (count > 0) {
             selectionBar.classList.remove('hidden');
             if (activeTab === 'dashboard' || activeTab === 'manual') {
-                const sourcePosts = activeTab === 'manual' ? manualPosts : allPosts;
-                const selectedList = sourcePosts.filter(p => selectedPosts.has(p.post_id));
+                const statuses = Array.from(selectedPosts, statusOf).filter(Boolean);
 
-                const allPending = selectedList.length > 0 && selectedList.every(p => !p.status || p.status === 'pending');
-                const allEnriched = selectedList.length > 0 && selectedList.every(p => p.status === 'enriched');
+                const allPending = statuses.length > 0 && statuses.every(s => s === 'pending');
+                const allEnriched = statuses.length > 0 && statuses.every(s => s === 'enriched');
 
                 enrichBtn.classList.toggle('hidden', !allPending);
+                enrichAnnotateBtn.classList.toggle('hidden', !allPending);
                 annotateBtn.classList.toggle('hidden', !allEnriched);
+                resetBtn.classList.toggle('hidden', allPending);
+                completeBtn.classList.toggle('hidden', !allEnriched);
             } else {
                 enrichBtn.classList.add('hidden');
+                enrichAnnotateBtn.classList.add('hidden');
                 annotateBtn.classList.add('hidden');
+                resetBtn.classList.add('hidden');
+                completeBtn.classList.add('hidden');
             }
         } else {
             selectionBar.classList.add('hidden');
@@ -572,14 +675,25 @@ document.addEventListener('DOMContentLoaded', () => {
         updateSelectionUI();
     }
 
+    // Status of a selected post: manual uploads are all loaded, dashboard posts come in pages
+    function statusOf(postId) {
+        const activeTab = document.querySelector('.tab-btn.active')?.getAttribute('data-tab');
+        if (activeTab === 'manual') {
+            const post = manualPosts.find(p => p.post_id === postId);
+            return post && (post.status || 'pending');
+        }
+        return postStatus.get(postId);
+    }
+
     async function loadHistory() {
+        const activeTab = document.querySelector('.tab-btn.active')?.getAttribute('data-tab');
+        // The dashboard only needs the counts and the first page of each column
+        if (activeTab === 'dashboard') return renderDashboard();
         try {
             const response = await fetch('/api/history');
             allPosts = await response.json();
             totalBadge.textContent = allPosts.length;
-            const activeTab = document.querySelector('.tab-btn.active')?.getAttribute('data-tab');
-            if (activeTab === 'dashboard') renderDashboard();
-            else if (activeTab === 'history') renderHistory();
+            if (activeTab === 'history') renderHistory();
             else if (activeTab === 'collection') { /* current collection already rendered */ }
         } catch (error) { console.error(error); }
     }
@@ -588,6 +702,7 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             const response = await fetch('/api/uploads/history');
             manualPosts = await response.json();
+            manualLoaded = true;
             renderManualGrid();
         } catch (err) {
             console.error(err);
@@ -598,85 +713,110 @@ document.addEventListener('DOMContentLoaded', () => {
         renderGrid(manualPosts, manualGrid);
     }
 
-    function renderDashboard() {
-        const pendingList = document.getElementById('pending-list');
-        const enrichedList = document.getElementById('enriched-list');
-        const completedList = document.getElementById('completed-list');
-
-        const pending = allPosts.filter(p => !p.status || p.status === 'pending');
-        const enriched = allPosts.filter(p => p.status === 'enriched');
-        const completed = allPosts.filter(p => p.status === 'completed');
-
-        document.getElementById('stat-pending').textContent = pending.length;
-        document.getElementById('stat-enriched').textContent = enriched.length;
-        document.getElementById('stat-completed').textContent = completed.length;
-
-        pendingList.innerHTML = renderWorkflowColumn(pending);
-        enrichedList.innerHTML = renderWorkflowColumn(enriched);
-        completedList.innerHTML = renderWorkflowColumn(completed);
-
-        [pendingList, enrichedList, completedList].forEach(list => {
-            list.querySelectorAll('.mini-card').forEach(card => {
-                const postId = card.getAttribute('data-post-id');
-                card.querySelector('.mini-select').addEventListener('mousedown', (e) => {
-                    e.stopPropagation();
-                    isDragging = true;
-                    dragTargetState = !selectedPosts.has(postId);
-                    document.body.classList.add('selecting');
-                    togglePostSelection(postId, dragTargetState);
-                });
-                card.addEventListener('mouseenter', () => { if (isDragging) togglePostSelection(postId, dragTargetState); });
-                card.addEventListener('click', (e) => {
-                    if (e.target.closest('.mini-select')) return;
-                    if (e.target.closest('.mini-delete')) {
-                        deleteMeme(postId);
-                        return;
-                    }
-                    const post = allPosts.find(p => p.post_id === postId);
-                    if (post) openPostModal(post);
-                });
-            });
+    async function refreshDashboardStats() {
+        const response = await fetch('/api/stats');
+        const counts = (await response.json()).source?.instagram || {};
+        totalBadge.textContent = counts.total || 0;
+        WORKFLOW_STATUSES.forEach(status => {
+            document.getElementById(`stat-${status}`).textContent = counts[status] || 0;
         });
+    }
 
-        document.querySelectorAll('.select-all-btn').forEach(btn => {
-            btn.addEventListener('click', () => {
-                const status = btn.getAttribute('data-status');
-                const source = btn.getAttribute('data-source');
-                const posts = (source === 'manual' ? manualPosts : allPosts).filter(p => status === 'pending' ? (!p.status || p.status === 'pending') : p.status === status);
+    async function renderDashboard() {
+        try {
+            await refreshDashboardStats();
+            dashboardPosts.clear();
+            await Promise.all(WORKFLOW_STATUSES.map(status => loadColumn(status, true)));
+            updateSelectionUI();
+        } catch (error) { console.error(error); }
+    }
 
-                const allSelected = posts.every(p => selectedPosts.has(p.post_id));
-                posts.forEach(p => allSelected ? selectedPosts.delete(p.post_id) : selectedPosts.add(p.post_id));
-                updateSelectionUI();
-                btn.textContent = allSelected ? (source === 'manual' ? 'Select All Pending' : 'Select All') : (source === 'manual' ? 'Deselect All Pending' : 'Deselect All');
-            });
+    async function loadColumn(status, reset = false) {
+        const list = document.getElementById(`${status}-list`);
+        const offset = reset ? 0 : list.querySelectorAll('.mini-card').length;
+        const response = await fetch(`/api/posts?status=${status}&source=instagram&offset=${offset}&limit=${COLUMN_PAGE_SIZE}`);
+        const page = await response.json();
+        page.posts.forEach(p => {
+            dashboardPosts.set(p.post_id, p);
+            postStatus.set(p.post_id, status);
         });
 
-        const next100Btn = document.getElementById('select-next-100-btn');
-        if (next100Btn) {
-            next100Btn.addEventListener('click', () => {
-                const pending = allPosts.filter(p => (!p.status || p.status === 'pending') && !selectedPosts.has(p.post_id));
-                pending.slice(0, 100).forEach(p => selectedPosts.add(p.post_id));
-                updateSelectionUI();
-            });
+        const holder = document.createElement('div');
+        holder.innerHTML = reset || page.posts.length ? renderWorkflowColumn(page.posts) : '';
+        holder.querySelectorAll('.mini-card').forEach(bindMiniCard);
+        list.querySelector('.load-more')?.remove();
+        if (reset) list.replaceChildren(...holder.childNodes);
+        else list.append(...holder.childNodes);
+
+        const remaining = page.total - offset - page.posts.length;
+        if (remaining > 0) {
+            const more = document.createElement('button');
+            more.className = 'btn-text-only load-more';
+            more.textContent = `Load more (${remaining} left)`;
+            more.addEventListener('click', () => loadColumn(status));
+            list.appendChild(more);
         }
+    }
 
-        const next100EnrichedBtn = document.getElementById('select-next-100-enriched-btn');
-        if (next100EnrichedBtn) {
-            next100EnrichedBtn.addEventListener('click', () => {
-                const enriched = allPosts.filter(p => p.status === 'enriched' && !selectedPosts.has(p.post_id));
-                enriched.slice(0, 100).forEach(p => selectedPosts.add(p.post_id));
-                updateSelectionUI();
-            });
-        }
+    function bindMiniCard(card) {
+        const postId = card.getAttribute('data-post-id');
+        card.querySelector('.mini-select').addEventListener('mousedown', (e) => {
+            e.stopPropagation();
+            isDragging = true;
+            dragTargetState = !selectedPosts.has(postId);
+            document.body.classList.add('selecting');
+            togglePostSelection(postId, dragTargetState);
+        });
+        card.addEventListener('mouseenter', () => { if (isDragging) togglePostSelection(postId, dragTargetState); });
+        card.addEventListener('click', (e) => {
+            if (e.target.closest('.mini-select')) return;
+            if (e.target.closest('.mini-delete')) {
+                deleteMeme(postId);
+                return;
+            }
+            const post = dashboardPosts.get(postId);
+            if (post) openPostModal(post);
+        });
     }
 
+    // Every id in a dashboard column, not just the loaded page
+    async function fetchStatusIds(status) {
+        const response = await fetch(`/api/posts/ids?status=${status}&source=instagram`);
+        const ids = await response.json();
+        ids.forEach(id => postStatus.set(id, status));
+        return ids;
+    }
+
+    document.querySelectorAll('.select-all-btn').forEach(btn => {
+        btn.addEventListener('click', async () => {
+            const status = btn.getAttribute('data-status');
+            const source = btn.getAttribute('data-source');
+            const ids = source === 'manual'
+                ? manualPosts.filter(p => status === 'pending' ? (!p.status || p.status === 'pending') : p.status === status).map(p => p.post_id)
+                : await fetchStatusIds(status);
+
+            const allSelected = ids.every(id => selectedPosts.has(id));
+            ids.forEach(id => allSelected ? selectedPosts.delete(id) : selectedPosts.add(id));
+            updateSelectionUI();
+            btn.textContent = allSelected ? (source === 'manual' ? 'Select All Pending' : 'Select All') : (source === 'manual' ? 'Deselect All Pending' : 'Deselect All');
+        });
+    });
+
+    [['select-next-100-btn', 'pending'], ['select-next-100-enriched-btn', 'enriched']].forEach(([id, status]) => {
+        document.getElementById(id)?.addEventListener('click', async () => {
+            const ids = (await fetchStatusIds(status)).filter(postId => !selectedPosts.has(postId));
+            ids.slice(0, 100).forEach(postId => selectedPosts.add(postId));
+            updateSelectionUI();
+        });
+    });
+
     function renderWorkflowColumn(posts) {
         if (posts.length === 0) return '<div class="status-message">Empty</div>';
         return posts.map(p => `
             <div class="mini-card ${selectedPosts.has(p.post_id) ? 'selected' : ''}" data-post-id="${p.post_id}">
                 <div class="mini-select"></div>
                 <div class="mini-delete"><i class="fas fa-trash"></i></div>
-                <img src="${p.image_path}" alt="Thumb">
+                <img src="${thumbUrl(p)}" alt="Thumb" loading="lazy">
                 <div class="mini-info">
                     <h4>@${p.username}</h4>
                     <p>${p.caption || 'No caption'}</p>
@@ -711,7 +851,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         const html = usernames.map(user => {
             const posts = groups[user];
-            const previews = posts.slice(0, 3).map(p => `<img src="${p.image_path}" alt="Preview">`).join('');
+            const previews = posts.slice(0, 3).map(p => `<img src="${thumbUrl(p)}" alt="Preview">`).join('');
             return `
                 <div class="folder-card glass" data-username="${user}">
                     <h3>@${user}</h3>
@@ -732,77 +872,171 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    function cardHtml(post) {
+        const status = post.status || 'pending';
+        const isSelected = selectedPosts.has(post.post_id);
+        return `
+            <div class="card glass ${isSelected ? 'selected' : ''}" data-post-id="${post.post_id}">
+                <div class="card-select"></div>
+                <div class="status-badge status-${status}">${status}</div>
+                <img src="${imageUrl(post)}" alt="Post by ${post.username}" loading="lazy" onerror="this.src='https://via.placeholder.com/300x300?text=Image+Not+Found'">
+                <div class="card-overlay">
+                    <p>${post.caption || 'No caption'}</p>
+                    <div class="card-meta">
+                        <span class="card-date">${new Date(post.timestamp).toLocaleDateString()}</span>
+                        <div class="actions">
+                            <button class="view-btn download-btn"><i class="fas fa-expand"></i></button>
+                            <button class="delete-meme-btn delete-btn"><i class="fas fa-trash"></i></button>
+                        </div>
+                    </div>
+                </div>
+            </div>
+        `;
+    }
+
     function renderGrid(posts, container) {
         if (!posts || posts.length === 0) {
             container.innerHTML = '<div class="status-message">No items found in this section.</div>';
             return;
         }
 
-        const html = posts.map(post => {
-            const status = post.status || 'pending';
-            const isSelected = selectedPosts.has(post.post_id);
-            return `
-                <div class="card glass ${isSelected ? 'selected' : ''}" data-post-id="${post.post_id}">
-                    <div class="card-select"></div>
-                    <div class="status-badge status-${status}">${status}</div>
-                    <img src="${post.image_path}" alt="Post by ${post.username}" onerror="this.src='https://via.placeholder.com/300x300?text=Image+Not+Found'">
-                    <div class="card-overlay">
-                        <p>${post.caption || 'No caption'}</p>
-                        <div class="card-meta">
-                            <span class="card-date">${new Date(post.timestamp).toLocaleDateString()}</span>
-                            <div class="actions">
-                                <button class="view-btn download-btn"><i class="fas fa-expand"></i></button>
-                                <button class="delete-meme-btn delete-btn"><i class="fas fa-trash"></i></button>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            `;
-        }).join('');
+        container.innerHTML = posts.map(cardHtml).join('');
+        container.querySelectorAll('.card').forEach(card => bindCard(card, posts));
+    }
 
-        container.innerHTML = html;
+    function bindCard(card, posts) {
+        const postId = card.getAttribute('data-post-id');
 
-        // Add click listeners
-        container.querySelectorAll('.card').forEach(card => {
-            const postId = card.getAttribute('data-post-id');
+        // Selection toggle logic
+        card.querySelector('.card-select').addEventListener('mousedown', (e) => {
+            e.stopPropagation();
+            isDragging = true;
+            dragTargetState = !selectedPosts.has(postId);
+            document.body.classList.add('selecting');
+            togglePostSelection(postId, dragTargetState);
+        });
 
-            // Selection toggle logic
-            card.querySelector('.card-select').addEventListener('mousedown', (e) => {
-                e.stopPropagation();
-                isDragging = true;
-                dragTargetState = !selectedPosts.has(postId);
-                document.body.classList.add('selecting');
+        card.addEventListener('mouseenter', () => {
+            if (isDragging) {
                 togglePostSelection(postId, dragTargetState);
-            });
+            }
+        });
 
-            card.addEventListener('mouseenter', () => {
-                if (isDragging) {
-                    togglePostSelection(postId, dragTargetState);
-                }
+        // Card click for modal (only if not clicking select)
+        card.addEventListener('click', (e) => {
+            if (e.target.closest('.card-select')) return;
+            if (e.target.closest('.delete-meme-btn')) {
+                deleteMeme(postId);
+                return;
+            }
+            const activeTab = document.querySelector('.tab-btn.active')?.getAttribute('data-tab');
+            const sourcePosts = activeTab === 'manual' ? manualPosts : allPosts;
+            const post = sourcePosts.find(p => p.post_id === postId) || posts.find(p => p.post_id === postId);
+            if (post) openPostModal(post);
+        });
+    }
+
+    function cardElement(post, html = cardHtml, bind = card => bindCard(card, [post])) {
+        const holder = document.createElement('div');
+        holder.innerHTML = html(post);
+        const card = holder.firstElementChild;
+        bind(card);
+        return card;
+    }
+
+    // Change feed: the server pushes inserted, updated and deleted posts, so
+    // views are patched in place instead of re-fetching the archive after every action
+    async function startChangeFeed() {
+        try {
+            const response = await fetch('/api/changes');
+            revision = (await response.json()).revision;
+        } catch (error) { console.error(error); }
+        await loadHistory();
+
+        // EventSource reconnects by itself and resumes from the last event id
+        const feed = new EventSource(revision === null ? '/api/changes/events' : `/api/changes/events?since=${revision}`);
+        feed.onmessage = (e) => {
+            const delta = JSON.parse(e.data);
+            revision = delta.revision;
+            if (delta.reset) {
+                loadHistory();
+                if (manualLoaded) loadManualHistory();
+            } else if (delta.changes.length) {
+                applyChanges(delta.changes);
+            }
+        };
+    }
+
+    function patchPosts(posts, { op, post_id, post }) {
+        const i = posts.findIndex(p => p.post_id === post_id);
+        if (op === 'delete') {
+            if (i >= 0) posts.splice(i, 1);
+        } else if (i >= 0) {
+            posts[i] = post;
+        } else {
+            posts.push(post);
+        }
+    }
+
+    function applyChanges(changes) {
+        const activeTab = document.querySelector('.tab-btn.active')?.getAttribute('data-tab');
+        let archiveChanged = false;
+
+        changes.forEach(change => {
+            const { op, post_id, post } = change;
+            const manual = post?.source === 'upload';
+            if (op === 'delete' || !manual) patchPosts(allPosts, change);
+            if (manualLoaded && (op === 'delete' || manual)) patchPosts(manualPosts, change);
+            if (!manual) archiveChanged = true;
+            if (op === 'delete') selectedPosts.delete(post_id);
+
+            // Cards already on screen (live feed, archive folder, manual uploads)
+            const selector = `[data-post-id="${CSS.escape(post_id)}"]`;
+            document.querySelectorAll(`.card${selector}`).forEach(card => {
+                if (op === 'delete') card.remove();
+                else card.replaceWith(cardElement(post));
             });
+            if (op === 'insert') {
+                const grid = manual ? (manualLoaded ? manualGrid : null)
+                    : (currentFolder === post.username ? historyGrid : null);
+                if (grid && !grid.querySelector(`.card${selector}`)) {
+                    grid.querySelector(':scope > .status-message')?.remove();
+                    grid.appendChild(cardElement(post));
+                }
+            }
 
-            // Card click for modal (only if not clicking select)
-            card.addEventListener('click', (e) => {
-                if (e.target.closest('.card-select')) return;
-                if (e.target.closest('.delete-meme-btn')) {
-                    deleteMeme(postId);
-                    return;
+            // Dashboard columns: the card moves to the column of its new status
+            document.querySelectorAll(`.mini-card${selector}`).forEach(card => card.remove());
+            dashboardPosts.delete(post_id);
+            postStatus.delete(post_id);
+            if (op !== 'delete' && !manual) {
+                const status = post.status || 'pending';
+                postStatus.set(post_id, status);
+                const list = document.getElementById(`${status}-list`);
+                // Only a fully loaded column can show it in place; otherwise "Load more" will
+                if (list && !list.querySelector('.load-more')) {
+                    list.querySelector(':scope > .status-message')?.remove();
+                    dashboardPosts.set(post_id, post);
+                    list.appendChild(cardElement(post, p => renderWorkflowColumn([p]), bindMiniCard));
                 }
-                const activeTab = document.querySelector('.tab-btn.active')?.getAttribute('data-tab');
-                const sourcePosts = activeTab === 'manual' ? manualPosts : allPosts;
-                const post = sourcePosts.find(p => p.post_id === postId) || posts.find(p => p.post_id === postId);
-                if (post) openPostModal(post);
-            });
+            }
         });
+
+        if (archiveChanged) {
+            totalBadge.textContent = allPosts.length;
+            if (activeTab === 'history' && !currentFolder) renderFolders();
+            if (activeTab === 'dashboard') refreshDashboardStats().catch(console.error);
+        }
+        updateSelectionUI();
     }
 
     function openPostModal(post) {
-        modalImg.src = post.image_path;
+        modalImg.src = imageUrl(post);
         modalUser.textContent = `@${post.username}`;
         modalCaption.textContent = post.caption || 'No description provided.';
         modalDate.textContent = `Archived on ${new Date(post.scraped_at).toLocaleString()}`;
 
-        modalDownload.href = post.image_path;
+        modalDownload.href = imageUrl(post);
         modalDownload.download = `${post.post_id}.jpg`;
         modalLink.href = post.post_url;
 
@@ -875,9 +1109,6 @@ document.addEventListener('DOMContentLoaded', () => {
             const response = await fetch(`/api/meme/${postId}`, { method: 'DELETE' });
             if (response.ok) {
                 selectedPosts.delete(postId);
-                const activeTab = document.querySelector('.tab-btn.active')?.getAttribute('data-tab');
-                if (activeTab === 'manual') await loadManualHistory();
-                else await loadHistory();
                 updateSelectionUI();
             } else {
                 alert('Litzchill: Failed to delete meme');
@@ -913,5 +1144,6 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Initial load
     checkAuth();
-    loadHistory();
+    startChangeFeed();
+    followRunningBatchJob();
 });
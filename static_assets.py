@@ -0,0 +1,143 @@
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Far-future caching for URLs that embed a content hash
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Everything else is cached but revalidated with its ETag
+REVALIDATE = "no-cache"
+
+# Only text assets are worth compressing
+COMPRESSIBLE = (".js", ".css", ".html", ".svg", ".json")
+# Hex digits of the content hash in `?v=` asset URLs
+VERSION_LENGTH = 12
+
+_ASSET_REF = re.compile(r'(src|href)="/static/([^"?#]+)"')
+
+
+def accepted_encodings(accept_encoding):
+    """{coding: q-value} of an Accept-Encoding header ("br;q=0" is listed with 0)."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class Asset:
+    __slots__ = ("path", "mtime", "body", "gzip", "br", "digest", "media_type")
+
+    def __init__(self, path, mtime, body):
+        self.path = path
+        self.mtime = mtime
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.gzip = None
+        self.br = None
+        if path.endswith(COMPRESSIBLE):
+            self.gzip = gzip.compress(body, compresslevel=9)
+            if brotli is not None:
+                self.br = brotli.compress(body)
+
+    @property
+    def etag(self):
+        return f'"{self.digest[:32]}"'
+
+    @property
+    def version(self):
+        return self.digest[:VERSION_LENGTH]
+
+    def encoded(self, accept_encoding):
+        """Returns (body, content_encoding) for the precompressed variant the client
+        prefers (highest q-value, brotli on a tie), or the plain body."""
+        accepted = accepted_encodings(accept_encoding)
+        best, best_q = (self.body, None), 0.0
+        for body, coding in ((self.br, "br"), (self.gzip, "gzip")):
+            q = accepted.get(coding, accepted.get("*", 0.0))
+            if body is not None and q > best_q:
+                best, best_q = (body, coding), q
+        return best
+
+
+class StaticAssets:
+    """Frontend files held in memory with precomputed hashes and gzip/brotli bodies.
+
+    index.html is served with `/static/...` references rewritten to
+    `/static/...?v={hash}`, so the assets themselves can be cached forever.
+    With `reload=True` (dev) files are re-read whenever their mtime changes.
+    """
+
+    def __init__(self, directory="static", reload=False):
+        self.directory = directory
+        self.reload = reload
+        self._assets = {}
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Returns the Asset for a path relative to the static directory, or None."""
+        full_path = os.path.normpath(os.path.join(self.directory, path))
+        if not full_path.startswith(os.path.normpath(self.directory) + os.sep):
+            return None
+
+        with self._lock:
+            asset = self._assets.get(path)
+        if asset is not None and not self.reload:
+            return asset
+
+        try:
+            mtime = os.path.getmtime(full_path)
+        except OSError:
+            return None
+        if asset is not None and asset.mtime == mtime:
+            return asset
+
+        with open(full_path, 'rb') as f:
+            asset = Asset(path, mtime, f.read())
+        with self._lock:
+            self._assets[path] = asset
+            self._index = None
+        return asset
+
+    def versioned_url(self, path):
+        asset = self.get(path)
+        if asset is None:
+            return f"/static/{path}"
+        return f"/static/{path}?v={asset.version}"
+
+    def index(self):
+        """Returns index.html as an Asset with content-hashed asset URLs."""
+        source = self.get("index.html")
+        if source is None:
+            return None
+        with self._lock:
+            index = self._index
+        if index is not None and index.mtime == source.mtime and not self.reload:
+            return index
+
+        html = source.body.decode("utf-8")
+        html = _ASSET_REF.sub(lambda m: f'{m.group(1)}="{self.versioned_url(m.group(2))}"', html)
+        index = Asset("index.html", source.mtime, html.encode("utf-8"))
+        with self._lock:
+            self._index = index
+        return index
@@ -0,0 +1,126 @@
+import os
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import METADATA_LOAD_SECONDS, METADATA_SAVE_SECONDS, METADATA_SIZE_BYTES
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# Guards the flock'ed files within this process as well (flock is per open file)
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(os.path.abspath(path), threading.RLock())
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path`, shared by every thread and worker process.
+
+    The lock lives on a `{path}.lock` sidecar so the data file itself can be
+    replaced atomically while the lock is held.
+    """
+    with _thread_lock(path):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _metric_file(path):
+    # One label per store; job and cache files are named by id, so they share one each
+    parent, name = os.path.split(path)
+    if os.path.basename(parent) == "jobs":
+        return "job"
+    if f"{os.sep}cache{os.sep}" in os.path.abspath(parent) + os.sep:
+        return "cache"
+    return name
+
+
+def read_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw)
+    except (OSError, ValueError):
+        return default
+    name = _metric_file(path)
+    METADATA_LOAD_SECONDS.observe(time.perf_counter() - start, file=name)
+    METADATA_SIZE_BYTES.set(len(raw), file=name)
+    return data
+
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def read_json_items(path):
+    """Yields the items of a JSON array file one by one, so the array is never
+    held as Python objects all at once. Yields nothing if the file is missing;
+    raises ValueError if it is not a JSON array."""
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return
+    size = len(raw)
+    text = raw.decode()
+    del raw
+    pos = _SEPARATORS.match(text).end()
+    if text[pos:pos + 1] != "[":
+        raise ValueError(f"{path} does not hold a JSON array")
+    pos += 1
+    while True:
+        pos = _SEPARATORS.match(text, pos).end()
+        if text[pos:pos + 1] == "]":
+            break
+        item, pos = _decoder.raw_decode(text, pos)
+        yield item
+    name = _metric_file(path)
+    METADATA_LOAD_SECONDS.observe(time.perf_counter() - start, file=name)
+    METADATA_SIZE_BYTES.set(size, file=name)
+
+
+def write_json(path, data, indent=2):
+    """Writes JSON via a temp file + rename, so readers never see a half-written file."""
+    start = time.perf_counter()
+    raw = json.dumps(data, indent=indent).encode()
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(raw)
+    os.replace(tmp, path)
+    name = _metric_file(path)
+    METADATA_SAVE_SECONDS.observe(time.perf_counter() - start, file=name)
+    METADATA_SIZE_BYTES.set(len(raw), file=name)
+
+
+@contextmanager
+def locked_json(path, default):
+    """Read-modify-write of a JSON file under its lock.
+
+    Yields the current contents; whatever the block leaves in it is written
+    back when the block exits without an exception.
+    """
+    with file_lock(path):
+        data = read_json(path, default)
+        yield data
+        write_json(path, data)
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import ai_processor
+import auto_enrich
+from auto_enrich import AutoEnricher
+from scraper import InstaScraper
+from storage import locked_json
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Fake Gemini: records every image it is asked about."""
+    calls = Counter()
+    lock = threading.Lock()
+    failing = set()
+
+    def extract_attributes(path, caption=""):
+        post_id = os.path.splitext(os.path.basename(path))[0]
+        with lock:
+            calls[post_id] += 1
+        if extract_attributes.gate:
+            extract_attributes.gate.wait(5)
+        time.sleep(0.002)
+        return {"error": "500 boom"} if post_id in failing else {"title": post_id}
+
+    monkeypatch.setattr(ai_processor, "extract_attributes", extract_attributes)
+    extract_attributes.calls = calls
+    extract_attributes.failing = failing
+    extract_attributes.gate = None  # an Event every answer waits for
+    return extract_attributes
+
+
+def seed(storage, count, username="nasa"):
+    scraper = InstaScraper(storage)
+    scraper.catalog.add([{"post_id": f"p{i}", "username": username, "status": "pending",
+                          "image_path": f"/images/{username}/p{i}.jpg",
+                          "timestamp": f"2026-01-01T00:00:{i % 60:02d}"} for i in range(count)], "instagram")
+
+
+def enricher(storage, **kwargs):
+    # A scraper (and catalog) per enricher, as in separate worker processes
+    kwargs.setdefault("concurrency", 3)
+    return AutoEnricher(InstaScraper(storage), state_path=os.path.join(storage, "auto_enrich.json"), **kwargs)
+
+
+def age(storage, section):
+    # As if the claims' leases or the failures' retry delays had run out
+    with locked_json(os.path.join(storage, "auto_enrich.json"), {}) as state:
+        for entry in state[section].values():
+            entry["expires" if section == "claims" else "retry_at"] = 0
+
+
+def drain(*enrichers):
+    def run(e):
+        while e.run_once():
+            pass
+
+    threads = [threading.Thread(target=run, args=(e,)) for e in enrichers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_two_workers_process_each_post_once(tmp_path, model):
+    storage = str(tmp_path)
+    seed(storage, 60)
+    workers = [enricher(storage), enricher(storage)]
+    drain(*workers)
+    assert model.calls == Counter({f"p{i}": 1 for i in range(60)})
+    status = workers[0].status()
+    assert status["used"] == 60 and status["pending"] == 0 and status["claimed"] == []
+    assert workers[0].scraper.catalog.stats()["status"] == {"enriched": 60}
+
+
+def test_claim_sees_posts_finished_meanwhile(tmp_path, model):
+    storage = str(tmp_path)
+    seed(storage, 3)
+    first, second = enricher(storage), enricher(storage)
+    second_read, first_done = threading.Event(), threading.Event()
+    model.gate = second_read
+    read = second._pending
+
+    def stalled_pending():
+        # The second worker sees the posts as pending, then the first one finishes them
+        posts = read()
+        second_read.set()
+        first_done.wait(1)
+        return posts
+
+    second._pending = stalled_pending
+
+    def run_first():
+        first.run_once()
+        first_done.set()
+
+    thread = threading.Thread(target=run_first)
+    thread.start()
+    while not model.calls:
+        time.sleep(0.001)
+    assert second.run_once() == 0
+    thread.join()
+    assert model.calls == Counter({"p0": 1, "p1": 1, "p2": 1})
+
+
+def test_daily_budget_is_shared(tmp_path, model):
+    storage = str(tmp_path)
+    seed(storage, 20)
+    drain(enricher(storage, daily_budget=7), enricher(storage, daily_budget=7))
+    assert sum(model.calls.values()) == 7
+    assert enricher(storage).status()["used"] == 7
+
+
+def test_live_claims_are_skipped_and_expired_ones_taken(tmp_path, model):
+    storage = str(tmp_path)
+    seed(storage, 2)
+    first, second = enricher(storage, concurrency=1), enricher(storage, concurrency=1)
+    # The newest post is claimed by a worker that then dies
+    claimed = first._claim(1)
+    assert [p["post_id"] for p in claimed] == ["p1"]
+    assert second.run_once() == 1
+    assert second.run_once() == 0
+    assert model.calls == Counter({"p0": 1})
+    age(storage, "claims")
+    assert [p["post_id"] for p in second._claim(1)] == ["p1"]
+
+
+def test_failures_are_retried_later_and_capped(tmp_path, model):
+    storage = str(tmp_path)
+    seed(storage, 1)
+    model.failing.add("p0")
+    worker = enricher(storage)
+    assert worker.run_once() == 1
+    # Not retried before retry_at
+    assert worker.run_once() == 0
+    for _ in range(5):
+        age(storage, "failures")
+        worker.run_once()
+    assert model.calls["p0"] == auto_enrich.MAX_ATTEMPTS
+    assert worker.status()["failed"]["p0"]["count"] == auto_enrich.MAX_ATTEMPTS
+
+
+def test_weights_order_and_skip(tmp_path, model):
+    storage = str(tmp_path)
+    seed(storage, 2, "nasa")
+    InstaScraper(storage).catalog.add([{"post_id": "s0", "username": "spam", "status": "pending",
+                                        "image_path": "/images/spam/s0.jpg"},
+                                       {"post_id": "m0", "username": "memes", "status": "pending",
+                                        "image_path": "/images/memes/m0.jpg"}], "instagram")
+    worker = enricher(storage, concurrency=1, weights={"memes": 3, "spam": 0})
+    assert [p["post_id"] for p in worker._claim(2)] == ["m0", "p1"]
+    assert [p["post_id"] for p in worker._claim(5)] == ["p0"]
+    assert worker.status()["pending"] == 3
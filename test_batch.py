@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import ai_processor
+import annotate
+import batch
+from batch import BatchRunner
+from jobs import JobStore
+from scraper import InstaScraper
+from storage import write_json
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Fake Gemini and annotate API. The API accepts every post not in `rejected`."""
+    api = type("FakeAPI", (), {})()
+    api.asked, api.enriched, api.batches, api.rejected = [], [], [], set()
+    api.gate = None  # an Event every Gemini answer waits for
+    api.error = None  # raised by the next upload
+    lock = threading.Lock()
+
+    def extract_attributes(path, caption=""):
+        api.asked.append(path)
+        if api.gate:
+            api.gate.wait(5)
+        with lock:
+            api.enriched.append(os.path.splitext(os.path.basename(path))[0])
+        return {"title": "Alien", "actors": [{"name": "Sigourney Weaver"}]}
+
+    def upload_posts(posts, token, local_path):
+        assert token == "token"
+        with lock:
+            api.batches.append([p["post_id"] for p in posts])
+        if api.error:
+            raise api.error
+        done = [p["post_id"] for p in posts if p["post_id"] not in api.rejected]
+        return {"status": "success"}, done
+
+    monkeypatch.setattr(ai_processor, "extract_attributes", extract_attributes)
+    monkeypatch.setattr(annotate, "upload_posts", upload_posts)
+    monkeypatch.setattr(batch, "TICK_SECONDS", 0)
+    return api
+
+
+def runner(tmp_path, **kwargs):
+    kwargs.setdefault("batch_size", 3)
+    return BatchRunner(InstaScraper(str(tmp_path)), JobStore(str(tmp_path / "jobs")), **kwargs)
+
+
+def seed(runner, pending=5, enriched=2):
+    posts = [{"post_id": f"p{i}", "username": "nasa", "status": "pending"} for i in range(pending)]
+    posts += [{"post_id": f"e{i}", "username": "nasa", "status": "enriched", "ai_data": {"title": "Alien"}}
+              for i in range(enriched)]
+    for post in posts:
+        post["image_path"] = f"/images/nasa/{post['post_id']}.jpg"
+    runner.scraper.catalog.add(posts, "instagram")
+    return [p["post_id"] for p in posts]
+
+
+def finish(runner, job_id):
+    thread = runner._threads.get(job_id)
+    if thread:
+        thread.join(10)
+    return runner.jobs.get(job_id)
+
+
+def statuses(runner):
+    return {p["post_id"]: p["status"] for p in runner.scraper.catalog.posts()}
+
+
+def test_create(tmp_path, api):
+    batches = runner(tmp_path)
+    post_ids = seed(batches)
+    job = batches.create(post_ids + ["p0"], steps=["annotate", "enrich"], token="token")
+    assert job["kind"] == "batch" and job["steps"] == ["enrich", "annotate"] and job["total"] == 7
+    with open(batches._selection_path(job["id"])) as f:
+        assert json.load(f) == ["p0", "p1", "p2", "p3", "p4", "e0", "e1"]
+
+    job = finish(batches, job["id"])
+    assert job["status"] == "completed" and job["owner"] is None
+    assert {k: job[k] for k in ("current", "enriched", "annotated", "skipped", "failed")} == \
+           {"current": 7, "enriched": 5, "annotated": 7, "skipped": 0, "failed": 0}
+    assert sorted(api.enriched) == ["p0", "p1", "p2", "p3", "p4"]
+    assert sorted(sum(api.batches, [])) == sorted(post_ids)
+    assert max(len(b) for b in api.batches) == 3
+    assert set(statuses(batches).values()) == {"completed"}
+
+
+def test_create_needs_a_step(tmp_path, api):
+    with pytest.raises(ValueError):
+        runner(tmp_path).create(["p0"], steps=["publish"])
+
+
+def test_posts_not_accepted_are_retried_by_the_next_job(tmp_path, api):
+    batches = runner(tmp_path)
+    post_ids = seed(batches)
+    api.rejected = {"p1", "e0"}
+    job = finish(batches, batches.create(post_ids, token="token")["id"])
+    assert job["status"] == "completed"
+    assert job["annotated"] == 5 and job["failed"] == 2 and job["current"] == 7
+    assert any("not accepted by the API" in error for error in job["errors"])
+    # They keep their enrichment and stay "enriched"
+    assert statuses(batches)["p1"] == "enriched" and statuses(batches)["e0"] == "enriched"
+
+    api.rejected = set()
+    job = finish(batches, batches.create(post_ids, token="token")["id"])
+    assert job["annotated"] == 2 and job["skipped"] == 5 and job["failed"] == 0
+    assert sorted(api.enriched) == ["p0", "p1", "p2", "p3", "p4"]
+    assert set(statuses(batches).values()) == {"completed"}
+
+
+def test_failed_upload_is_counted(tmp_path, api):
+    batches = runner(tmp_path, batch_size=10)
+    post_ids = seed(batches, pending=0)
+    api.error = ConnectionError("API down")
+    job = finish(batches, batches.create(post_ids, token="token")["id"])
+    assert job["status"] == "completed" and job["failed"] == 2 and job["annotated"] == 0
+    assert job["errors"] == ["annotate batch of 2: 2 API down"]
+
+
+def test_pause_and_resume(tmp_path, api):
+    batches = runner(tmp_path, enrich_concurrency=1)
+    post_ids = seed(batches, pending=6, enriched=0)
+    api.gate = threading.Event()
+    job = batches.create(post_ids, steps=["enrich"])
+    while not api.asked:
+        time.sleep(0.001)
+    batches.pause(job["id"])
+    api.gate.set()
+    paused = finish(batches, job["id"])
+    assert paused["status"] == "paused"
+    # What was enriched before the pause is stored; the rest is left for the next pass
+    done = len(api.enriched)
+    assert 0 < done < 6 and paused["enriched"] == paused["current"] == done
+    assert list(statuses(batches).values()).count("enriched") == done
+    with pytest.raises(ValueError):
+        batches.pause(job["id"])
+
+    batches.resume(job["id"])
+    job = finish(batches, job["id"])
+    assert job["status"] == "completed"
+    # `enriched` adds up over both passes; `current` and `skipped` count the last one
+    assert job["enriched"] == 6 and job["current"] == 6 and job["skipped"] == done
+    assert sorted(api.enriched) == sorted(post_ids)
+
+
+def test_watch_takes_over_abandoned_jobs(tmp_path, api):
+    batches = runner(tmp_path)
+    post_ids = seed(batches, pending=2, enriched=0)
+    jobs = batches.jobs
+    # One job whose runner died a while ago, one whose runner is alive elsewhere
+    for owner, heartbeat in (("dead", time.time() - batch.LEASE_SECONDS), ("alive", time.time())):
+        job = jobs.create("batch", steps=["enrich"], total=2, current=0, owner=owner, heartbeat=heartbeat)
+        write_json(batches._selection_path(job["id"]), post_ids)
+        if owner == "dead":
+            abandoned = job["id"]
+        else:
+            live = job["id"]
+    batches.watch()
+    try:
+        deadline = time.time() + 10
+        while jobs.get(abandoned)["status"] == "running" and time.time() < deadline:
+            time.sleep(0.01)
+        assert finish(batches, abandoned)["status"] == "completed"
+        assert jobs.get(live)["owner"] == "alive" and live not in batches._threads
+    finally:
+        batches.stop()
+    assert sorted(api.enriched) == ["p0", "p1"]
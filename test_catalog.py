@@ -0,0 +1,72 @@
+import json
+
+from catalog import Catalog, _tally
+from storage import write_json
+
+EMPTY = {"total": 0, "status": {}, "source": {}, "account": {}}
+
+
+def post(post_id, username="nasa", status="pending"):
+    return {"post_id": post_id, "username": username, "status": status, "image_path": f"/images/{username}/{post_id}.jpg"}
+
+
+def recount(catalog):
+    stats = catalog._count(catalog.posts(), [], None)
+    stats.pop("catalog")
+    return stats
+
+
+def test_tally_adds_and_removes_keys():
+    stats = json.loads(json.dumps(EMPTY))
+    _tally(stats, ("pending", "instagram", "nasa"), 1)
+    _tally(stats, ("enriched", "instagram", "nasa"), 1)
+    assert stats == {
+        "total": 2,
+        "status": {"pending": 1, "enriched": 1},
+        "source": {"instagram": {"total": 2, "pending": 1, "enriched": 1}},
+        "account": {"nasa": {"total": 2, "pending": 1, "enriched": 1}},
+    }
+    _tally(stats, ("pending", "instagram", "nasa"), -1)
+    assert stats["status"] == {"enriched": 1}
+    assert stats["account"]["nasa"] == {"total": 1, "enriched": 1}
+    _tally(stats, ("enriched", "instagram", "nasa"), -1)
+    assert stats == EMPTY
+
+
+def test_tally_ignores_absent_post_and_names_missing_groups():
+    stats = json.loads(json.dumps(EMPTY))
+    _tally(stats, None, 1)
+    assert stats == EMPTY
+    _tally(stats, ("pending", None, None), 1)
+    assert stats["source"] == {"unknown": {"total": 1, "pending": 1}}
+    assert stats["account"] == {"unknown": {"total": 1, "pending": 1}}
+
+
+def test_writes_keep_counts_in_step(tmp_path):
+    catalog = Catalog(str(tmp_path))
+    catalog.add([post("a"), post("b"), post("c", "esa")], "instagram")
+    catalog.add([post("u", "Manual Upload")], "upload")
+    catalog.update(["a"], lambda p: p.update(status="enriched") or True)
+    assert catalog.stats() == recount(catalog)
+    assert catalog.stats()["status"] == {"pending": 3, "enriched": 1}
+    assert catalog.stats()["source"]["upload"] == {"total": 1, "pending": 1}
+
+    catalog.update(["c"], lambda p: False)
+    assert "esa" not in catalog.stats()["account"]
+    catalog.remove_where(lambda p: p["source"] == "upload")
+    assert set(catalog.stats()["source"]) == {"instagram"}
+    assert catalog.stats() == recount(catalog)
+
+
+def test_counts_go_to_zero(tmp_path):
+    catalog = Catalog(str(tmp_path))
+    catalog.add([post("a"), post("b", "esa", "enriched")], "instagram")
+    catalog.update(["a", "b"], lambda p: False)
+    assert catalog.stats() == EMPTY
+
+
+def test_counts_rebuilt_after_outside_write(tmp_path):
+    catalog = Catalog(str(tmp_path))
+    catalog.add([post("a")], "instagram")
+    write_json(catalog.path, [dict(post("a"), source="instagram"), dict(post("b", "esa"), source="instagram")])
+    assert catalog.stats()["account"] == {"nasa": {"total": 1, "pending": 1}, "esa": {"total": 1, "pending": 1}}
@@ -0,0 +1,65 @@
+import changelog
+from catalog import Catalog
+from changelog import ChangeLog
+
+
+def test_since_coalesces_to_net_change(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes.json"))
+    log.record([("insert", "a"), ("insert", "b")], None, "k1")
+    log.record([("update", "a"), ("insert", "c")], "k1", "k2")
+    log.record([("delete", "b"), ("delete", "c"), ("update", "a")], "k2", "k3")
+
+    revision, net = log.since(0)
+    assert revision == 3
+    # b and c were inserted and deleted since revision 0: nothing to report
+    assert net == [("insert", "a")]
+
+    # After revision 1: c came and went, b (inserted before) is gone
+    revision, net = log.since(1)
+    assert net == [("delete", "b"), ("update", "a")]
+    assert log.since(3) == (3, [])
+
+
+def test_since_orders_by_last_change(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes.json"))
+    log.record([("insert", "a"), ("insert", "b")], None, "k1")
+    log.record([("update", "a")], "k1", "k2")
+    assert log.since(1)[1] == [("update", "a")]
+    log.record([("update", "b")], "k2", "k3")
+    log.record([("update", "a")], "k3", "k4")
+    assert log.since(1)[1] == [("update", "b"), ("update", "a")]
+
+
+def test_since_resets_when_out_of_range(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes.json"))
+    log.record([("insert", "a")], None, "k1")
+    log.record([("update", "a")], "k1", "k2")
+    assert log.since(5) == (2, None)
+    # posts.json written outside the catalog: clients from before have to reload
+    log.record([], "other", "k3")
+    assert log.since(2) == (3, None)
+    assert log.since(3) == (3, [])
+
+
+def test_since_resets_after_entries_are_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(changelog, "LOG_SIZE", 3)
+    log = ChangeLog(str(tmp_path / "changes.json"))
+    for revision in range(1, 5):
+        log.record([("insert", f"p{revision}")], f"k{revision - 1}" if revision > 1 else None, f"k{revision}")
+    # Revision 1's entry is gone: only clients at revision 1 or later can catch up
+    assert log.since(0) == (4, None)
+    assert log.since(1)[1] == [("insert", "p2"), ("insert", "p3"), ("insert", "p4")]
+
+
+def test_catalog_changes(tmp_path):
+    catalog = Catalog(str(tmp_path))
+    catalog.add([{"post_id": "a", "username": "nasa", "image_path": "/images/nasa/a.jpg"},
+                 {"post_id": "b", "username": "nasa", "image_path": "/images/nasa/b.jpg"}], "instagram")
+    start = catalog.revision()
+    catalog.update(["a"], lambda p: p.update(status="enriched") or True)
+    catalog.update(["b"], lambda p: False)
+    result = catalog.changes(start)
+    assert result["revision"] == start + 2
+    assert [(c["op"], c["post_id"]) for c in result["changes"]] == [("update", "a"), ("delete", "b")]
+    assert result["changes"][0]["post"]["status"] == "enriched"
+    assert result["changes"][1]["post"] is None
@@ -0,0 +1,63 @@
+from exporter import ExportFilter, flatten
+
+POST = {
+    "post_id": "ABC123",
+    "post_url": "https://www.instagram.com/p/ABC123/",
+    "username": "nasa",
+    "source": "instagram",
+    "status": "enriched",
+    "caption": "hello",
+    "timestamp": "2026-01-01T00:00:00",
+    "updated_at": 1767225600.5,
+    "image_path": "/images/nasa/ABC123.jpg",
+    "sha256": "ab" * 32,
+    "ai_data": {
+        "title": "Alien",
+        "releaseYear": 1979,
+        "actors": [{"name": "Sigourney Weaver"}, "John Hurt"],
+        "tags": [{"name": "space", "category": "setting"}],
+        "relatedEmotions": ["dread"],
+    },
+}
+
+
+def test_flatten_maps_post_fields():
+    row = flatten(POST)
+    assert row["url"] == "https://www.instagram.com/p/ABC123/"
+    assert row["post_id"] == "ABC123"
+    assert row["updated_at"] == 1767225600.5
+    assert row["published_at"] > 0
+    assert row["title"] == "Alien"
+    assert row["release_year"] == "1979"
+    assert row["actors"] == ["Sigourney Weaver", "John Hurt"]
+    assert row["tags"] == ["space"]
+    assert row["tag_categories"] == ["setting"]
+    assert row["related_emotions"] == ["dread"]
+    assert '"title": "Alien"' in row["ai_data"]
+
+
+def test_flatten_without_ai_data():
+    row = flatten({"post_id": "up_1", "source": "upload", "timestamp": 0})
+    assert row["url"] is None
+    assert row["published_at"] is None
+    assert row["actors"] == [] and row["tags"] == []
+    assert row["ai_data"] is None
+
+
+def test_filter_by_status_username_and_source():
+    assert ExportFilter(status=["enriched"], usernames=["nasa"], source="instagram")(POST)
+    assert not ExportFilter(status=["pending"])(POST)
+    assert not ExportFilter(usernames=["esa"])(POST)
+    assert not ExportFilter(source="upload")(POST)
+
+
+def test_filter_since_is_exclusive():
+    assert ExportFilter(since=1767225600)(POST)
+    assert not ExportFilter(since=1767225600.5)(POST)
+    assert not ExportFilter(since=1767225600)({"post_id": "old"})
+
+
+def test_filter_by_publish_date():
+    assert ExportFilter(date_from="2025-12-31", date_to="2026-01-02")(POST)
+    assert not ExportFilter(date_from="2026-01-02")(POST)
+    assert not ExportFilter(date_to="2025-12-31")(POST)
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+import migrate_blobs
+from blobstore import BlobStore
+from migrate_blobs import migrate
+from storage import write_json
+
+IMAGE = b"\xff\xd8\xff\xe0 one image"
+OTHER = b"\xff\xd8\xff\xe0 another image"
+
+
+def legacy_store(tmp_path):
+    """Three scraped posts in the flat layout, two of them the same image."""
+    folder = tmp_path / "instagram" / "nasa"
+    folder.mkdir(parents=True)
+    for post_id, data in (("a", IMAGE), ("b", IMAGE), ("c", OTHER)):
+        (folder / f"{post_id}.jpg").write_bytes(data)
+    write_json(str(tmp_path / "posts.json"), [
+        {"post_id": p, "username": "nasa", "source": "instagram", "status": "pending",
+         "image_path": f"/images/nasa/{p}.jpg"} for p in "abc"])
+    return folder
+
+
+def refs(tmp_path, data):
+    digest = hashlib.sha256(data).hexdigest()
+    with open(tmp_path / "blobs" / digest[:2] / "refs.json") as f:
+        return json.load(f).get(digest, {}).get("refs", 0)
+
+
+def posts(tmp_path):
+    with open(tmp_path / "posts.json") as f:
+        return {p["post_id"]: p for p in json.load(f)}
+
+
+def test_migrate_counts_refs_and_is_idempotent(tmp_path):
+    folder = legacy_store(tmp_path)
+    stats = migrate(str(tmp_path))
+    assert stats == {"migrated": 3, "already": 0, "missing": 0, "duplicates": 1, "bytes_saved": len(IMAGE)}
+    assert refs(tmp_path, IMAGE) == 2 and refs(tmp_path, OTHER) == 1
+    assert os.listdir(folder) == []
+    stored = posts(tmp_path)
+    assert stored["a"]["local_path"] == stored["b"]["local_path"]
+    with open(stored["c"]["local_path"], "rb") as f:
+        assert f.read() == OTHER
+
+    again = migrate(str(tmp_path))
+    assert again["migrated"] == 0 and again["already"] == 3
+    assert refs(tmp_path, IMAGE) == 2 and refs(tmp_path, OTHER) == 1
+    assert posts(tmp_path) == stored
+
+
+def test_keep_legacy_and_dry_run(tmp_path):
+    folder = legacy_store(tmp_path)
+    assert migrate(str(tmp_path), dry_run=True)["migrated"] == 3
+    assert "sha256" not in posts(tmp_path)["a"]
+    migrate(str(tmp_path), keep_legacy=True)
+    assert sorted(os.listdir(folder)) == ["a.jpg", "b.jpg", "c.jpg"]
+    assert os.path.samefile(folder / "c.jpg", posts(tmp_path)["c"]["local_path"])
+
+
+def test_interrupted_migration_loses_nothing(tmp_path, monkeypatch):
+    folder = legacy_store(tmp_path)
+
+    def crash(path, data, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(migrate_blobs, "write_json", crash)
+    with pytest.raises(OSError):
+        migrate(str(tmp_path))
+    # The catalog was not written, so the legacy files must still be there
+    assert sorted(os.listdir(folder)) == ["a.jpg", "b.jpg", "c.jpg"]
+    assert "sha256" not in posts(tmp_path)["a"]
+
+    monkeypatch.undo()
+    migrate(str(tmp_path))
+    assert os.listdir(folder) == []
+    for post in posts(tmp_path).values():
+        assert os.path.isfile(post["local_path"])
+
+
+def test_leftovers_of_interrupted_unlink_are_removed(tmp_path, monkeypatch):
+    folder = legacy_store(tmp_path)
+    monkeypatch.setattr(migrate_blobs.os, "remove", lambda path: None)
+    migrate(str(tmp_path))
+    monkeypatch.undo()
+    assert sorted(os.listdir(folder)) == ["a.jpg", "b.jpg", "c.jpg"]
+    stats = migrate(str(tmp_path))
+    assert stats["already"] == 3
+    assert os.listdir(folder) == []
+
+
+def test_blobstore_refcounts(tmp_path):
+    blobs = BlobStore(str(tmp_path / "blobs"))
+    digest, path = blobs.put(IMAGE, ".jpg")
+    assert blobs.put(IMAGE, ".png") == (digest, path)  # same bytes: first extension kept
+    assert path.endswith(f"{digest[:2]}/{digest[2:4]}/{digest}.jpg")
+    assert blobs.find(digest) == path
+    assert blobs.release(digest) is False and os.path.exists(path)
+    assert blobs.release(digest) is True and not os.path.exists(path)
+    assert blobs.find(digest) is None
+    assert blobs.release(digest) is False
+
+
+def test_blobstore_set_refs_compares(tmp_path):
+    blobs = BlobStore(str(tmp_path / "blobs"))
+    digest, path = blobs.put(IMAGE, ".jpg")
+    assert blobs.set_refs(digest, 3, ".jpg", expected=2) is False
+    assert blobs.set_refs(digest, 3, ".jpg", expected=1) is True
+    assert refs(tmp_path, IMAGE) == 3
+    assert blobs.set_refs(digest, 0, ".jpg", expected=3) is True
+    assert not os.path.exists(path) and blobs.find(digest) is None
+
+
+def test_blobstore_splits_legacy_refs(tmp_path):
+    root = tmp_path / "blobs"
+    digest = hashlib.sha256(IMAGE).hexdigest()
+    path = root / digest[:2] / digest[2:4] / f"{digest}.jpg"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(IMAGE)
+    write_json(str(root / "refs.json"), {digest: {"ext": ".jpg", "refs": 2}})
+    blobs = BlobStore(str(root))
+    assert not (root / "refs.json").exists()
+    assert blobs.find(digest) == str(path)
+    assert refs(tmp_path, IMAGE) == 2
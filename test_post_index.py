@@ -0,0 +1,76 @@
+import copy
+import json
+
+from catalog import Catalog
+from post_index import PostIndex, PostRecord
+
+POST = {
+    "post_id": "ABC",
+    "post_url": "https://www.instagram.com/p/ABC/",
+    "caption": "café",
+    "username": "nasa",
+    "source": "instagram",
+    "status": "enriched",
+    "image_path": "/images/nasa/ABC.jpg",
+    "thumb_path": "/thumbnails/nasa/ABC.jpg",
+    "sha256": "ab" * 32,
+    "timestamp": "2026-01-01T00:00:00",
+    "updated_at": 1767225600.0,
+    "ai_data": {"title": "Alien", "actors": [{"name": "Sigourney Weaver"}]},
+}
+
+
+def test_record_matches_dict():
+    record = PostRecord(copy.deepcopy(POST))
+    assert record.to_dict() == POST
+    assert dict(record) == POST
+    assert json.loads(record.to_json()) == POST
+    assert len(record) == len(POST)
+    assert record["status"] == "enriched" and record.get("caption") == "café"
+    assert record.ai_data == POST["ai_data"]
+    assert record.matches(POST)
+    assert not record.matches(dict(POST, updated_at=POST["updated_at"] + 1))
+
+
+def test_record_missing_fields():
+    record = PostRecord({"post_id": "up_1", "status": "pending"})
+    assert record.to_dict() == {"post_id": "up_1", "status": "pending"}
+    assert json.loads(record.to_json()) == {"post_id": "up_1", "status": "pending"}
+    assert "ai_data" not in record and "sha256" not in record
+    assert record.get("sha256") is None and record.ai_data is None
+    assert PostRecord({"post_id": "x", "ai_data": {}}).to_json() == '{"post_id":"x","ai_data":{}}'
+    assert PostRecord({"ai_data": {}}).to_json() == '{"ai_data":{}}'
+
+
+def test_index_buckets():
+    posts = [dict(POST, post_id="a", image_path="/images/nasa/a.jpg"),
+             dict(POST, post_id="b", status="pending", username="esa"),
+             {"post_id": "c", "source": "upload", "username": "Manual Upload"}]
+    index = PostIndex(copy.deepcopy(posts))
+    assert [p.post_id for p in index.posts] == ["a", "b", "c"]
+    assert index.by_image["/images/nasa/a.jpg"].post_id == "a"
+    assert [p.post_id for p in index.by_status[(None, "pending")]] == ["b", "c"]
+    assert [p.post_id for p in index.select("pending", "upload")] == ["c"]
+    assert [p.post_id for p in index.select("pending", usernames=["esa", "nasa"])] == ["b"]
+    assert json.loads(index.to_json(index.posts)) == [PostRecord(copy.deepcopy(p)).to_dict() for p in posts]
+
+
+def test_index_reuses_unchanged_records():
+    posts = [dict(POST, post_id="a"), dict(POST, post_id="b")]
+    first = PostIndex(copy.deepcopy(posts))
+    changed = copy.deepcopy(posts)
+    changed[1]["updated_at"] += 1
+    second = PostIndex(changed, previous=first)
+    assert second.by_id["a"] is first.by_id["a"]
+    assert second.by_id["b"] is not first.by_id["b"]
+
+
+def test_catalog_reload_reuses_records(tmp_path):
+    catalog = Catalog(str(tmp_path))
+    catalog.add([{"post_id": p, "username": "nasa", "image_path": f"/images/nasa/{p}.jpg"} for p in "abc"],
+                "instagram")
+    before = {p.post_id: p for p in catalog.posts()}
+    catalog.update(["b"], lambda p: p.update(status="enriched") or True)
+    after = {p.post_id: p for p in catalog.posts()}
+    assert after["a"] is before["a"] and after["c"] is before["c"]
+    assert after["b"] is not before["b"] and after["b"]["status"] == "enriched"
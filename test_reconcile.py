@@ -0,0 +1,165 @@
+import io
+import os
+import time
+
+from PIL import Image
+
+from reconcile import GRACE_SECONDS, Reconciler
+from scraper import InstaScraper
+from storage import locked_json
+
+
+def png(seed):
+    buf = io.BytesIO()
+    Image.new("RGB", (16, 16), (seed, 0, 0)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def store(tmp_path, count=3):
+    """`count` scraped posts of nasa, each with its blob and thumbnail."""
+    scraper = InstaScraper(str(tmp_path))
+    os.makedirs(tmp_path / "thumbnails" / "nasa")
+    records = []
+    for i in range(count):
+        digest, path = scraper.blobs.put(png(i), ".png")
+        (tmp_path / "thumbnails" / "nasa" / f"p{i}.jpg").write_bytes(png(100 + i))
+        records.append({"post_id": f"p{i}", "username": "nasa", "status": "pending",
+                        "image_path": f"/images/nasa/p{i}.jpg", "thumb_path": f"/thumbnails/nasa/p{i}.jpg",
+                        "local_path": path, "sha256": digest})
+    scraper.catalog.add(records, "instagram")
+    return scraper
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def age(root):
+    # As if everything under `root` had been written before the grace period
+    old = time.time() - GRACE_SECONDS - 60
+    for folder, dirs, files in os.walk(root):
+        for name in dirs + files:
+            os.utime(os.path.join(folder, name), (old, old))
+
+
+def test_clean_store(tmp_path):
+    report = Reconciler(store(tmp_path)).run()
+    assert set(report["counts"].values()) == {0}
+    assert report["files"]["thumbnails"] == 3
+
+
+def test_orphans(tmp_path):
+    scraper = store(tmp_path)
+    digest = "ab" * 32
+    write(str(tmp_path / "blobs" / "ab" / "ab" / f"{digest}.png"), png(50))
+    write(str(tmp_path / "tmp" / "upload.part"), b"half")
+    write(str(tmp_path / "instagram" / "nasa" / "stray.jpg"), png(51))
+    write(str(tmp_path / "thumbnails" / "nasa" / "gone.jpg"), png(52))
+    # Carousel parts and other files named after a post are its, not orphans
+    write(str(tmp_path / "instagram" / "nasa" / "p0_1.jpg"), png(53))
+    write(str(tmp_path / "instagram" / "nasa" / "p1.webp"), png(54))
+    report = Reconciler(scraper).run()
+    assert sorted(report["orphans"]) == sorted(os.path.join(*parts) for parts in [
+        ("blobs", "ab", "ab", f"{digest}.png"), ("tmp", "upload.part"),
+        ("instagram", "nasa", "stray.jpg"), ("thumbnails", "nasa", "gone.jpg")])
+    assert report["counts"]["orphans"] == 4
+
+
+def test_repair_keeps_orphans_during_grace_period(tmp_path):
+    scraper = store(tmp_path)
+    blob = write(str(tmp_path / "blobs" / "ab" / "ab" / f"{'ab' * 32}.png"), png(50))
+    temp = write(str(tmp_path / "tmp" / "upload.part"), b"half")
+    stray = write(str(tmp_path / "instagram" / "nasa" / "stray.jpg"), png(51))
+    reconciler = Reconciler(scraper)
+
+    # Young files may belong to an ingest still in progress
+    assert reconciler.run(repair=True)["repaired"]["orphans_removed"] == 0
+    assert all(os.path.exists(p) for p in (blob, temp, stray))
+
+    age(tmp_path)
+    assert reconciler.run(repair=True)["repaired"]["orphans_removed"] == 2
+    assert not os.path.exists(blob) and not os.path.exists(temp)
+    # Flat images may be the only copy of something: only removed when asked
+    assert os.path.exists(stray)
+    assert reconciler.run(repair=True, delete_unreferenced=True)["repaired"]["orphans_removed"] == 1
+    assert not os.path.exists(stray)
+    assert reconciler.run()["counts"]["orphans"] == 0
+
+
+def test_repair(tmp_path):
+    scraper = store(tmp_path, 4)
+    posts = {p["post_id"]: p for p in scraper.catalog.posts()}
+    # p0 points at a path that is gone, p1 lost its thumbnail, p2 its image
+    scraper.catalog.update(["p0"], lambda p: p.update(local_path=str(tmp_path / "blobs" / "gone.png")) or True)
+    os.remove(tmp_path / "thumbnails" / "nasa" / "p1.jpg")
+    os.remove(posts["p2"]["local_path"])
+    # p3's blob counts one reference too many
+    digest = posts["p3"]["sha256"]
+    with locked_json(str(tmp_path / "blobs" / digest[:2] / "refs.json"), {}) as refs:
+        refs[digest]["refs"] = 2
+    age(tmp_path)
+
+    reconciler = Reconciler(scraper)
+    report = reconciler.run()
+    assert report["stale_paths"] == ["p0"]
+    assert report["missing_thumbnails"] == ["p1"]
+    assert report["dangling"] == ["p2"]
+    assert report["refcounts"] == [{"sha256": digest, "stored": 2, "expected": 1}]
+
+    report = reconciler.run(repair=True, drop_dangling=True)
+    assert report["repaired"] == {"relinked": 1, "refcounts": 1, "orphans_removed": 0, "thumbnails": 1, "dropped": 1}
+    assert scraper.catalog.get("p0")["local_path"] == posts["p0"]["local_path"]
+    assert os.path.isfile(tmp_path / "thumbnails" / "nasa" / "p1.jpg")
+    assert scraper.catalog.get("p2") is None
+    assert set(reconciler.run()["counts"].values()) == {0}
+
+
+def test_refcounts_of_young_shards_are_not_lowered(tmp_path):
+    scraper = store(tmp_path, 1)
+    digest = scraper.catalog.posts()[0]["sha256"]
+    # A new post takes its blob reference before it is in the catalog
+    scraper.blobs.put(png(0), ".png")
+    reconciler = Reconciler(scraper)
+    assert reconciler.run(repair=True)["repaired"]["refcounts"] == 0
+    age(tmp_path)
+    assert reconciler.run(repair=True)["repaired"]["refcounts"] == 1
+    assert scraper.blobs.release(digest) is True
+
+
+def test_unchanged_folders_are_not_listed_again(tmp_path):
+    scraper = store(tmp_path)
+    age(tmp_path)
+    reconciler = Reconciler(scraper)
+    first = reconciler.run()
+    assert first["checked"] == 6 and first["listed_dirs"] > 0
+
+    again = reconciler.run()
+    assert again["listed_dirs"] == 0 and again["checked"] == 0
+
+    # A new file changes its folder's mtime: only that folder is listed
+    write(str(tmp_path / "thumbnails" / "nasa" / "extra.jpg"), png(60))
+    report = reconciler.run()
+    assert report["listed_dirs"] == 1 and report["checked"] == 1
+
+    assert reconciler.run(full=True)["checked"] == 7
+
+
+def test_file_changed_in_place_is_checked_again(tmp_path):
+    scraper = store(tmp_path)
+    age(tmp_path)
+    reconciler = Reconciler(scraper)
+    reconciler.run()
+    post = scraper.catalog.get("p0")
+    folder = os.path.dirname(post["local_path"])
+    mtime = os.stat(folder).st_mtime_ns
+    with open(post["local_path"], "r+b") as f:
+        f.truncate(20)
+    # Writing into a file leaves its folder's mtime alone
+    assert os.stat(folder).st_mtime_ns == mtime
+
+    report = reconciler.run()
+    assert report["listed_dirs"] == 0 and report["checked"] == 1
+    assert [item["post_ids"] for item in report["corrupt"]] == [["p0"]]
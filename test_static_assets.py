@@ -0,0 +1,56 @@
+import pytest
+
+from static_assets import VERSION_LENGTH, Asset, StaticAssets, accepted_encodings
+
+BODY = b"body { color: red; }" * 50
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, {}),
+    ("gzip, br", {"gzip": 1.0, "br": 1.0}),
+    ("br;q=0, gzip;q=0.5", {"br": 0.0, "gzip": 0.5}),
+    ("GZIP ; Q=0.8,,identity", {"gzip": 0.8, "identity": 1.0}),
+    ("br;q=high", {"br": 0.0}),
+])
+def test_accepted_encodings(header, expected):
+    assert accepted_encodings(header) == expected
+
+
+@pytest.mark.parametrize("header, encoding", [
+    (None, None),
+    ("identity", None),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0.5, gzip;q=0.9", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.2, br;q=0", "gzip"),
+    ("xbr, gzipx", None),
+])
+def test_encoded(header, encoding):
+    asset = Asset("site.css", 0, BODY)
+    asset.br = asset.br or b"brotli body"  # brotli is optional
+    body, chosen = asset.encoded(header)
+    assert chosen == encoding
+    assert body == {"br": asset.br, "gzip": asset.gzip, None: BODY}[encoding]
+
+
+def test_encoded_without_brotli():
+    asset = Asset("site.css", 0, BODY)
+    asset.br = None
+    assert asset.encoded("br") == (BODY, None)
+    assert asset.encoded("br, gzip;q=0.1") == (asset.gzip, "gzip")
+
+
+def test_index_urls_carry_the_asset_version(tmp_path):
+    (tmp_path / "index.html").write_text('<link href="/static/site.css"><script src="/static/missing.js"></script>')
+    (tmp_path / "site.css").write_bytes(BODY)
+    assets = StaticAssets(str(tmp_path))
+    css = assets.get("site.css")
+    assert len(css.version) == VERSION_LENGTH and css.digest.startswith(css.version)
+    assert assets.index().body.decode() == \
+        f'<link href="/static/site.css?v={css.version}"><script src="/static/missing.js"></script>'
+
+
+def test_no_index(tmp_path):
+    assert StaticAssets(str(tmp_path)).index() is None
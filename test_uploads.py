@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from uploads import UploadedFile, receive_files, sniff
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 60
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 60
+
+
+@pytest.mark.parametrize("head, ext", [
+    (JPEG, ".jpg"),
+    (PNG, ".png"),
+    (b"GIF87a" + b"\x00" * 6, ".gif"),
+    (b"GIF89a" + b"\x00" * 6, ".gif"),
+    (b"RIFF\x10\x00\x00\x00WEBPVP8 ", ".webp"),
+    (b"RIFF\x10\x00\x00\x00WAVEfmt ", None),
+    (b"<svg xmlns=", None),
+    (b"", None),
+])
+def test_sniff(head, ext):
+    assert sniff(head) == ext
+
+
+def test_uploaded_file_hashes_while_writing(tmp_path):
+    path = str(tmp_path / "a.part")
+    upload = UploadedFile("a.jpg", path, max_bytes=1000)
+    # Chunks smaller than the sniffed head are fine
+    for i in range(0, len(JPEG), 5):
+        upload.write(JPEG[i:i + 5])
+    upload.close()
+    assert upload.error is None
+    assert upload.size == len(JPEG)
+    assert upload.sha256 == hashlib.sha256(JPEG).hexdigest()
+    with open(path, "rb") as f:
+        assert f.read() == JPEG
+
+
+def test_uploaded_file_rejects_non_images(tmp_path):
+    path = str(tmp_path / "a.part")
+    upload = UploadedFile("a.txt", path, max_bytes=1000)
+    upload.write(b"hello, this is text")
+    assert upload.error == "not a JPEG, PNG, GIF or WebP image"
+    assert not os.path.exists(path)
+    upload.write(b"more")
+    upload.close()
+    assert upload.size == 0
+
+
+def test_uploaded_file_rejects_short_non_images_on_close(tmp_path):
+    path = str(tmp_path / "a.part")
+    upload = UploadedFile("a.bin", path, max_bytes=1000)
+    upload.write(b"abc")
+    assert upload.error is None
+    upload.close()
+    assert upload.error is not None
+    assert not os.path.exists(path)
+
+
+def test_uploaded_file_size_limit(tmp_path):
+    path = str(tmp_path / "a.part")
+    upload = UploadedFile("a.png", path, max_bytes=len(PNG) - 1)
+    upload.write(PNG)
+    assert upload.error == f"larger than {len(PNG) - 1} bytes"
+    assert not os.path.exists(path)
+
+
+class FakeRequest:
+    def __init__(self, body, boundary=b"XyZ"):
+        self.headers = {"content-type": f"multipart/form-data; boundary={boundary.decode()}"}
+        self.body = body
+
+    async def stream(self):
+        for i in range(0, len(self.body), 7):
+            yield self.body[i:i + 7]
+
+
+def multipart(parts, boundary=b"XyZ"):
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += b"--" + boundary + b"\r\nContent-Disposition: " + disposition.encode() + b"\r\n\r\n" + data + b"\r\n"
+    return body + b"--" + boundary + b"--\r\n"
+
+
+def test_receive_files(tmp_path):
+    body = multipart([("note", None, b"plain field"), ("files", "a.jpg", JPEG), ("files", "b.txt", b"not an image"),
+                      ("files", "c.png", PNG), ("files", "d.jpg", JPEG)])
+    files = asyncio.run(receive_files(FakeRequest(body), str(tmp_path), max_bytes=1000, max_files=2))
+    assert [f.filename for f in files] == ["a.jpg", "b.txt", "c.png", "d.jpg"]
+    assert files[0].error is None and files[0].sha256 == hashlib.sha256(JPEG).hexdigest()
+    assert files[1].error == "not a JPEG, PNG, GIF or WebP image"
+    # Rejected parts do not count towards the limit
+    assert files[2].error is None
+    assert files[3].error == "more than 2 files in one request"
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(f.path) for f in files[:3:2])
+
+
+def test_receive_files_needs_multipart(tmp_path):
+    request = FakeRequest(b"")
+    request.headers = {"content-type": "application/json"}
+    with pytest.raises(ValueError):
+        asyncio.run(receive_files(request, str(tmp_path)))
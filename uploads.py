@@ -0,0 +1,161 @@
+import hashlib
+import os
+import uuid
+
+# Per-file and per-request limits of POST /api/uploads
+MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "500"))
+
+# Leading bytes of the accepted image formats
+MAGIC = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+
+def sniff(head):
+    """Returns the file extension for the image format `head` starts with, or None."""
+    for prefix, ext in MAGIC:
+        if head.startswith(prefix):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+class UploadedFile:
+    """One file part, written to disk chunk by chunk while it is hashed.
+
+    Writing stops as soon as the part turns out not to be an image or grows
+    past the size limit; `error` then says why.
+    """
+
+    def __init__(self, filename, path, max_bytes):
+        self.filename = filename
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.error = None
+        self._head = b""
+        self._hash = hashlib.sha256()
+        self._file = open(path, 'wb')
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def write(self, data):
+        if self.error:
+            return
+        if len(self._head) < 12:
+            self._head += data[:12 - len(self._head)]
+            if len(self._head) >= 12 and sniff(self._head) is None:
+                self.reject("not a JPEG, PNG, GIF or WebP image")
+                return
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.reject(f"larger than {self.max_bytes} bytes")
+            return
+        self._file.write(data)
+        self._hash.update(data)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        if not self.error and sniff(self._head) is None:
+            self.reject("not a JPEG, PNG, GIF or WebP image")
+
+    def reject(self, reason):
+        self.error = reason
+        self.close()
+        self.discard()
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def receive_files(request, tmp_dir, max_bytes=MAX_FILE_BYTES, max_files=MAX_FILES):
+    """Streams the file parts of a multipart request into `tmp_dir`.
+
+    The body is parsed as it arrives, so only one chunk is held in memory;
+    parsing and the file writes run in the threadpool, off the event loop.
+    Returns the UploadedFile of every part that has a filename (including
+    rejected ones, with `error` set). `max_files` counts accepted files.
+    """
+    from starlette.concurrency import run_in_threadpool
+
+    try:
+        from python_multipart.multipart import MultipartParser, parse_options_header
+    except ImportError:
+        from multipart.multipart import MultipartParser, parse_options_header
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise ValueError("Expected a multipart/form-data body")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    files = []
+    accepted = 0
+    part = {"headers": {}, "field": b"", "value": b"", "file": None}
+
+    def on_part_begin():
+        part.update(headers={}, field=b"", value=b"", file=None)
+
+    def on_header_field(data, start, end):
+        part["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"] = part["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        if filename is None:
+            return  # a plain form field; nothing to store
+        path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part")
+        upload = UploadedFile(filename.decode("utf-8", "replace"), path, max_bytes)
+        # Earlier parts are closed by now, so their errors are final
+        if accepted >= max_files:
+            upload.reject(f"more than {max_files} files in one request")
+        files.append(upload)
+        part["file"] = upload
+
+    def on_part_data(data, start, end):
+        if part["file"] is not None:
+            part["file"].write(data[start:end])
+
+    def on_part_end():
+        nonlocal accepted
+        if part["file"] is not None:
+            part["file"].close()
+            accepted += part["file"].error is None
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(parser.write, chunk)
+        await run_in_threadpool(parser.finalize)
+    except Exception:
+        for upload in files:
+            upload.close()
+            upload.discard()
+        raise
+    return files